@@ -0,0 +1,116 @@
+# batch_render.py
+"""
+Render saved .sketch documents or recorded sessions to PNG/SVG without a display.
+
+    python batch_render.py drawings/ -o previews --format png svg --thumb 256 -j 8
+"""
+import argparse
+import csv
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+from journal import load_document
+from renderer import render_scene, scene_bounds, scene_to_svg
+
+DOCUMENT_EXTENSIONS = (".sketch", ".bin")
+
+
+def find_inputs(paths):
+    """Expand files, globs and directories into a list of documents/sessions to render."""
+    found = []
+    for path in paths:
+        for match in sorted(glob.glob(path)) or [path]:
+            if os.path.isdir(match):
+                if os.path.exists(os.path.join(match, "journal.bin")):
+                    found.append(match)  # A recorded session directory
+                    continue
+                for name in sorted(os.listdir(match)):
+                    if name.endswith(".sketch"):
+                        found.append(os.path.join(match, name))
+            elif match.endswith(DOCUMENT_EXTENSIONS):
+                found.append(match)
+            else:
+                print(f"Skipping {match}: not a sketch document")
+    return found
+
+
+def render_file(path, out_dir, formats, thumb_size, scale, fit):
+    """Render a single document. Runs in a worker process; returns a timing row."""
+    row = {"file": path, "strokes": 0, "shapes": 0, "load_ms": 0.0, "render_ms": 0.0,
+           "total_ms": 0.0, "error": ""}
+    start = time.perf_counter()
+    try:
+        strokes, shapes = load_document(path)
+        loaded = time.perf_counter()
+        row.update(strokes=len(strokes), shapes=len(shapes), load_ms=(loaded - start) * 1000)
+
+        size, origin = (800, 600), (0, 0)
+        bounds = scene_bounds(strokes, shapes) if fit else None
+        if bounds:
+            origin = bounds[:2]
+            size = (bounds[2] - bounds[0], bounds[3] - bounds[1])
+
+        name = os.path.splitext(os.path.basename(os.path.normpath(path)))[0]
+        base = os.path.join(out_dir, name)
+        if "png" in formats or thumb_size:
+            img = render_scene(strokes, shapes, size=size, scale=scale, origin=origin)
+            if "png" in formats:
+                img.save(base + ".png")
+            if thumb_size:
+                img.thumbnail((thumb_size, thumb_size), Image.Resampling.LANCZOS)
+                img.save(base + ".thumb.png")
+        if "svg" in formats:
+            with open(base + ".svg", "w", encoding="utf-8") as f:
+                f.write(scene_to_svg(strokes, shapes, size=size, origin=origin))
+        row["render_ms"] = (time.perf_counter() - loaded) * 1000
+    except Exception as e:
+        row["error"] = str(e)
+    row["total_ms"] = (time.perf_counter() - start) * 1000
+    return row
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render sketches to PNG/SVG in bulk without opening a window.")
+    parser.add_argument("inputs", nargs="+", help=".sketch files, globs, or directories (recorded sessions are directories with journal.bin)")
+    parser.add_argument("-o", "--out", default="renders", help="output directory")
+    parser.add_argument("--format", nargs="+", choices=["png", "svg"], default=["png"], help="output formats")
+    parser.add_argument("--thumb", type=int, default=0, metavar="SIZE", help="also write SIZE px thumbnails")
+    parser.add_argument("--scale", type=float, default=1.0, help="raster scale factor for PNG output")
+    parser.add_argument("--fit", action="store_true", help="crop to the drawing instead of the 800x600 canvas")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    args = parser.parse_args(argv)
+
+    files = find_inputs(args.inputs)
+    if not files:
+        print("Nothing to render")
+        return 1
+    os.makedirs(args.out, exist_ok=True)
+
+    start = time.perf_counter()
+    rows = []
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(render_file, path, args.out, args.format, args.thumb, args.scale, args.fit)
+                   for path in files]
+        for future in futures:
+            row = future.result()
+            rows.append(row)
+            status = f"ERROR {row['error']}" if row["error"] else f"{row['total_ms']:.1f} ms"
+            print(f"{row['file']}: {row['strokes']} strokes, {row['shapes']} shapes, {status}")
+
+    with open(os.path.join(args.out, "timings.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    elapsed = time.perf_counter() - start
+    failed = sum(1 for row in rows if row["error"])
+    print(f"Rendered {len(rows) - failed}/{len(rows)} files in {elapsed:.2f} s with {args.jobs} workers")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
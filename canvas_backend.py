@@ -0,0 +1,334 @@
+# canvas_backend.py
+"""
+The drawing surface SketchApp talks to. TkCanvas is the real thing;
+MemoryCanvas records items in plain Python with its own grid index for
+overlap queries, so the drawing/undo/transform logic can run (and be
+timed) without a display:
+
+    app = SketchApp(None, canvas=MemoryCanvas())
+"""
+import heapq
+import itertools
+import math
+import time
+import tkinter as tk
+
+from PIL import ImageTk
+
+
+class TkCanvas(tk.Canvas):
+    """tk.Canvas plus the few helpers MemoryCanvas also provides."""
+
+    def photo_image(self, image):
+        """A PIL image in the form create_image() takes."""
+        return ImageTk.PhotoImage(image)
+
+
+def _flatten(coords):
+    flat = []
+    for c in coords:
+        if isinstance(c, (list, tuple)):
+            flat.extend(_flatten(c))
+        else:
+            flat.append(float(c))
+    return flat
+
+
+class MemoryCanvas:
+    """
+    In-memory stand-in for TkCanvas covering the surface SketchApp uses:
+    create_*, coords, delete, move, find_overlapping/find_closest, gettags,
+    stacking, scrolling, options, bindings and after() callbacks.
+    Overlap queries go through a uniform grid of item bounding boxes.
+    """
+    def __init__(self, width=800, height=600, cell_size=64, **options):
+        self.options = {"width": width, "height": height, "bg": "white"}
+        self.options.update(options)
+        self.cell_size = cell_size
+        self.items = {}  # id -> {"type", "coords", "options", "tags", "z", "cells", "bbox"}
+        self.grid = {}  # (cx, cy) -> set of item ids
+        self.huge = set()  # Items spanning too many cells to index
+        self.bindings = {}
+        self.image = None
+        self._ids = itertools.count(1)
+        self._bottom = 0  # Stacking order: lower z is drawn first
+        self._top = 0
+        self._view = [0.0, 0.0]  # Document point at the top-left corner
+        self._scan = None
+        self._tasks = []  # Heap of (due, seq, func, args) for after()
+        self._cancelled = set()
+        self._seq = itertools.count(1)
+
+    # --- Items ---
+
+    def _create(self, kind, coords, options):
+        item = next(self._ids)
+        self._top += 1
+        tags = options.pop("tags", ())
+        if isinstance(tags, str):
+            tags = tuple(tags.split())
+        self.items[item] = {"type": kind, "coords": _flatten(coords), "options": options,
+                            "tags": tuple(tags), "z": self._top, "cells": (), "bbox": None}
+        self._index(item)
+        return item
+
+    def create_line(self, *coords, **options):
+        return self._create("line", coords, options)
+
+    def create_rectangle(self, *coords, **options):
+        return self._create("rectangle", coords, options)
+
+    def create_oval(self, *coords, **options):
+        return self._create("oval", coords, options)
+
+    def create_polygon(self, *coords, **options):
+        return self._create("polygon", coords, options)
+
+    def create_image(self, *coords, **options):
+        return self._create("image", coords, options)
+
+    def create_text(self, *coords, **options):
+        return self._create("text", coords, options)
+
+    def photo_image(self, image):
+        return image  # Kept as the PIL image, nothing to convert for
+
+    def _find(self, tag_or_id):
+        """Item ids matching an id, a tag, "all", or a find_closest() tuple."""
+        if tag_or_id is None:
+            return []
+        if isinstance(tag_or_id, tuple):
+            tag_or_id = tag_or_id[0] if tag_or_id else None
+            return self._find(tag_or_id)
+        if isinstance(tag_or_id, int) or (isinstance(tag_or_id, str) and tag_or_id.isdigit()):
+            return [int(tag_or_id)] if int(tag_or_id) in self.items else []
+        if tag_or_id == "all":
+            return list(self.items)
+        return [item for item, data in self.items.items() if tag_or_id in data["tags"]]
+
+    def delete(self, *args):
+        for arg in args:
+            if arg == "all":
+                self.items.clear()
+                self.grid.clear()
+                self.huge.clear()
+                continue
+            for item in self._find(arg):
+                self._unindex(item)
+                del self.items[item]
+
+    def coords(self, item, *coords):
+        found = self._find(item)
+        if not found:
+            return []
+        data = self.items[found[0]]
+        if coords:
+            self._unindex(found[0])
+            data["coords"] = _flatten(coords)
+            self._index(found[0])
+        return list(data["coords"])
+
+    def move(self, tag_or_id, dx, dy):
+        for item in self._find(tag_or_id):
+            self._unindex(item)
+            coords = self.items[item]["coords"]
+            coords[0::2] = [x + dx for x in coords[0::2]]
+            coords[1::2] = [y + dy for y in coords[1::2]]
+            self._index(item)
+
+    def gettags(self, tag_or_id):
+        found = self._find(tag_or_id)
+        return self.items[found[0]]["tags"] if found else ()
+
+    def itemcget(self, item, option):
+        found = self._find(item)
+        return self.items[found[0]]["options"].get(option) if found else None
+
+    def tag_lower(self, tag_or_id, below=None):
+        for item in self._find(tag_or_id):
+            self._bottom -= 1
+            self.items[item]["z"] = self._bottom
+
+    def lower(self, tag_or_id, below=None):
+        if tag_or_id != "all":  # Lowering everything keeps the order as it is
+            self.tag_lower(tag_or_id, below)
+
+    def tag_raise(self, tag_or_id, above=None):
+        for item in self._find(tag_or_id):
+            self._top += 1
+            self.items[item]["z"] = self._top
+
+    def find_all(self):
+        return tuple(sorted(self.items, key=lambda item: self.items[item]["z"]))
+
+    # --- Overlap queries ---
+
+    def bbox_of(self, item):
+        """Bounding box of an item, line widths included."""
+        data = self.items[item]
+        coords, options = data["coords"], data["options"]
+        xs, ys = coords[0::2], coords[1::2]
+        if data["type"] == "image":
+            image = options.get("image")
+            width = height = 0
+            if image is not None:
+                # PhotoImage (TkCanvas) or PIL image (photo_image() here)
+                width, height = (image.width(), image.height()) if callable(image.width) else image.size
+            if options.get("anchor") in ("nw", tk.NW):
+                return xs[0], ys[0], xs[0] + width, ys[0] + height
+            return xs[0] - width / 2, ys[0] - height / 2, xs[0] + width / 2, ys[0] + height / 2
+        if data["type"] == "text":
+            return xs[0] - 1, ys[0] - 1, xs[0] + 1, ys[0] + 1
+        pad = float(options.get("width", 1) or 0) / 2
+        return min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad
+
+    def _cells(self, x1, y1, x2, y2):
+        size = self.cell_size
+        return [(cx, cy)
+                for cx in range(math.floor(x1 / size), math.floor(x2 / size) + 1)
+                for cy in range(math.floor(y1 / size), math.floor(y2 / size) + 1)]
+
+    def _index(self, item):
+        data = self.items[item]
+        if not data["coords"]:
+            return
+        x1, y1, x2, y2 = data["bbox"] = self.bbox_of(item)
+        if ((x2 - x1) / self.cell_size + 1) * ((y2 - y1) / self.cell_size + 1) > 1024:
+            self.huge.add(item)
+            return
+        data["cells"] = self._cells(x1, y1, x2, y2)
+        for cell in data["cells"]:
+            self.grid.setdefault(cell, set()).add(item)
+
+    def _unindex(self, item):
+        self.huge.discard(item)
+        self.items[item]["bbox"] = None
+        for cell in self.items[item]["cells"]:
+            bucket = self.grid.get(cell)
+            if bucket is not None:
+                bucket.discard(item)
+                if not bucket:
+                    del self.grid[cell]
+        self.items[item]["cells"] = ()
+
+    def find_overlapping(self, x1, y1, x2, y2):
+        """Items whose bounding box overlaps the rectangle, bottom to top."""
+        size = self.cell_size
+        cells = ((math.floor(x2 / size) - math.floor(x1 / size) + 1)
+                 * (math.floor(y2 / size) - math.floor(y1 / size) + 1))
+        if cells > len(self.grid):
+            candidates = set(self.items)  # Cheaper to check everything
+        else:
+            candidates = set(self.huge)
+            for cell in self._cells(x1, y1, x2, y2):
+                candidates.update(self.grid.get(cell, ()))
+        found = []
+        for item in candidates:
+            if self.items[item]["bbox"] is None:
+                continue
+            bx1, by1, bx2, by2 = self.items[item]["bbox"]
+            if bx1 <= x2 and bx2 >= x1 and by1 <= y2 and by2 >= y1:
+                found.append(item)
+        return tuple(sorted(found, key=lambda item: self.items[item]["z"]))
+
+    def find_closest(self, x, y):
+        """The topmost item nearest to (x, y), as a 1-tuple like Tk returns."""
+        if not self.items:
+            return ()
+        found = ()
+        for radius in (self.cell_size, self.cell_size * 8):
+            found = self.find_overlapping(x - radius, y - radius, x + radius, y + radius)
+            if found:
+                break
+        else:
+            found = [item for item in self.items if self.items[item]["bbox"] is not None]
+
+        def distance(item):
+            bx1, by1, bx2, by2 = self.items[item]["bbox"]
+            return math.hypot(max(bx1 - x, 0, x - bx2), max(by1 - y, 0, y - by2))
+        return (min(reversed(found), key=distance),) if found else ()
+
+    # --- View ---
+
+    def canvasx(self, x):
+        return self._view[0] + x
+
+    def canvasy(self, y):
+        return self._view[1] + y
+
+    def xview_scroll(self, number, what):
+        self._view[0] += number  # xscrollincrement is 1
+
+    def yview_scroll(self, number, what):
+        self._view[1] += number
+
+    def scan_mark(self, x, y):
+        self._scan = (x, y, tuple(self._view))
+
+    def scan_dragto(self, x, y, gain=10):
+        x0, y0, (vx, vy) = self._scan
+        self._view = [vx - (x - x0) * gain, vy - (y - y0) * gain]
+
+    # --- Widget ---
+
+    def cget(self, option):
+        return self.options.get(option)
+
+    def config(self, **options):
+        self.options.update(options)
+
+    configure = config
+
+    def pack(self, **options):
+        pass
+
+    def bind(self, sequence, func, add=None):
+        self.bindings[sequence] = func
+
+    def winfo_width(self):
+        return self.options["width"]
+
+    def winfo_height(self):
+        return self.options["height"]
+
+    def winfo_rootx(self):
+        return 0
+
+    def winfo_rooty(self):
+        return 0
+
+    def winfo_x(self):
+        return 0
+
+    def winfo_y(self):
+        return 0
+
+    # --- Event loop ---
+
+    def after(self, ms, func=None, *args):
+        task = next(self._seq)
+        heapq.heappush(self._tasks, (time.perf_counter() + ms / 1000, task, func, args))
+        return task
+
+    def after_cancel(self, task):
+        self._cancelled.add(task)
+
+    def update(self):
+        """Runs every after() callback that is due, like Tk's update()."""
+        now = time.perf_counter()
+        while self._tasks and self._tasks[0][0] <= now:
+            _, task, func, args = heapq.heappop(self._tasks)
+            if task in self._cancelled:
+                self._cancelled.discard(task)
+            elif func is not None:
+                func(*args)
+
+    update_idletasks = update
+
+    def run(self, seconds):
+        """Runs the event loop for `seconds` of real time."""
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            self.update()
+            due = self._tasks[0][0] if self._tasks else end
+            time.sleep(max(0.0, min(due, end) - time.perf_counter()))
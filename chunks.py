@@ -0,0 +1,293 @@
+# chunks.py
+import math
+import tempfile
+
+import numpy as np
+
+from linear_algebra import apply_affine
+from shape import Stroke, rectangle_corners, shape_coords
+from text_layout import text_bounds
+
+CHUNK_SIZE = 1024  # World units per chunk side
+MAX_CHUNKS_PER_OBJECT = 4096  # Bigger objects skip the index and are always materialized
+
+
+class PointPager:
+    """
+    Memory-mapped scratch file holding the points of strokes that are far
+    from the viewport. A stroke whose points haven't changed keeps its slot,
+    so paging it out again costs nothing. One whose points changed is
+    written back over its old slot when they still fit, otherwise the old
+    slot goes on a free list that later writes reuse, so the file only grows
+    with the points actually stored.
+    """
+    def __init__(self, capacity=1 << 16):
+        self.file = tempfile.TemporaryFile()
+        self.capacity = 0
+        self.used = 0  # High-water mark, slots past it were never handed out
+        self.free_slots = []  # (offset, size) of released slots, sorted by offset
+        self.array = None
+        self._grow(capacity)
+
+    def _grow(self, needed):
+        capacity = max(needed, self.capacity * 2)
+        if self.array is not None:
+            self.array.flush()
+        self.file.truncate(capacity * 2 * 8)  # x, y as float64
+        self.array = np.memmap(self.file, dtype=np.float64, mode="r+", shape=(capacity, 2))
+        self.capacity = capacity
+
+    @property
+    def stored(self):
+        """Points held in slots that are in use."""
+        return self.used - sum(size for _, size in self.free_slots)
+
+    def _allocate(self, count):
+        for i, (offset, size) in enumerate(self.free_slots):
+            if size >= count:
+                # First fit, the rest of the slot stays free
+                if size == count:
+                    del self.free_slots[i]
+                else:
+                    self.free_slots[i] = (offset + count, size - count)
+                return offset
+        if self.used + count > self.capacity:
+            self._grow(self.used + count)
+        offset = self.used
+        self.used += count
+        return offset
+
+    def free(self, page):
+        """Give a slot back for reuse, merging it with free neighbours."""
+        offset, _, size = page
+        slots = self.free_slots
+        slots.append((offset, size))
+        slots.sort()
+        merged = [slots[0]]
+        for start, length in slots[1:]:
+            last_start, last_length = merged[-1]
+            if last_start + last_length == start:
+                merged[-1] = (last_start, last_length + length)
+            else:
+                merged.append((start, length))
+        # A free run at the end just lowers the high-water mark
+        if merged[-1][0] + merged[-1][1] == self.used:
+            self.used = merged.pop()[0]
+        self.free_slots = merged
+
+    def write(self, points, page=None):
+        """
+        Store points, returning the page handle to read them back with.
+        page is the stroke's previous slot, overwritten if the points fit.
+        """
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if page is not None and len(pts) <= page[2]:
+            offset, size = page[0], page[2]
+        else:
+            if page is not None:
+                self.free(page)
+            offset, size = self._allocate(len(pts)), len(pts)
+        self.array[offset:offset + len(pts)] = pts
+        return offset, len(pts), size
+
+    def read(self, page):
+        offset, count, _ = page
+        return [tuple(p) for p in self.array[offset:offset + count].tolist()]
+
+    def close(self):
+        self.array = None
+        self.file.close()
+
+
+def object_uid(obj):
+    return obj.uid if isinstance(obj, Stroke) else obj["uid"]
+
+
+def object_bounds(obj):
+    """World bounding box (x1, y1, x2, y2) of a stroke or shape dict."""
+    if isinstance(obj, Stroke):
+        return obj.world_bounds()
+    if "mask" in obj:
+        # Raster fill patch: transform the corners of its pixel area
+        height, width = obj["mask"].shape
+        x, y = obj["coords"][:2]
+        size = obj["pixel_size"]
+        corners = [(x, y), (x + width * size, y), (x + width * size, y + height * size), (x, y + height * size)]
+        if obj.get("matrix") is not None:
+            corners = apply_affine(obj["matrix"], corners)
+        corners = np.asarray(corners, dtype=float)
+        return (*corners.min(axis=0).tolist(), *corners.max(axis=0).tolist())
+    if obj["type"] == "text":
+        return text_bounds(obj)
+    if obj["type"] == "rectangle":
+        coords = [c for corner in rectangle_corners(obj) for c in corner]  # Tilted ones too
+    else:
+        coords = shape_coords(obj)
+    return min(coords[0::2]), min(coords[1::2]), max(coords[0::2]), max(coords[1::2])
+
+
+def box_through(affine, box):
+    """Bounding box of a box's corners moved by a 3x3 affine."""
+    x1, y1, x2, y2 = box
+    corners = apply_affine(affine, [(x1, y1), (x2, y1), (x2, y2), (x1, y2)])
+    return (*corners.min(axis=0).tolist(), *corners.max(axis=0).tolist())
+
+
+class ChunkStore:
+    """
+    Spatial index that splits the unbounded document into square chunks.
+    Every object is listed in each chunk its bounding box overlaps.
+    Boxes are kept in index space: rotating or zooming the whole scene only
+    composes self.affine (index space to world), and rect queries go back
+    through its inverse. Once zooming has stretched chunks to less than half
+    or more than twice chunk_size, rebase_boxes() re-keys the boxes on a
+    worker and swap() takes the result over.
+    """
+    def __init__(self, chunk_size=CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.chunks = {}  # (cx, cy) -> set of uids
+        self.objects = {}  # uid -> stroke or shape dict
+        self.where = {}  # uid -> chunk keys the object is listed in
+        self.boxes = {}  # uid -> index-space bounding box
+        self.oversized = set()  # uids too large to index chunk by chunk
+        self.affine = None  # Index space to world, None while they are the same
+        self.inverse = None
+        self.touched = None  # uids added or removed since rebase_snapshot()
+
+    def keys_for_rect(self, x1, y1, x2, y2, margin=0):
+        """Chunk keys overlapping a world rectangle, grown by `margin` chunks on every side."""
+        if self.inverse is not None:
+            x1, y1, x2, y2 = box_through(self.inverse, (x1, y1, x2, y2))
+        return self._keys(x1, y1, x2, y2, margin)
+
+    def _keys(self, x1, y1, x2, y2, margin=0):
+        size = self.chunk_size
+        return {(cx, cy)
+                for cx in range(math.floor(x1 / size) - margin, math.floor(x2 / size) + margin + 1)
+                for cy in range(math.floor(y1 / size) - margin, math.floor(y2 / size) + margin + 1)}
+
+    def add(self, obj):
+        uid = object_uid(obj)
+        if uid in self.where:
+            self.remove(obj)
+        box = object_bounds(obj)
+        if self.inverse is not None:
+            box = box_through(self.inverse, box)
+        self._index(uid, box)
+        self.objects[uid] = obj
+        if self.touched is not None:
+            self.touched.add(uid)
+
+    def _index(self, uid, box):
+        x1, y1, x2, y2 = box
+        span = (x2 - x1) / self.chunk_size + 1, (y2 - y1) / self.chunk_size + 1
+        if span[0] * span[1] > MAX_CHUNKS_PER_OBJECT:
+            keys = set()
+            self.oversized.add(uid)
+        else:
+            keys = self._keys(x1, y1, x2, y2)
+        for key in keys:
+            self.chunks.setdefault(key, set()).add(uid)
+        self.where[uid] = keys
+        self.boxes[uid] = box
+
+    def remove(self, obj):
+        uid = object_uid(obj)
+        self._unindex(uid)
+        self.objects.pop(uid, None)
+        if self.touched is not None:
+            self.touched.add(uid)
+
+    def _unindex(self, uid):
+        self.oversized.discard(uid)
+        self.boxes.pop(uid, None)
+        for key in self.where.pop(uid, ()):
+            chunk = self.chunks.get(key)
+            if chunk is not None:
+                chunk.discard(uid)
+                if not chunk:
+                    del self.chunks[key]
+
+    def rebuild(self, objects):
+        self.clear()
+        for obj in objects:
+            self.add(obj)
+
+    def clear(self):
+        self.chunks = {}
+        self.objects = {}
+        self.where = {}
+        self.boxes = {}
+        self.oversized = set()
+        self.affine = None
+        self.inverse = None
+        self.touched = None  # A rebase still running is out of date
+
+    def transform(self, affine):
+        """Moves every object by the same 3x3 affine, as when the whole scene is rotated or zoomed."""
+        self.affine = affine if self.affine is None else affine @ self.affine
+        self.inverse = np.linalg.inv(self.affine)
+
+    def needs_rebase(self):
+        """True once the affine has scaled chunks to less than half or more than twice chunk_size."""
+        if self.affine is None:
+            return False
+        scales = np.linalg.svd(self.affine[:2, :2], compute_uv=False)
+        return scales.max() > 2 or scales.min() < 0.5
+
+    def rebase_snapshot(self):
+        """The (boxes, affine) rebase_boxes() works from; later adds and removes are redone by swap()."""
+        self.touched = set()
+        return dict(self.boxes), self.affine
+
+    def swap(self, rebased, affine):
+        """
+        Takes over the chunks of a rebase_boxes() result made from the snapshot
+        with `affine`, then redoes whatever changed since the snapshot.
+        """
+        touched = self.touched
+        if touched is None:
+            return  # Cleared or rebuilt meanwhile
+        later = self.affine @ np.linalg.inv(affine)  # Rotates and zooms since the snapshot
+        self.chunks, self.where, self.boxes, self.oversized = (rebased.chunks, rebased.where,
+                                                               rebased.boxes, rebased.oversized)
+        self.affine = self.inverse = self.touched = None
+        if not np.allclose(later, np.eye(3)):
+            self.transform(later)
+        for uid in touched:
+            self._unindex(uid)
+            if uid in self.objects:
+                self.add(self.objects[uid])
+
+    def objects_in(self, keys):
+        """Objects listed in any of the given chunks, oldest first."""
+        uids = set(self.oversized)
+        for key in keys:
+            uids.update(self.chunks.get(key, ()))
+        return [self.objects[uid] for uid in sorted(uids)]
+
+
+def rebase_boxes(boxes, affine, chunk_size=CHUNK_SIZE, job=None):
+    """
+    A ChunkStore keyed in world space again, from index-space boxes and the
+    affine that maps them. Reads no stroke or shape, so it can run on a
+    worker. Rotations by other than right angles grow the boxes a little,
+    which only lists objects in a few extra chunks.
+    """
+    rebased = ChunkStore(chunk_size)
+    if not boxes:
+        return rebased
+    if affine is None:
+        affine = np.eye(3)
+    uids = list(boxes)
+    b = np.asarray([boxes[uid] for uid in uids], dtype=float)
+    corners = b[:, [0, 1, 2, 1, 2, 3, 0, 3]].reshape(-1, 2)
+    moved = apply_affine(affine, corners).reshape(-1, 4, 2)
+    lows, highs = moved.min(axis=1).tolist(), moved.max(axis=1).tolist()
+    for i, uid in enumerate(uids):
+        if job is not None and i % 1024 == 0:
+            if job.cancelled:
+                return None
+            job.report(i, len(uids))
+        rebased._index(uid, (*lows[i], *highs[i]))
+    return rebased
@@ -0,0 +1,112 @@
+# cold_storage.py
+import struct
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from memory import points_bytes
+
+QUANTUM = 1 / 64  # Coordinates are kept to 1/64 px, well under anything visible
+_HEADER = struct.Struct("<IB")  # point count, bytes per delta
+
+
+def pack_points(points, quantum=QUANTUM):
+    """
+    Compress a list of (x, y) points: quantize to `quantum`, delta-encode
+    each axis as the narrowest integer that fits, then zlib at its fastest level.
+    """
+    q = np.rint(np.asarray(points, dtype=np.float64).reshape(-1, 2) / quantum).astype(np.int64)
+    deltas = np.diff(q, axis=0, prepend=np.zeros((1, 2), np.int64))
+    largest = int(np.abs(deltas).max()) if len(deltas) else 0
+    width = 1 if largest < 1 << 7 else 2 if largest < 1 << 15 else 4 if largest < 1 << 31 else 8
+    # All x deltas, then all y deltas, compress better than interleaved pairs
+    body = deltas.T.astype(f"<i{width}").tobytes()
+    return _HEADER.pack(len(q), width) + zlib.compress(body, 1)
+
+
+def unpack_points(data, quantum=QUANTUM):
+    count, width = _HEADER.unpack_from(data)
+    deltas = np.frombuffer(zlib.decompress(data[_HEADER.size:]), dtype=f"<i{width}").reshape(2, count)
+    points = np.cumsum(deltas.T, axis=0, dtype=np.int64) * quantum
+    return [tuple(p) for p in points.tolist()]
+
+
+class ColdStore:
+    """
+    Keeps the points of strokes nobody has looked at for a while compressed
+    in memory. Strokes are swept clock-style: a stroke untouched since the
+    previous sweep is compressed. Decompressed strokes stay in an LRU and
+    are compressed again when they fall out of it.
+    """
+    def __init__(self, lru_size=512, quantum=QUANTUM):
+        self.lru_size = lru_size
+        self.quantum = quantum
+        self.lru = OrderedDict()  # uid -> stroke decompressed on demand
+        self.cold = {}  # uid -> (resident bytes as a list, compressed bytes)
+        self.decompressions = 0
+        self.cursor = 0  # Where an unfinished sweep carries on
+
+    def pack(self, points):
+        return pack_points(points, self.quantum)
+
+    def decode(self, data):
+        """Unpack points without touching the LRU, for readers on other threads."""
+        return unpack_points(data, self.quantum)
+
+    def compressed(self, stroke, count, size):
+        """Bookkeeping for Stroke.compress()."""
+        self.lru.pop(stroke.uid, None)
+        self.cold[stroke.uid] = (points_bytes(count), size)
+
+    def discard(self, stroke):
+        """
+        Forgets a stroke taken out of the scene. Its compressed copy stays with
+        the stroke, for undo to put back.
+        """
+        self.lru.pop(stroke.uid, None)
+        self.cold.pop(stroke.uid, None)
+
+    def clear(self):
+        self.lru.clear()
+        self.cold = {}
+        self.cursor = 0
+
+    def unpack(self, stroke, data):
+        """Decompress a stroke's points for Stroke.points, keeping it in the LRU."""
+        points = unpack_points(data, self.quantum)
+        self.decompressions += 1
+        self.cold.pop(stroke.uid, None)
+        self.lru[stroke.uid] = stroke
+        while len(self.lru) > self.lru_size:
+            _, oldest = self.lru.popitem(last=False)
+            oldest.compress(self)
+        return points
+
+    def sweep(self, strokes, budget_ms=10):
+        """
+        Compress strokes that weren't touched since the last sweep, for at most
+        budget_ms. Returns (compressed count, whether the sweep got through
+        the list); call again to carry on where it stopped.
+        """
+        deadline = time.perf_counter() + budget_ms / 1000
+        count = 0
+        while self.cursor < len(strokes):
+            stroke = strokes[self.cursor]
+            self.cursor += 1
+            if stroke.touched:
+                stroke.touched = False
+            elif stroke.compress(self):
+                count += 1
+                if time.perf_counter() > deadline:
+                    return count, False
+        self.cursor = 0
+        return count, True
+
+    def stats(self):
+        raw = sum(r for r, _ in self.cold.values())
+        packed = sum(p for _, p in self.cold.values())
+        return {"compressed_strokes": len(self.cold), "raw_bytes": raw, "compressed_bytes": packed,
+                "saved_bytes": raw - packed, "ratio": round(raw / packed, 1) if packed else 0.0,
+                "decompressed_cached": len(self.lru), "decompressions": self.decompressions}
@@ -0,0 +1,169 @@
+# curve_fitting.py
+import numpy as np
+
+
+def fit_curve(points, max_error=2.0):
+    """
+    Fit a piecewise cubic Bézier to a list of (x, y) points (Schneider's algorithm).
+    Returns the control points as a list of (x, y) tuples laid out as
+    p0, c1, c2, p1, c1, c2, p2, ... (3n + 1 points for n segments).
+    """
+    pts = np.asarray(points, dtype=float).reshape(-1, 2)
+
+    # Drop repeated points, they break the chord-length parameterisation
+    if len(pts) > 1:
+        moved = np.any(np.diff(pts, axis=0) != 0, axis=1)
+        pts = pts[np.concatenate(([True], moved))]
+    if len(pts) < 2:
+        return [tuple(p) for p in pts.tolist()]
+
+    left_tangent = _normalize(pts[1] - pts[0])
+    right_tangent = _normalize(pts[-2] - pts[-1])
+
+    segments = []
+    # Explicit stack instead of recursion so long strokes can't hit the recursion limit
+    stack = [(0, len(pts) - 1, left_tangent, right_tangent)]
+    while stack:
+        first, last, t_hat1, t_hat2 = stack.pop()
+        bezier, split = _fit_cubic(pts[first:last + 1], t_hat1, t_hat2, max_error)
+        if bezier is not None:
+            segments.append(bezier)
+            continue
+
+        split += first
+        center = pts[split - 1] - pts[split + 1]
+        if not np.any(center):
+            center = pts[split - 1] - pts[split]
+        center = _normalize(center)
+        # Push the right half first so the left half is fitted (and appended) first
+        stack.append((split, last, -center, t_hat2))
+        stack.append((first, split, t_hat1, center))
+
+    control = [tuple(segments[0][0])]
+    for bezier in segments:
+        control.extend(tuple(p) for p in bezier[1:])
+    return [(float(x), float(y)) for x, y in control]
+
+
+def bezier_points(control_points, steps=8):
+    """
+    Flatten piecewise cubic Bézier control points into a polyline,
+    sampling each segment `steps` times.
+    """
+    ctrl = np.asarray(control_points, dtype=float).reshape(-1, 2)
+    n = (len(ctrl) - 1) // 3
+    if n < 1:
+        return [tuple(p) for p in ctrl.tolist()]
+
+    # (n, 4, 2): the four control points of every segment
+    idx = np.arange(n)[:, None] * 3 + np.arange(4)[None, :]
+    segs = ctrl[idx]
+
+    t = np.linspace(0.0, 1.0, steps, endpoint=False)
+    basis = _bernstein(t)  # (steps, 4)
+    flat = np.einsum("sk,nkd->nsd", basis, segs).reshape(-1, 2)
+    flat = np.vstack([flat, ctrl[3 * n]])
+    return [tuple(p) for p in flat.tolist()]
+
+
+def _fit_cubic(pts, t_hat1, t_hat2, max_error):
+    """
+    Try to fit a single cubic to pts. Returns (bezier, None) on success
+    or (None, split_index) where the worst point is.
+    """
+    if len(pts) == 2:
+        dist = np.linalg.norm(pts[1] - pts[0]) / 3.0
+        bezier = np.array([pts[0], pts[0] + t_hat1 * dist, pts[1] + t_hat2 * dist, pts[1]])
+        return bezier, None
+
+    u = _chord_length_parameterize(pts)
+    bezier = _generate_bezier(pts, u, t_hat1, t_hat2)
+    error, split = _max_error(pts, bezier, u)
+    if error < max_error ** 2:
+        return bezier, None
+
+    # Close enough that reparameterising might fix it
+    if error < (max_error * 4) ** 2:
+        for _ in range(4):
+            u = _reparameterize(bezier, pts, u)
+            bezier = _generate_bezier(pts, u, t_hat1, t_hat2)
+            error, split = _max_error(pts, bezier, u)
+            if error < max_error ** 2:
+                return bezier, None
+
+    return None, split
+
+
+def _generate_bezier(pts, u, t_hat1, t_hat2):
+    """Least-squares fit of the two inner control points along the given tangents."""
+    p0, p3 = pts[0], pts[-1]
+    b = _bernstein(u)
+    a1 = b[:, 1:2] * t_hat1
+    a2 = b[:, 2:3] * t_hat2
+
+    c00 = np.sum(a1 * a1)
+    c01 = np.sum(a1 * a2)
+    c11 = np.sum(a2 * a2)
+    tmp = pts - (np.outer(b[:, 0] + b[:, 1], p0) + np.outer(b[:, 2] + b[:, 3], p3))
+    x0 = np.sum(a1 * tmp)
+    x1 = np.sum(a2 * tmp)
+
+    det = c00 * c11 - c01 * c01
+    if abs(det) > 1e-12:
+        alpha_l = (x0 * c11 - x1 * c01) / det
+        alpha_r = (c00 * x1 - c01 * x0) / det
+    else:
+        alpha_l = alpha_r = 0.0
+
+    seg_length = np.linalg.norm(p3 - p0)
+    epsilon = 1e-6 * seg_length
+    if alpha_l < epsilon or alpha_r < epsilon:
+        # Fall back to the Wu/Barsky heuristic
+        alpha_l = alpha_r = seg_length / 3.0
+
+    return np.array([p0, p0 + t_hat1 * alpha_l, p3 + t_hat2 * alpha_r, p3])
+
+
+def _reparameterize(bezier, pts, u):
+    """One Newton-Raphson step towards the closest curve parameter for every point."""
+    d = _evaluate(bezier, u) - pts
+    d1 = _evaluate(3 * (bezier[1:] - bezier[:-1]), u)
+    d2 = _evaluate(6 * (bezier[2:] - 2 * bezier[1:-1] + bezier[:-2]), u)
+    numerator = np.sum(d * d1, axis=1)
+    denominator = np.sum(d1 * d1 + d * d2, axis=1)
+    step = np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator != 0)
+    return np.clip(u - step, 0.0, 1.0)
+
+
+def _max_error(pts, bezier, u):
+    """Largest squared distance between the points and the curve, and where it occurs."""
+    dist = np.sum((_evaluate(bezier, u) - pts) ** 2, axis=1)
+    split = int(np.argmax(dist))
+    split = min(max(split, 1), len(pts) - 2)
+    return float(dist.max()), split
+
+
+def _chord_length_parameterize(pts):
+    lengths = np.concatenate(([0.0], np.cumsum(np.linalg.norm(np.diff(pts, axis=0), axis=1))))
+    return lengths / lengths[-1]
+
+
+def _evaluate(ctrl, t):
+    """Evaluate a Bézier of any degree (given by len(ctrl)) at parameters t."""
+    degree = len(ctrl) - 1
+    t = t[:, None]
+    if degree == 3:
+        return _bernstein(t[:, 0]) @ ctrl
+    if degree == 2:
+        return (1 - t) ** 2 * ctrl[0] + 2 * (1 - t) * t * ctrl[1] + t ** 2 * ctrl[2]
+    return (1 - t) * ctrl[0] + t * ctrl[1]
+
+
+def _bernstein(t):
+    mt = 1 - t
+    return np.stack([mt ** 3, 3 * mt ** 2 * t, 3 * mt * t ** 2, t ** 3], axis=1)
+
+
+def _normalize(v):
+    length = np.linalg.norm(v)
+    return v / length if length else v
@@ -0,0 +1,140 @@
+# flood_fill.py
+import cv2
+import numpy as np
+from PIL import Image, ImageColor
+
+from linear_algebra import apply_affine
+
+
+def flood_fill_mask(pixels, seed, tolerance=32):
+    """
+    Scanline flood fill from seed over an (H, W, 3) uint8 image.
+    Pixels whose channels are all within `tolerance` of the seed color and
+    connected to it are filled. Returns a uint8 mask (255 = filled).
+    """
+    height, width = pixels.shape[:2]
+    x, y = int(seed[0]), int(seed[1])
+    if not (0 <= x < width and 0 <= y < height):
+        return None
+
+    # cv2.floodFill wants a mask two pixels larger than the image
+    mask = np.zeros((height + 2, width + 2), np.uint8)
+    flags = 4 | cv2.FLOODFILL_FIXED_RANGE | cv2.FLOODFILL_MASK_ONLY | (255 << 8)
+    diff = (tolerance,) * 3
+    image = pixels if pixels.flags.writeable else pixels.copy()  # Not modified in mask-only mode
+    cv2.floodFill(image, mask, (x, y), (0, 0, 0), diff, diff, flags)
+    return mask[1:-1, 1:-1]
+
+
+def make_fill(mask, color, uid, pixel_size=1.0, origin=(0, 0), epsilon=0.75):
+    """
+    Turn a fill mask into a scene object. Regions without holes become a
+    polygon; anything with holes is kept as a raster patch of the mask.
+    pixel_size is how many scene units one mask pixel covers.
+    """
+    contours, hierarchy = cv2.findContours(mask, cv2.RETR_CCOMP, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+
+    shape = {"id": None, "uid": uid, "type": "fill", "color": color, "thickness": 0, "matrix": None}
+    has_holes = len(contours) > 1 or hierarchy[0][0][2] != -1
+    if not has_holes:
+        polygon = cv2.approxPolyDP(contours[0], epsilon, True).reshape(-1, 2).astype(float)
+        # Contours run through the centers of the edge pixels, half a pixel inside the region
+        polygon = pixel_outline(polygon + 0.5)
+        if polygon is None:
+            # A single pixel or a one pixel wide line has no inside to grow from
+            ys, xs = np.nonzero(mask)
+            x1, y1, x2, y2 = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+            polygon = np.array([(x1, y1), (x2, y1), (x2, y2), (x1, y2)], dtype=float)
+        polygon = polygon * pixel_size + origin
+        shape["coords"] = polygon.ravel().tolist()
+        return shape
+
+    # Crop the patch to the filled area
+    ys, xs = np.nonzero(mask)
+    x1, y1, x2, y2 = xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+    shape["coords"] = [origin[0] + x1 * pixel_size, origin[1] + y1 * pixel_size]
+    shape["mask"] = np.ascontiguousarray(mask[y1:y2, x1:x2])
+    shape["pixel_size"] = pixel_size
+    return shape
+
+
+def pixel_outline(points):
+    """
+    Grow a polygon running through the centers of a region's edge pixels
+    out to the pixel edges. A staircase of pixels reaches half a pixel past
+    its centers along its major axis, so each edge moves out by that much:
+    straight edges by half a pixel, diagonal ones less. Returns None for
+    polygons without area.
+    """
+    nxt = np.roll(points, -1, axis=0)
+    area = np.sum(points[:, 0] * nxt[:, 1] - nxt[:, 0] * points[:, 1]) / 2
+    if len(points) < 3 or abs(area) < 1e-9:
+        return None
+    edges = nxt - points
+    lengths = np.hypot(edges[:, 0], edges[:, 1])
+    keep = lengths > 0
+    points, edges, lengths = points[keep], edges[keep], lengths[keep]
+    directions = edges / lengths[:, None]
+    # Right-hand normals point out of a polygon with positive area
+    normals = np.stack([directions[:, 1], -directions[:, 0]], axis=1) * np.sign(area)
+    offsets = 0.5 * np.abs(normals).max(axis=1)
+
+    grown = []
+    for i, point in enumerate(points):
+        (n1x, n1y), d1 = normals[i - 1], offsets[i - 1]  # The edge ending here
+        (n2x, n2y), d2 = normals[i], offsets[i]
+        det = n1x * n2y - n1y * n2x
+        if abs(det) > 0.3:
+            # Where the two moved edges meet
+            grown.append(point + np.array([d1 * n2y - d2 * n1y, d2 * n1x - d1 * n2x]) / det)
+        elif n1x * n2x + n1y * n2y > 0:
+            grown.append(point + normals[i] * d2)  # Nearly straight on
+        else:
+            # Turning back at the tip of a one pixel wide spike, square it off
+            tip = directions[i - 1] * 0.5
+            grown.append(point + normals[i - 1] * d1 + tip)
+            grown.append(point + normals[i] * d2 + tip)
+    return np.array(grown)
+
+
+def fill_patch_image(shape, scale=1.0):
+    """
+    Render a raster fill patch as an RGBA image, with its transform applied.
+    Returns (image, (x, y)) where (x, y) is the scene position of the image's
+    top-left corner and every image pixel covers 1 / scale scene units.
+    """
+    mask = shape["mask"]
+    height, width = mask.shape
+    size = shape["pixel_size"]
+    ox, oy = shape["coords"][:2]
+    # Mask pixels -> scene units, then the pending transform, then output pixels
+    local = np.array([[size, 0, ox], [0, size, oy], [0, 0, 1]], dtype=float)
+    affine = local if shape.get("matrix") is None else shape["matrix"] @ local
+    affine = np.diag([scale, scale, 1.0]) @ affine
+
+    corners = apply_affine(affine, [(0, 0), (width, 0), (width, height), (0, height)])
+    left, top = np.floor(corners.min(axis=0))
+    right, bottom = np.ceil(corners.max(axis=0))
+    out_size = (max(int(right - left), 1), max(int(bottom - top), 1))
+
+    # PIL wants the output -> input mapping
+    to_output = np.array([[1, 0, -left], [0, 1, -top], [0, 0, 1]]) @ affine
+    inverse = np.linalg.inv(to_output)
+    alpha = Image.fromarray(mask).transform(out_size, Image.Transform.AFFINE, inverse[:2].ravel().tolist(),
+                                            resample=Image.Resampling.NEAREST)
+    image = Image.new("RGBA", out_size, ImageColor.getrgb(shape["color"])[:3] + (0,))
+    image.putalpha(alpha)
+    return image, (left / scale, top / scale)
+
+
+def baked_patch(shape):
+    """
+    The (mask, origin) of a raster fill patch with its pending transform
+    folded in, leaving the shape itself untouched.
+    """
+    if shape.get("matrix") is None:
+        return shape["mask"], tuple(shape["coords"][:2])
+    image, origin = fill_patch_image(shape, scale=1.0 / shape["pixel_size"])
+    return np.asarray(image.getchannel("A")), origin
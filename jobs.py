@@ -0,0 +1,132 @@
+# jobs.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    """
+    A heavy canvas operation split in two: compute(job) runs on a worker
+    thread and returns a list of results, then apply(result) is called for
+    each of them on the Tk thread, a few milliseconds at a time.
+    """
+    def __init__(self, name, compute, apply, begin=None, done=None):
+        self.name = name
+        self.compute = compute
+        self.apply = apply
+        self.begin = begin  # Called on the Tk thread once compute has finished
+        self.done = done  # Called on the Tk thread after the last apply
+        self.future = None
+        self.results = None
+        self.applied = 0
+        self.computed = 0.0  # Fraction of the compute step finished, set by the worker
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def report(self, count, total):
+        """Lets compute() say how far along it is."""
+        self.computed = count / total if total else 1.0
+
+    def progress(self):
+        """Overall progress from 0 to 1, computing and applying weigh the same."""
+        if self.results is None:
+            return self.computed / 2
+        return 0.5 + (self.applied / len(self.results) / 2 if self.results else 0.5)
+
+
+class JobScheduler:
+    """
+    Runs Jobs on a small thread pool and feeds their results back to the
+    canvas in time slices through widget.after, so Tk keeps handling events.
+    Only one job per name runs at a time: submitting a new one cancels the
+    job it supersedes (a rotate arriving while the last zoom is still drawing).
+    The NumPy/cv2/PIL calls the workers make release the GIL.
+    """
+    def __init__(self, widget, on_progress=None, workers=2, slice_ms=8, poll_ms=15):
+        self.widget = widget
+        self.on_progress = on_progress  # Called with 0..1, or None when nothing is running
+        self.slice_ms = slice_ms
+        self.poll_ms = poll_ms
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sketch-job")
+        self.jobs = {}  # name -> job that is still running
+
+    def submit(self, name, compute, apply, begin=None, done=None):
+        self.cancel(name)
+        job = Job(name, compute, apply, begin, done)
+        job.future = self.pool.submit(compute, job)
+        self.jobs[name] = job
+        self.widget.after(self.poll_ms, self._poll, job)
+        self._report()
+        return job
+
+    def running(self, name):
+        return name in self.jobs
+
+    def cancel(self, name):
+        job = self.jobs.pop(name, None)
+        if job is not None:
+            job.cancel()
+            print(f"Job {name} cancelled")
+            self._report()
+
+    def shutdown(self):
+        for name in list(self.jobs):
+            self.cancel(name)
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def _poll(self, job):
+        """Waits (without blocking Tk) for the compute step to finish."""
+        if job.cancelled:
+            return
+        if not job.future.done():
+            self._report()
+            self.widget.after(self.poll_ms, self._poll, job)
+            return
+        try:
+            results = job.future.result()
+        except Exception as e:
+            print(f"Job {job.name} failed: {e}")
+            self._finish(job)
+            return
+        if results is None:  # compute() gave up after being cancelled
+            return
+        job.results = results
+        if job.begin:
+            job.begin()
+        self._apply_slice(job)
+
+    def _apply_slice(self, job):
+        if job.cancelled:
+            return
+        deadline = time.perf_counter() + self.slice_ms / 1000
+        while job.applied < len(job.results):
+            job.apply(job.results[job.applied])
+            job.applied += 1
+            if time.perf_counter() > deadline:
+                break
+        if job.applied < len(job.results):
+            self._report()
+            self.widget.after(1, self._apply_slice, job)
+            return
+        self._finish(job)
+        if job.done:
+            job.done()
+
+    def _finish(self, job):
+        if self.jobs.get(job.name) is job:
+            del self.jobs[job.name]
+        self._report()
+
+    def _report(self):
+        if self.on_progress is None:
+            return
+        if not self.jobs:
+            self.on_progress(None)
+        else:
+            self.on_progress(min(job.progress() for job in self.jobs.values()))
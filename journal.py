@@ -0,0 +1,473 @@
+# journal.py
+import os
+import struct
+
+import numpy as np
+
+from linear_algebra import affine_about, apply_affine
+from flood_fill import baked_patch
+from shape import Stroke, reserve_uid, shape_coords, transform_shape
+from text_layout import text_angle, text_size
+
+DEFAULT_DIR = os.path.join(os.path.expanduser("~"), ".last_sketch")
+
+# Record kinds
+ADD_STROKE = 1
+ADD_SHAPE = 2
+REMOVE = 3
+TRANSFORM = 4
+CLEAR = 5
+
+_MAGIC = b"LSKJ"
+_FILE_HEADER = struct.Struct("<4sI")  # magic, generation
+_RECORD_HEADER = struct.Struct("<BI")  # record kind, payload length
+_STROKE_HEAD = struct.Struct("<IBffI")  # uid, curve flag, thickness, opacity, point count
+_SHAPE_HEAD = struct.Struct("<IfI")  # uid, thickness, coordinate count
+_UID = struct.Struct("<I")
+_MATRIX = struct.Struct("<6d")  # 2x2 matrix, then the center it is applied around
+_PATCH_HEAD = struct.Struct("<IIf")  # mask height, width, pixel size
+_TEXT_HEAD = struct.Struct("<ddI")  # pixel size, angle, text length in bytes
+
+
+class Journal:
+    """
+    Append-only log of scene operations used for autosave and crash recovery.
+
+    Every committed operation is appended as a small binary record; writes are
+    fsync'd in batches. A snapshot of the whole scene is written now and then
+    (in the same record format) so replay only has to cover recent work.
+    With archive on (timelapse recording), the journals a snapshot folds in
+    are kept in an archive, so the session's full history in its original
+    order is still there for timelapses. The archive holds every record of
+    the session and grows with it, about as much as the journal itself
+    would without compaction, which is why it is opt-in.
+    """
+    def __init__(self, directory=DEFAULT_DIR, sync_every=32, compact_after=2000, archive=False):
+        self.directory = directory
+        self.journal_path = os.path.join(directory, "journal.bin")
+        self.snapshot_path = os.path.join(directory, "snapshot.bin")
+        self.archive_path = os.path.join(directory, "archive.bin")
+        self.sync_every = sync_every  # records written between fsyncs
+        self.compact_after = compact_after  # records replayed before a snapshot is due
+        self.archiving = archive  # Whether compactions append the journal to the archive
+        self.generation = 0
+        self.pending = 0
+        self.records_since_snapshot = 0
+        self.file = None
+
+    def has_data(self):
+        """True if a previous session left anything to recover."""
+        for path in (self.snapshot_path, self.journal_path):
+            if os.path.exists(path) and os.path.getsize(path) > _FILE_HEADER.size:
+                return True
+        return False
+
+    def load(self):
+        """
+        Rebuild the scene from the last snapshot plus the journal written after it.
+        Returns (strokes, shapes).
+        """
+        return replay(self.history())
+
+    def history(self):
+        """The records of the last snapshot followed by the journal written after it."""
+        snapshot_gen, snapshot = _read_file(self.snapshot_path)
+        journal_gen, records = _read_file(self.journal_path)
+        if journal_gen != snapshot_gen:
+            # The journal was already folded into the snapshot before a crash
+            records = []
+        self.generation = max(snapshot_gen, journal_gen)
+        return snapshot + records
+
+    def has_archive(self):
+        return os.path.exists(self.archive_path)
+
+    def full_history(self):
+        """
+        Every record of the session in the order it was made: the archived
+        journals, then the current one. Falls back to history() (snapshot
+        order) when nothing was archived yet.
+        """
+        if not self.has_archive():
+            return self.history()
+        _, archived = _read_file(self.archive_path)
+        snapshot_gen, _ = _read_file(self.snapshot_path)
+        journal_gen, records = _read_file(self.journal_path)
+        return archived + (records if journal_gen == snapshot_gen else [])
+
+    def set_archiving(self, enabled):
+        """Turns timelapse recording on or off. Off drops the archive, it would have a gap."""
+        self.archiving = enabled
+        if not enabled:
+            self.drop_archive()
+
+    def drop_archive(self):
+        if self.has_archive():
+            os.remove(self.archive_path)
+
+    def start_archive(self):
+        """
+        Create the archive if there is none, starting from the current
+        snapshot, which holds whatever a restored session began with.
+        """
+        if self.has_archive():
+            return
+        with open(self.archive_path, "wb") as f:
+            f.write(_FILE_HEADER.pack(_MAGIC, 0))
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, "rb") as snapshot:
+                    f.write(snapshot.read()[_FILE_HEADER.size:])
+            f.flush()
+            os.fsync(f.fileno())
+
+    def archive(self):
+        """Append the journal's records to the archive, as a new snapshot folds them in."""
+        generation, records = _read_file(self.journal_path)
+        if generation != self.generation:
+            return  # Stale, a crash left it behind after it was folded in
+        with open(self.archive_path, "ab") as f:
+            for kind, payload in records:  # Whole records only, never a torn tail
+                f.write(_RECORD_HEADER.pack(kind, len(payload)))
+                f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def open(self):
+        """Start a fresh journal on top of the current snapshot."""
+        os.makedirs(self.directory, exist_ok=True)
+        if self.file:
+            self.file.close()
+        self.file = open(self.journal_path, "wb")
+        self.file.write(_FILE_HEADER.pack(_MAGIC, self.generation))
+        self.records_since_snapshot = 0
+        self.sync()
+
+    def reset(self):
+        """Throw away the previous session and start an empty journal."""
+        for path in (self.snapshot_path, self.archive_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.generation = 0
+        self.open()
+
+    def record_stroke(self, stroke):
+        self._append(ADD_STROKE, encode_stroke(stroke))
+
+    def record_shape(self, shape):
+        self._append(ADD_SHAPE, encode_shape(shape))
+
+    def record_remove(self, uid):
+        self._append(REMOVE, _UID.pack(uid))
+
+    def record_transform(self, matrix, center):
+        self._append(TRANSFORM, _MATRIX.pack(matrix[0][0], matrix[0][1], matrix[1][0], matrix[1][1],
+                                             center[0], center[1]))
+
+    def record_clear(self):
+        self._append(CLEAR, b"")
+
+    def _append(self, kind, payload):
+        if not self.file:
+            return
+        self.file.write(_RECORD_HEADER.pack(kind, len(payload)))
+        self.file.write(payload)
+        self.pending += 1
+        self.records_since_snapshot += 1
+        if self.pending >= self.sync_every:
+            self.sync()
+
+    def sync(self):
+        """Flush pending records to disk."""
+        if self.file:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def needs_compaction(self):
+        return self.records_since_snapshot >= self.compact_after
+
+    def compact(self, strokes, shapes):
+        """Write the current scene as the new snapshot and truncate the journal."""
+        compaction = Compaction(self, strokes, shapes)
+        compaction.write()
+        compaction.finish()
+
+    def close(self):
+        if self.file:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+
+class Compaction:
+    """
+    A snapshot written off the Tk thread. The scene is frozen when it starts
+    (cheap, see freeze_scene), write() encodes it into a temporary file on a
+    worker while the journal keeps taking records, then finish(), back on
+    the Tk thread, appends those records to the snapshot and swaps it in.
+    Until then recovery still reads the old snapshot and journal.
+    """
+    def __init__(self, journal, strokes, shapes):
+        self.journal = journal
+        self.file = journal.file
+        self.mark = journal.file.tell() if journal.file else None  # Records after this go in the snapshot too
+        self.generation = journal.generation + 1
+        self.encoders = freeze_scene(strokes, shapes)
+        self.counts = len(strokes), len(shapes)
+        self.tmp_path = journal.snapshot_path + ".tmp"
+
+    def write(self, job=None):
+        """Encode the frozen scene. Returns False if the job was cancelled."""
+        os.makedirs(self.journal.directory, exist_ok=True)
+        with open(self.tmp_path, "wb") as f:
+            f.write(_FILE_HEADER.pack(_MAGIC, self.generation))
+            for i, (kind, encode) in enumerate(self.encoders):
+                if job is not None:
+                    if job.cancelled:
+                        return False
+                    job.report(i, len(self.encoders))
+                payload = encode()
+                f.write(_RECORD_HEADER.pack(kind, len(payload)))
+                f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        return True
+
+    def finish(self):
+        """Carry over what was journaled meanwhile, then make the snapshot current."""
+        journal = self.journal
+        if journal.file is not self.file:
+            print("Journal restarted during compaction, snapshot dropped")
+            os.remove(self.tmp_path)
+            return
+        tail = b""
+        if self.file:
+            journal.sync()
+            with open(journal.journal_path, "rb") as f:
+                f.seek(self.mark)
+                tail = f.read()
+        with open(self.tmp_path, "ab") as f:
+            f.write(tail)
+            f.flush()
+            os.fsync(f.fileno())
+        if journal.archiving:
+            journal.start_archive()
+        os.replace(self.tmp_path, journal.snapshot_path)
+        if journal.archiving:
+            # Archived after the swap, a crash in between must not archive the journal twice
+            journal.archive()
+        else:
+            journal.drop_archive()  # Left by a recording session, and missing this journal now
+        journal.generation = self.generation
+        journal.open()
+        print(f"Journal compacted: {self.counts[0]} strokes, {self.counts[1]} shapes, "
+              f"{len(tail)} bytes carried over")
+
+
+def save_document(path, strokes, shapes):
+    """Save a scene as a .sketch document (same format as a journal snapshot)."""
+    with open(path, "wb") as f:
+        f.write(_FILE_HEADER.pack(_MAGIC, 0))
+        write_scene(f, strokes, shapes)
+
+
+def load_document(path):
+    """
+    Load a .sketch document, a single journal/snapshot file, or a recorded
+    session directory holding both. Returns (strokes, shapes).
+    """
+    return replay(document_records(path))
+
+
+def document_records(path, full=False):
+    """
+    The records of a .sketch document, journal/snapshot file or session
+    directory. full asks a session for its whole history, archive included.
+    """
+    if os.path.isdir(path):
+        journal = Journal(path)
+        return journal.full_history() if full else journal.history()
+    _, records = _read_file(path)
+    return records
+
+
+def write_scene(f, strokes, shapes):
+    """Write a whole scene as a series of add records."""
+    for kind, encode in freeze_scene(strokes, shapes):
+        payload = encode()
+        f.write(_RECORD_HEADER.pack(kind, len(payload)))
+        f.write(payload)
+
+
+def freeze_scene(strokes, shapes):
+    """
+    (record kind, encode) pairs for a whole scene. Only what edits replace is
+    captured here; the encoding, the expensive part, happens when encode()
+    is called, which is safe on a worker thread.
+    """
+    return ([(ADD_STROKE, freeze_stroke(stroke)) for stroke in strokes]
+            + [(ADD_SHAPE, freeze_shape(shape)) for shape in shapes])
+
+
+def read_records(data):
+    """Split raw bytes into (kind, payload) records, stopping at a torn tail."""
+    records = []
+    offset = 0
+    while offset + _RECORD_HEADER.size <= len(data):
+        kind, length = _RECORD_HEADER.unpack_from(data, offset)
+        offset += _RECORD_HEADER.size
+        if offset + length > len(data):
+            break
+        records.append((kind, data[offset:offset + length]))
+        offset += length
+    return records
+
+
+def replay(records):
+    """Apply records in order and return the resulting (strokes, shapes)."""
+    objects = {}
+    for _, _, objects in replay_steps(records):
+        pass
+    strokes = [obj for obj in objects.values() if isinstance(obj, Stroke)]
+    shapes = [obj for obj in objects.values() if isinstance(obj, dict)]
+    return strokes, shapes
+
+
+def replay_steps(records):
+    """
+    Apply records in order, yielding (kind, added, objects) after each one.
+    added is the object an add record created (None for other records) and
+    objects the scene so far: uid -> Stroke or shape dict, in insertion order.
+    """
+    objects = {}
+    for kind, payload in records:
+        added = None
+        if kind == ADD_STROKE:
+            added = decode_stroke(payload)
+            objects[added.uid] = added
+        elif kind == ADD_SHAPE:
+            added = decode_shape(payload)
+            objects[added["uid"]] = added
+        elif kind == REMOVE:
+            objects.pop(_UID.unpack(payload)[0], None)
+        elif kind == TRANSFORM:
+            a, b, c, d, cx, cy = _MATRIX.unpack(payload)
+            transform_objects(objects.values(), [[a, b], [c, d]], (cx, cy))
+        elif kind == CLEAR:
+            objects.clear()
+        yield kind, added, objects
+
+
+def transform_objects(objects, matrix, center):
+    """
+    Apply a 2x2 matrix around center to strokes and shapes. Only their
+    transform matrices change, the points are baked later.
+    """
+    affine = affine_about(matrix, center)
+    for obj in objects:
+        if isinstance(obj, Stroke):
+            obj.transform(affine)
+        else:
+            transform_shape(obj, affine)
+
+
+def encode_stroke(stroke):
+    return freeze_stroke(stroke)()
+
+
+def freeze_stroke(stroke):
+    """A function encoding the stroke as it is now, see freeze_scene."""
+    read, matrix = stroke.points_reader(), stroke.matrix
+    head = (stroke.uid, int(stroke.curve), stroke.thickness, stroke.opacity)
+    strings = _pack_str(stroke.color) + _pack_str(stroke.brush)
+
+    def encode():
+        points = read()
+        if matrix is not None and len(points):
+            points = apply_affine(matrix, points)
+        points = np.asarray(points, dtype="<f8").reshape(-1, 2)
+        return _STROKE_HEAD.pack(*head, len(points)) + strings + points.tobytes()
+    return encode
+
+
+def decode_stroke(payload):
+    uid, curve, thickness, opacity, count = _STROKE_HEAD.unpack_from(payload)
+    offset = _STROKE_HEAD.size
+    color, offset = _unpack_str(payload, offset)
+    brush, offset = _unpack_str(payload, offset)
+    points = np.frombuffer(payload, dtype="<f8", count=count * 2, offset=offset).reshape(-1, 2)
+    return Stroke([tuple(p) for p in points.tolist()], color=color, thickness=round(thickness, 3),
+                  opacity=opacity, brush=brush, curve=bool(curve), uid=uid)
+
+
+def freeze_shape(shape):
+    """A function encoding the shape as it is now, see freeze_scene."""
+    shape = dict(shape)  # Edits replace a shape's values rather than modifying them
+    return lambda: encode_shape(shape)
+
+
+def encode_shape(shape):
+    if "mask" in shape:
+        # Raster fill patch: origin as coords, then the mask as packed bits
+        mask, origin = baked_patch(shape)
+        coords = np.asarray(origin, dtype="<f8")
+        extra = _PATCH_HEAD.pack(*mask.shape, shape["pixel_size"]) + np.packbits(mask > 0).tobytes()
+    elif shape["type"] == "text":
+        # Anchor as coords, then size, angle, font and the text itself
+        coords = np.asarray(shape_coords(shape), dtype="<f8")
+        text = shape["text"].encode("utf-8")
+        extra = _TEXT_HEAD.pack(text_size(shape), text_angle(shape), len(text)) + _pack_str(shape["font"]) + text
+    else:
+        coords = np.asarray(shape_coords(shape), dtype="<f8")
+        extra = b""
+    return (_SHAPE_HEAD.pack(shape["uid"], shape["thickness"], len(coords))
+            + _pack_str(shape["type"]) + _pack_str(shape["color"]) + coords.tobytes() + extra)
+
+
+def decode_shape(payload):
+    uid, thickness, count = _SHAPE_HEAD.unpack_from(payload)
+    offset = _SHAPE_HEAD.size
+    shape_type, offset = _unpack_str(payload, offset)
+    color, offset = _unpack_str(payload, offset)
+    coords = np.frombuffer(payload, dtype="<f8", count=count, offset=offset).tolist()
+    offset += count * 8
+    reserve_uid(uid)
+    shape = {"id": None, "uid": uid, "coords": coords, "type": shape_type,
+             "color": color, "thickness": round(thickness, 3), "matrix": None}
+    if shape_type == "text":
+        size, angle, length = _TEXT_HEAD.unpack_from(payload, offset)
+        font, offset = _unpack_str(payload, offset + _TEXT_HEAD.size)
+        shape.update(text=bytes(payload[offset:offset + length]).decode("utf-8"), font=font,
+                     size=size, angle=angle)
+    elif offset < len(payload):
+        height, width, pixel_size = _PATCH_HEAD.unpack_from(payload, offset)
+        bits = np.frombuffer(payload, dtype=np.uint8, offset=offset + _PATCH_HEAD.size)
+        shape["mask"] = np.unpackbits(bits, count=height * width).reshape(height, width) * np.uint8(255)
+        shape["pixel_size"] = pixel_size
+    return shape
+
+
+def _read_file(path):
+    """Return (generation, records) for a journal or snapshot file."""
+    if not os.path.exists(path):
+        return 0, []
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _FILE_HEADER.size:
+        return 0, []
+    magic, generation = _FILE_HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        print(f"Ignoring unrecognised journal file: {path}")
+        return 0, []
+    return generation, read_records(memoryview(data)[_FILE_HEADER.size:])
+
+
+def _pack_str(text):
+    data = text.encode("utf-8")[:255]
+    return bytes([len(data)]) + data
+
+
+def _unpack_str(payload, offset):
+    length = payload[offset]
+    start = offset + 1
+    return bytes(payload[start:start + length]).decode("utf-8"), start + length
@@ -2,6 +2,8 @@
 import math
 import random
 
+import numpy as np
+
 def multiply_matrix_vector(matrix, vector):
     """
     Multiply a 2x2 matrix by a 2-element vector.
@@ -16,9 +18,13 @@ def rotation_matrix(angle_degrees):
     """
     Return a 2x2 rotation matrix for the given angle in degrees.
     """
-    angle_rad = math.radians(angle_degrees)
-    cos_a = math.cos(angle_rad)
-    sin_a = math.sin(angle_rad)
+    if angle_degrees % 90 == 0:
+        # Exact values for quarter turns so repeated rotations don't drift
+        cos_a, sin_a = [(1, 0), (0, 1), (-1, 0), (0, -1)][int(angle_degrees // 90) % 4]
+    else:
+        angle_rad = math.radians(angle_degrees)
+        cos_a = math.cos(angle_rad)
+        sin_a = math.sin(angle_rad)
     return [
         [cos_a, -sin_a],
         [sin_a, cos_a]
@@ -52,4 +58,58 @@ def generate_pencil_texture():
     """
     Generates a random grainy effect for pencil strokes.
     """
-    return [(random.randint(-1, 1), random.randint(-1, 1)) for _ in range(5)]
\ No newline at end of file
+    return [(random.randint(-1, 1), random.randint(-1, 1)) for _ in range(5)]
+
+def affine_about(matrix, center):
+    """
+    Return the 3x3 affine matrix that applies a 2x2 matrix around a center point.
+    """
+    affine = np.eye(3)
+    affine[:2, :2] = matrix
+    affine[:2, 2] = np.asarray(center, dtype=float) - affine[:2, :2] @ np.asarray(center, dtype=float)
+    return affine
+
+def apply_affine(affine, points):
+    """
+    Apply a 3x3 affine matrix to a list of points in one vectorized step.
+    Returns an (N, 2) array.
+    """
+    pts = np.asarray(points, dtype=float).reshape(-1, 2)
+    return pts @ affine[:2, :2].T + affine[:2, 2]
+
+def polyline_distance(point, points):
+    """
+    Shortest distance from a point to a polyline, all segments at once.
+    """
+    pts = np.asarray(points, dtype=float).reshape(-1, 2)
+    p = np.asarray(point, dtype=float)
+    if len(pts) == 0:
+        return math.inf
+    if len(pts) == 1:
+        return float(np.hypot(*(pts[0] - p)))
+    a, ab = pts[:-1], np.diff(pts, axis=0)
+    length2 = (ab * ab).sum(axis=1)
+    t = np.clip(((p - a) * ab).sum(axis=1) / np.where(length2 == 0, 1, length2), 0, 1)
+    gap = a + ab * t[:, None] - p
+    return float(np.sqrt((gap * gap).sum(axis=1).min()))
+
+def symmetry_affines(mode, center, count=6):
+    """
+    3x3 affines taking a point to each of its symmetric copies, identity
+    first: "mirror" reflects across the vertical axis through center,
+    "radial" rotates by multiples of 360/count degrees around it.
+    Returns an (N, 3, 3) array.
+    """
+    if mode == "mirror":
+        matrices = [scale_matrix(1, 1), scale_matrix(-1, 1)]
+    else:
+        matrices = [rotation_matrix(360 * k / count) for k in range(count)]
+    return np.stack([affine_about(matrix, center) for matrix in matrices])
+
+def apply_affines(affines, points):
+    """
+    Apply N 3x3 affines to the same points in one batched multiply.
+    Returns an (N, M, 2) array, one row of points per affine.
+    """
+    pts = np.asarray(points, dtype=float).reshape(-1, 2)
+    return np.einsum("nij,mj->nmi", affines[:, :2, :2], pts) + affines[:, None, :2, 2]
@@ -1,26 +1,200 @@
 # main.py
 import tkinter as tk
 from tkinter import colorchooser, filedialog,ttk
-from tkinter import simpledialog
+from tkinter import simpledialog, messagebox
 
-from cv2 import transform
 import cv2
 import numpy as np
-from linear_algebra import rotation_matrix, scale_matrix, multiply_matrix_vector
-from shape import Stroke
+from linear_algebra import affine_about, polyline_distance, rotation_matrix, scale_matrix
+from shape import FrozenStroke, Stroke, new_uid, shape_coords, rectangle_corners, bake_shape
+from journal import Compaction, Journal, transform_objects, save_document
 from Tooltip import Tooltip  # Import the Tooltip class
+from reference_viewer import ReferenceCache, ReferenceWindow
+from renderer import render_scene
+from flood_fill import flood_fill_mask, make_fill, fill_patch_image
+from chunks import ChunkStore, PointPager, object_uid, rebase_boxes
+from jobs import JobScheduler
+from cold_storage import ColdStore
+from canvas_backend import TkCanvas
+from timelapse import export_timelapse
+from snapping import SnapIndex, rebase_points, snap_points, snap_to_grid
+from tiles import STROKE_PAD, TileCache, render_tile
+from symmetry import Symmetry
+from text_layout import DEFAULT_FONT, DEFAULT_SIZE, font_pixels, metrics, text_angle, text_contains, text_size, tk_measure
+from memory import CANVAS_ITEM_BYTES, MemoryMonitor, format_report, image_bytes, shape_bytes, write_report
 from PIL import Image, ImageGrab, ImageTk
 import math
 import os
 import random
+import tempfile
+import time
+
+# Tk capstyle used when redrawing a stored stroke of each brush
+BRUSH_CAPS = {
+    "round": tk.ROUND,
+    "watercolor": tk.ROUND,
+    "charcoal": tk.BUTT,
+    "pencil": tk.ROUND,
+    "marker": tk.PROJECTING,
+}
 
 class SketchApp:
-    def __init__(self, root):
+    def __init__(self, root, canvas=None, journal_dir=None):
+        """
+        root is the Tk root window. Headless runs (tests, benchmarks) pass
+        root=None and a canvas_backend.MemoryCanvas: toolbars, dialogs and
+        key bindings are skipped, everything else runs as usual.
+        """
         self.root = root
-        self.root.title("Advanced Sketcher with Linear Algebra")
         self.canvas_width = 800
         self.canvas_height = 600
         self.shape_history = []
+
+        # Default drawing settings
+        self.current_tool = "draw"  # Options: "draw", "eyedrop"
+        self.current_color = "black"
+        self.brush_thickness = 2
+        self.opacity = 1.0
+        self.brush_style = "round"  # Options: round, butt, projecting
+        self.last_x, self.last_y = None, None
+        self.current_shape = None
+        self.current_stroke = None
+        self.curve_tolerance = 2.0  # Max distance (px) between a fitted curve and the drawn points
+        self.curve_splinesteps = 12  # Line segments Tk uses per Bézier segment
+        self.lod_tolerance = 0.5  # Max on-screen error (px) allowed when simplifying strokes
+
+        # Snapping for the shape tools and stroke starts
+        self.snaps = SnapIndex()
+        self.snap_enabled = False
+        self.snap_grid = False  # Fall back to the grid when no geometry is near
+        self.snap_radius = 10  # px
+        self.grid_size = 20  # px
+        self.snap_marker = None
+
+        # Symmetry for the draw and shape tools, around the view center
+        self.symmetry_mode = None  # None, "mirror" or "radial"
+        self.symmetry_count = 6  # Copies in radial mode
+        self.symmetry = None  # Symmetry of the stroke or shape being drawn
+        self.current_copies = []  # Linked copies of the stroke being drawn
+        self.shape_previews = []  # Canvas items previewing symmetric shape copies
+
+        # Undo and Redo stacks
+        self.undo_stack = []  # Stores (item_id, coords)
+        self.redo_stack = []
+
+        # Zoom settings
+        self.scale_factor = 1.0  # Initial zoom level
+
+        # Rotate/zoom only compose per-object matrices, baked into points when idle
+        self.bake_delay_ms = 2000
+        self.bake_budget_ms = 8  # Baking work per idle callback, the rest carries on in the next one
+        self.bake_job = None
+
+        # Timelapse recording keeps every compacted journal, so it is off unless asked for
+        self.record_timelapse = False
+
+        # Optionally, committed strokes are baked into a few backing images instead
+        # of one canvas item each; only the stroke being drawn stays a vector item
+        self.tile_strokes = False
+
+        self.progress = None  # Progress bar, part of the toolbars
+        if root is not None:
+            self.build_ui()
+            metrics.use(tk_measure(root))  # Text extents measured the way the canvas draws them
+
+        # Main canvas
+        if canvas is None:
+            canvas = TkCanvas(root, bg="white", width=self.canvas_width, height=self.canvas_height)
+            canvas.pack(pady=30)  # Adds 10 pixels of space below the canvas
+        self.canvas = canvas
+
+        # Dictionary to track text and shape items
+        self.text_items = {}  # uid -> text shape dict, the text objects in the scene
+        self.shape_items = {}
+        self.strokes = []  # List of stroke objects
+        self.shapes = []  # List of shape dicts (rectangle, circle, line)
+        self.initial_coords = []  # Initialize as an empty list
+        
+        # Variables for dragging and resizing
+        self.selected_item = None
+        self.start_x = 0
+        self.start_y = 0
+        
+        # Variables for dragging text
+        self.selected_text = None  # Text shape being dragged
+        self.text_grab = None  # Where the drag started
+        self.start_x = 0
+        self.start_y = 0
+
+        # Variable for Perspective Transform
+        self.perspective_points = []
+        self.point_ids = []
+
+        # Paint bucket settings
+        self.fill_tolerance = 32  # Max per-channel difference from the clicked color
+        self.fill_scale = 1.0  # Offscreen render resolution used for filling
+        self.fill_images = {}  # uid -> PhotoImage of raster fill patches
+
+        # Per-subsystem memory budgets, checked every few seconds
+        self.memory = MemoryMonitor()
+        self.memory_check_ms = 10000
+        self.history_dropped = {"steps": 0, "bytes": 0}  # Undo steps given up to stay in budget
+
+        # Decoded reference images, shared by every reference window
+        self.reference_cache = ReferenceCache(self.memory.budgets["reference_cache"])
+
+        # Unbounded document split into chunks; only chunks near the view have
+        # canvas items and in-memory points, the rest are paged out to disk
+        self.pager = PointPager()
+        self.chunks = ChunkStore()
+        self.chunk_margin = 1  # Chunks kept materialized around the visible ones
+        self.visible_chunks = set()
+        self.materialized = {}  # uid -> object that currently has canvas items
+        self.canvas.config(confine=False, xscrollincrement=1, yscrollincrement=1)
+
+        self.tiles = TileCache()
+        self.tile_items = {}  # tile key -> (image, PhotoImage, canvas item) currently shown
+        self.tile_live = []  # Finished strokes still drawn as vector items until their tiles re-bake
+        self.tile_delay_ms = 100
+        self.tile_job = None
+
+        # Strokes nobody touched for a sweep interval are kept compressed in memory
+        self.cold = ColdStore()
+        self.cold_sweep_ms = 30000
+
+        # Heavy redraws and warps are computed off the Tk thread
+        self.jobs = JobScheduler(self.canvas, on_progress=self.show_progress)
+        
+        # Bind a **single dispatcher** for each mouse event
+        self.canvas.bind("<ButtonPress-1>", self.on_mouse_press)
+        self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
+        self.canvas.bind("<ButtonRelease-1>", self.on_mouse_release)
+
+        # Middle-drag or arrow keys scroll around the document
+        self.canvas.bind("<ButtonPress-2>", self.pan_start)
+        self.canvas.bind("<B2-Motion>", self.pan_drag)
+
+        if root is not None:
+            self.bind_keys()
+
+        # Autosave journal, offer to restore whatever the last session left behind.
+        # Headless runs get a scratch journal so they never touch the real autosave.
+        if journal_dir is None and root is None:
+            journal_dir = tempfile.mkdtemp(prefix="sketch-journal-")
+        self.journal = Journal(journal_dir) if journal_dir else Journal()
+        if root is not None:
+            self.restore_session()
+            self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        else:
+            self.journal.reset()
+        self.canvas.after(1000, self.journal_tick)
+        self.canvas.after(self.cold_sweep_ms, self.cold_tick)
+        self.canvas.after(self.memory_check_ms, self.memory_tick)
+
+    def build_ui(self):
+        """Toolbars, panels, buttons and their tooltips."""
+        root = self.root
+        self.root.title("Advanced Sketcher with Linear Algebra")
         # Get the absolute path for the icons directory
         BASE_DIR = os.path.dirname(os.path.abspath(__file__))
         ICON_DIR = os.path.join(BASE_DIR, "icons")
@@ -57,6 +231,7 @@ class SketchApp:
         self.icon_brush = load_resized_icon("brush.png")
         self.icon_ref = load_resized_icon("ref.png")
         self.icon_perspective = load_resized_icon("perspective.png")
+        self.icon_fill = load_resized_icon("fill.png")
 
         # Toolbar frame (full width)
         self.toolbar = tk.Frame(root)
@@ -74,18 +249,6 @@ class SketchApp:
         self.right_panel = tk.Frame(self.root, padx=70, pady=50)
         self.right_panel.pack(side=tk.RIGHT, fill=tk.Y)
 
-        # Main canvas
-        self.canvas = tk.Canvas(root, bg="white", width=self.canvas_width, height=self.canvas_height)
-        self.canvas.pack(pady=30)  # Adds 10 pixels of space below the canvas
-
-        # Default drawing settings
-        self.current_tool = "draw"  # Options: "draw", "eyedrop"
-        self.current_color = "black"
-        self.brush_thickness = 2
-        self.opacity = 1.0
-        self.brush_style = "round"  # Options: round, butt, projecting
-        self.last_x, self.last_y = None, None
-        self.current_shape = None
         # === CANVAS WILL BE PLACED IN THE CENTER ===
 
         # === Update Buttons to Use Icons ===
@@ -108,13 +271,6 @@ class SketchApp:
         self.btn_eyedrop = tk.Button(self.nav_tools, image=self.icon_eyedrop, command=lambda: self.set_tool("eyedrop"))
         self.btn_eyedrop.pack(side=tk.LEFT, padx=3)
         
-        # Undo and Redo stacks
-        self.undo_stack = []  # Stores (item_id, coords)
-        self.redo_stack = []
-
-        # Bind keyboard shortcuts for undo/redo
-        self.root.bind("<Control-z>", self.undo)
-        self.root.bind("<Control-y>", self.redo)
 
         self.btn_text = tk.Button(self.nav_tools, image=self.icon_text, command=lambda: self.set_tool("text"))
         self.btn_text.pack(side=tk.LEFT, padx=3)
@@ -143,6 +299,16 @@ class SketchApp:
         self.btn_perspective = tk.Button(self.nav_tools, image=self.icon_perspective, command=lambda: self.set_tool("perspective"))
         self.btn_perspective.pack(side=tk.LEFT, padx=3)
 
+        self.btn_fill = tk.Button(self.nav_tools, image=self.icon_fill, text="Fill", command=lambda: self.set_tool("fill"))
+        self.btn_fill.pack(side=tk.LEFT, padx=3)
+
+        self.btn_timelapse = tk.Button(self.nav_tools, text="Timelapse", command=self.save_timelapse)
+        self.btn_timelapse.pack(side=tk.LEFT, padx=3)
+        self.record_var = tk.BooleanVar(value=self.record_timelapse)
+        self.chk_record = tk.Checkbutton(self.nav_tools, text="Record", variable=self.record_var,
+                                         command=lambda: self.set_timelapse_recording(self.record_var.get()))
+        self.chk_record.pack(side=tk.LEFT, padx=3)
+
         # === LEFT PANEL: Shape Tools ===
         self.btn_rectangle = tk.Button(self.left_panel, image=self.icon_rectangle, command=lambda: self.set_tool("rectangle"))
         self.btn_rectangle.pack(pady=10)
@@ -153,6 +319,24 @@ class SketchApp:
         self.btn_line = tk.Button(self.left_panel, image=self.icon_line, command=lambda: self.set_tool("line"))
         self.btn_line.pack(pady=10)
 
+        self.snap_var = tk.BooleanVar(value=self.snap_enabled)
+        self.chk_snap = tk.Checkbutton(self.left_panel, text="Snap", variable=self.snap_var,
+                                       command=lambda: setattr(self, "snap_enabled", self.snap_var.get()))
+        self.chk_snap.pack(anchor=tk.W)
+        self.grid_var = tk.BooleanVar(value=self.snap_grid)
+        self.chk_grid = tk.Checkbutton(self.left_panel, text="Grid", variable=self.grid_var,
+                                       command=lambda: setattr(self, "snap_grid", self.grid_var.get()))
+        self.chk_grid.pack(anchor=tk.W)
+        self.tiles_var = tk.BooleanVar(value=self.tile_strokes)
+        self.chk_tiles = tk.Checkbutton(self.left_panel, text="Bake tiles", variable=self.tiles_var,
+                                        command=lambda: self.set_tile_mode(self.tiles_var.get()))
+        self.chk_tiles.pack(anchor=tk.W)
+        self.symmetry_selector = ttk.Combobox(self.left_panel, values=["no symmetry", "mirror", "radial 4", "radial 6", "radial 8"],
+                                              state="readonly", width=12)
+        self.symmetry_selector.current(0)
+        self.symmetry_selector.bind("<<ComboboxSelected>>", lambda event: self.set_symmetry(self.symmetry_selector.get()))
+        self.symmetry_selector.pack(pady=5)
+
         # Sliders Frame (Inside Left Panel)
         self.slider_frame = tk.Frame(self.left_panel)
         self.slider_frame.pack(pady=5, fill=tk.X)
@@ -171,8 +355,10 @@ class SketchApp:
 
         self.btn_zoom_out = tk.Button(self.right_panel, image=self.icon_zoom_out, command=self.zoom_out_strokes)
         self.btn_zoom_out.pack(pady=5, fill=tk.X)
-        # Zoom settings
-        self.scale_factor = 1.0  # Initial zoom level
+
+        # Progress of background redraws and warps
+        self.progress = ttk.Progressbar(self.right_panel, mode="determinate", maximum=100, length=80)
+        self.progress.pack(pady=5, fill=tk.X)
         
         # Add tooltips for buttons
         Tooltip(self.btn_draw, "Freehand Drawing Tool")
@@ -194,32 +380,372 @@ class SketchApp:
         Tooltip(self.btn_zoom_out, "Zoom Out")
         Tooltip(self.btn_reference, "Open Reference Image")
         Tooltip(self.btn_perspective, "Perspective Transform")
+        Tooltip(self.btn_fill, "Paint Bucket")
+        Tooltip(self.btn_timelapse, "Export Process Video")
+        Tooltip(self.chk_record, "Record Full History for Timelapses")
+        Tooltip(self.symmetry_selector, "Symmetry for Drawing and Shapes")
 
-        
-        # Dictionary to track text and shape items
-        self.text_items = {}
-        self.shape_items = {}
-        self.strokes = []  # List of stroke objects
-        self.initial_coords = []  # Initialize as an empty list
-        
-        # Variables for dragging and resizing
-        self.selected_item = None
-        self.start_x = 0
-        self.start_y = 0
-        
-        # Variables for dragging text
-        self.selected_text = None
-        self.start_x = 0
-        self.start_y = 0
-
-        # Variable for Perspective Transform
-        self.perspective_points = []
-        self.point_ids = []
-        
-        # Bind a **single dispatcher** for each mouse event
-        self.canvas.bind("<ButtonPress-1>", self.on_mouse_press)
-        self.canvas.bind("<B1-Motion>", self.on_mouse_drag)
-        self.canvas.bind("<ButtonRelease-1>", self.on_mouse_release)
+    def bind_keys(self):
+        # Bind keyboard shortcuts for undo/redo
+        self.root.bind("<Control-z>", self.undo)
+        self.root.bind("<Control-y>", self.redo)
+        self.root.bind("<Control-b>", self.bake_transforms)
+        self.root.bind("<Control-m>", self.show_memory_report)
+
+        # Arrow keys scroll around the document
+        self.root.bind("<Left>", lambda event: self.pan_by(-100, 0))
+        self.root.bind("<Right>", lambda event: self.pan_by(100, 0))
+        self.root.bind("<Up>", lambda event: self.pan_by(0, -100))
+        self.root.bind("<Down>", lambda event: self.pan_by(0, 100))
+
+    def restore_session(self):
+        """Offers to rebuild the scene from the autosave journal."""
+        if self.journal.has_data() and messagebox.askyesno(
+                "Restore Sketch", "Restore the drawing from your last session?", parent=self.root):
+            self.strokes, self.shapes = self.journal.load()
+            print(f"Restored {len(self.strokes)} strokes and {len(self.shapes)} shapes")
+            # A session that was recording a timelapse carries on recording
+            self.set_timelapse_recording(self.journal.has_archive())
+            self.chunks.rebuild(self.strokes + self.shapes)
+            for obj in self.strokes + self.shapes:
+                self.snaps.add(object_uid(obj), snap_points(obj))
+            self.text_items = {shape["uid"]: shape for shape in self.shapes if shape["type"] == "text"}
+            self.redraw_canvas_async()
+            # Fold the replayed work into a snapshot so the next launch starts from here
+            self.journal.compact(self.strokes, self.shapes)
+        else:
+            self.journal.reset()
+
+    def journal_tick(self):
+        """Periodically flushes the journal and compacts it when it grows long."""
+        if self.journal.needs_compaction() and not self.jobs.running("compact"):
+            self.compact_journal()
+        elif self.journal.pending:
+            self.journal.sync()
+        self.canvas.after(1000, self.journal_tick)
+
+    def compact_journal(self):
+        """Writes a new journal snapshot on a worker thread, edits made meanwhile are carried over."""
+        compaction = Compaction(self.journal, self.strokes, self.shapes)
+
+        def compute(job):
+            return [] if compaction.write(job) else None
+
+        self.jobs.submit("compact", compute, lambda result: None, done=compaction.finish)
+
+    def cold_tick(self):
+        """
+        Periodically compresses strokes that haven't been read since the last
+        sweep, a few milliseconds at a time so drawing never stutters.
+        """
+        count, finished = self.cold.sweep(self.strokes)
+        if count:
+            stats = self.cold.stats()
+            print(f"Compressed {count} cold strokes, {stats['saved_bytes'] / 1e6:.1f} MB saved ({stats['ratio']}x)")
+        self.canvas.after(self.cold_sweep_ms if finished else 15, self.cold_tick)
+
+    def memory_usage(self):
+        """Bytes held by each subsystem, for MemoryMonitor.report()."""
+        points = packed = lod = 0
+        for stroke in self.strokes:
+            p, c, l = stroke.memory()
+            points += p
+            packed += c
+            lod += l
+        history = sum(self.history_bytes(entry) for entry in self.undo_stack + self.redo_stack)
+        images = (image_bytes(getattr(self, "imported_image", None)) + image_bytes(getattr(self.canvas, "image", None))
+                  + sum(image_bytes(photo) for photo in self.fill_images.values())
+                  + sum(image_bytes(image) for image in self.tiles.images.values()))
+        items = len(self.canvas.find_all())
+        cold = self.cold.stats()
+        return {
+            "stroke_points": {"bytes": points, "strokes": len(self.strokes),
+                              "paged_to_disk_bytes": self.pager.stored * 16},
+            "stroke_compressed": {"bytes": packed, "strokes": cold["compressed_strokes"],
+                                  "saved_bytes": cold["saved_bytes"]},
+            "lod_cache": lod,
+            "shapes": sum(shape_bytes(shape) for shape in self.shapes),
+            "history": {"bytes": history, "undo": len(self.undo_stack), "redo": len(self.redo_stack),
+                        "dropped_steps": self.history_dropped["steps"], "dropped_bytes": self.history_dropped["bytes"]},
+            "images": images,
+            "reference_cache": {"bytes": self.reference_cache.bytes, "entries": len(self.reference_cache.entries)},
+            "canvas_items": {"bytes": items * CANVAS_ITEM_BYTES, "items": items},
+        }
+
+    def history_bytes(self, entry):
+        """What an undo/redo entry keeps alive beyond the scene itself."""
+        if isinstance(entry, Image.Image):
+            return image_bytes(entry)  # Bitmap from save_canvas_state
+        if isinstance(entry, Stroke) or entry["type"] not in ("erase", "add", "clear"):
+            objects = [entry]
+        elif entry["type"] in ("erase", "add"):
+            objects = entry["objects"]
+        else:
+            objects = entry["strokes"] + entry["shapes"]
+        size = 0
+        for obj in objects:
+            if object_uid(obj) in self.chunks.objects:
+                continue  # Still in the scene, counted there
+            size += sum(obj.memory()) if isinstance(obj, Stroke) else shape_bytes(obj)
+        return size
+
+    def memory_report(self, trace=False):
+        """JSON-ready memory report; trace=True also starts tracemalloc."""
+        return self.memory.report(self.memory_usage(), trace=trace)
+
+    def show_memory_report(self, event=None):
+        """Prints the memory report and saves it as JSON next to the autosave journal."""
+        report = self.memory_report(trace=True)
+        print(format_report(report))
+        path = os.path.join(self.journal.directory, "memory_report.json")
+        write_report(report, path)
+        print(f"Memory report written to {path}")
+        return report
+
+    def memory_tick(self):
+        self.enforce_memory_budgets()
+        self.canvas.after(self.memory_check_ms, self.memory_tick)
+
+    def enforce_memory_budgets(self):
+        """Evicts from every subsystem that went over its budget."""
+        usage = self.memory_usage()
+        size = {name: value["bytes"] if isinstance(value, dict) else value for name, value in usage.items()}
+
+        if self.memory.over_budget("history", size["history"]):
+            # Drop the oldest history, from the bottom of the undo stack. Redo steps are the most
+            # recent work and the next edit clears them anyway
+            dropped = 0
+            while self.memory.over_budget("history", size["history"]) and self.undo_stack:
+                freed = self.history_bytes(self.undo_stack.pop(0))
+                size["history"] -= freed
+                self.history_dropped["steps"] += 1
+                self.history_dropped["bytes"] += freed
+                dropped += 1
+            print(f"History over budget, dropped the {dropped} oldest undo steps")
+
+        # Strokes off screen give up memory first
+        order = ([stroke for stroke in self.strokes if stroke.uid not in self.materialized]
+                 + [stroke for stroke in self.strokes if stroke.uid in self.materialized])
+
+        if self.memory.over_budget("stroke_points", size["stroke_points"]):
+            compressed = 0
+            for stroke in order:
+                if not self.memory.over_budget("stroke_points", size["stroke_points"]):
+                    break
+                resident = stroke.memory()[0]
+                if stroke.compress(self.cold):
+                    size["stroke_points"] -= resident
+                    compressed += 1
+            print(f"Stroke points over budget, compressed {compressed} strokes")
+
+        if self.memory.over_budget("lod_cache", size["lod_cache"]):
+            for stroke in order:
+                if not self.memory.over_budget("lod_cache", size["lod_cache"]):
+                    break
+                size["lod_cache"] -= stroke.memory()[2]
+                stroke.drop_lod()
+            print("LOD cache over budget, dropped simplified levels")
+
+        # The reference cache evicts by itself, just keep its limit in step
+        budget = self.memory.budgets["reference_cache"]
+        self.reference_cache.max_bytes = budget if budget is not None else float("inf")
+        self.reference_cache.trim()
+        size["reference_cache"] = self.reference_cache.bytes
+
+        over = [name for name in size if self.memory.over_budget(name, size[name])]
+        if over:
+            print(f"Still over memory budget: {', '.join(over)}")
+
+    def on_close(self):
+        self.jobs.shutdown()
+        self.journal.close()
+        self.pager.close()
+        if self.root is not None:
+            self.root.destroy()
+
+    def to_world(self, event):
+        """Converts an event's window coordinates to document coordinates (the view scrolls)."""
+        event.view_x, event.view_y = event.x, event.y
+        event.x, event.y = self.canvas.canvasx(event.x), self.canvas.canvasy(event.y)
+
+    def view_rect(self):
+        """Document area currently shown on the canvas."""
+        x, y = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        return x, y, x + self.canvas_width, y + self.canvas_height
+
+    def view_center(self):
+        x1, y1, x2, y2 = self.view_rect()
+        return (x1 + x2) / 2, (y1 + y2) / 2
+
+    def pan_start(self, event):
+        self.canvas.scan_mark(event.x, event.y)
+
+    def pan_drag(self, event):
+        self.canvas.scan_dragto(event.x, event.y, gain=1)
+        self.update_viewport()
+
+    def pan_by(self, dx, dy):
+        self.canvas.xview_scroll(dx, "units")
+        self.canvas.yview_scroll(dy, "units")
+        self.update_viewport()
+
+    def update_viewport(self):
+        """Materializes chunks that came near the view and pages out the ones that left."""
+        keys = self.chunks.keys_for_rect(*self.view_rect(), margin=self.chunk_margin)
+        if self.tile_strokes and not self.jobs.running("redraw"):
+            self.show_tiles()  # Tiles are smaller than chunks, some may have come into view
+        if keys == self.visible_chunks:
+            return
+        if self.jobs.running("redraw"):
+            # The pending redraw is for the old view, start over for this one
+            self.redraw_canvas_async()
+            return
+        self.visible_chunks = keys
+        near = self.chunks.objects_in(keys)
+        near_uids = {object_uid(obj) for obj in near}
+
+        for uid, obj in list(self.materialized.items()):
+            if uid not in near_uids:
+                self.dematerialize(obj)
+        for obj in near:
+            if object_uid(obj) not in self.materialized:
+                self.materialize(obj)
+        if any(isinstance(obj, Stroke) and obj.matrix is not None for obj in near):
+            self.schedule_bake()  # Strokes paged back in may still have transforms to bake
+        print(f"Viewport: {len(keys)} chunks, {len(self.materialized)} objects materialized")
+
+    def materialize(self, obj):
+        """Gives an object canvas items (paging its points back in if needed)."""
+        if isinstance(obj, Stroke):
+            if self.tile_strokes:
+                obj.canvas_ids = []  # Drawn by its tiles
+            else:
+                self.draw_stroke(obj)
+        else:
+            self.draw_shape(obj)
+            if obj["type"] == "fill":
+                self.canvas.tag_lower(obj["id"])
+        self.materialized[object_uid(obj)] = obj
+
+    def dematerialize(self, obj):
+        """Deletes an object's canvas items and pages its points out to disk."""
+        if isinstance(obj, Stroke):
+            for item in obj.canvas_ids:
+                self.canvas.delete(item)
+            obj.canvas_ids = []
+            obj.page_out(self.pager)
+        else:
+            self.canvas.delete(obj["id"])
+            obj["id"] = None
+            self.fill_images.pop(obj["uid"], None)
+        self.materialized.pop(object_uid(obj), None)
+
+    def page_out_far(self):
+        """Pages out every stroke that isn't materialized, after something read them all."""
+        if self.jobs.running("redraw"):
+            return  # The redraw pages out when it is done
+        for stroke in self.strokes:
+            if stroke.uid not in self.materialized:
+                stroke.canvas_ids = []
+                stroke.page_out(self.pager)
+
+    def set_tile_mode(self, enabled):
+        """Switches between one canvas item per stroke and baked backing tiles."""
+        self.tile_strokes = enabled
+        self.tiles.invalidate()
+        self.redraw_canvas()
+
+    def tile_strokes_for(self, key):
+        """Committed strokes that paint into a tile, oldest first."""
+        x1, y1, x2, y2 = self.tiles.rect(key)
+        x1, y1, x2, y2 = x1 - STROKE_PAD, y1 - STROKE_PAD, x2 + STROKE_PAD, y2 + STROKE_PAD
+        strokes = []
+        for obj in self.chunks.objects_in(self.chunks.keys_for_rect(x1, y1, x2, y2)):
+            if isinstance(obj, Stroke):
+                bx1, by1, bx2, by2 = obj.world_bounds()
+                if bx1 <= x2 and bx2 >= x1 and by1 <= y2 and by2 >= y1:
+                    strokes.append(obj)
+        return strokes
+
+    def bake_tile(self, key):
+        version = self.tiles.version(key)
+        image = render_tile(self.tiles.rect(key), self.tile_strokes_for(key))
+        self.tiles.store(key, image, version)
+        return image
+
+    def show_tiles(self):
+        """
+        Puts the tiles around the view on the canvas, baking the ones an edit
+        made dirty, and takes down the ones that scrolled away.
+        """
+        keys = self.tiles.keys_for_rect(*self.view_rect(), margin=1)
+        for key in list(self.tile_items):
+            if key not in keys:
+                self.drop_tile(key)
+        added = False
+        for key in sorted(keys):
+            image = self.tiles.get(key)
+            if image is None:
+                image = self.bake_tile(key)
+            shown = self.tile_items.get(key)
+            if shown is not None and shown[0] is image:
+                continue
+            self.drop_tile(key)
+            if image.getbbox() is None:
+                self.tile_items[key] = (image, None, None)  # Nothing drawn there
+                continue
+            photo = self.canvas.photo_image(image)
+            x, y = self.tiles.rect(key)[:2]
+            item = self.canvas.create_image(x, y, anchor=tk.NW, image=photo, tags=("tile",))
+            self.tile_items[key] = (image, photo, item)
+            added = True
+        if added:
+            # Tiles hold strokes: above fills, below outlines and live strokes
+            self.canvas.tag_lower("tile")
+            for obj in self.materialized.values():
+                if not isinstance(obj, Stroke) and obj["type"] == "fill" and obj["id"] is not None:
+                    self.canvas.tag_lower(obj["id"])
+
+    def drop_tile(self, key):
+        shown = self.tile_items.pop(key, None)
+        if shown is not None and shown[2] is not None:
+            self.canvas.delete(shown[2])
+
+    def dirty_tiles(self, stroke):
+        """A stroke was added or removed: re-bake the tiles it paints into, shortly."""
+        if not self.tile_strokes:
+            return
+        x1, y1, x2, y2 = stroke.world_bounds()
+        self.tiles.invalidate((x1 - STROKE_PAD, y1 - STROKE_PAD, x2 + STROKE_PAD, y2 + STROKE_PAD))
+        if self.tile_job is None:
+            self.tile_job = self.canvas.after(self.tile_delay_ms, self.rebake_tiles)
+
+    def rebake_tiles(self):
+        """Re-bakes dirty tiles, then retires the vector items of strokes they now hold."""
+        self.tile_job = None
+        if self.jobs.running("redraw"):
+            self.tile_job = self.canvas.after(self.tile_delay_ms, self.rebake_tiles)
+            return
+        if self.tile_strokes:
+            self.show_tiles()
+        for stroke in self.tile_live:
+            for item in stroke.canvas_ids:
+                self.canvas.delete(item)
+            stroke.canvas_ids = []
+        self.tile_live = []
+
+    def strokes_at(self, x, y, radius):
+        """Strokes passing within radius of a point, from the model rather than canvas items."""
+        hits = []
+        for obj in self.chunks.objects_in(self.chunks.keys_for_rect(x - radius, y - radius, x + radius, y + radius)):
+            if not isinstance(obj, Stroke):
+                continue
+            reach = radius + obj.thickness / 2
+            x1, y1, x2, y2 = obj.world_bounds()
+            if x1 - reach <= x <= x2 + reach and y1 - reach <= y <= y2 + reach:
+                if polyline_distance((x, y), obj.world_points(obj.polyline())) <= reach:
+                    hits.append(obj)
+        return hits
 
     def set_tool(self, tool):
         self.current_tool = tool
@@ -227,6 +753,7 @@ class SketchApp:
 
     def on_mouse_press(self, event):
         """Handles all mouse press events based on the current tool."""
+        self.to_world(event)
         print(f"Mouse clicked at ({event.x}, {event.y}), Tool: {self.current_tool}")
 
         if self.current_tool == "draw":
@@ -241,9 +768,12 @@ class SketchApp:
             self.start_shape(event)
         elif self.current_tool == "perspective":
             self.collect_points(event)
+        elif self.current_tool == "fill":
+            self.fill_at(event)
 
     def on_mouse_drag(self, event):
         """Handles all mouse drag events based on the current tool."""
+        self.to_world(event)
         if self.current_tool == "draw":
             self.draw_motion(event) 
         elif self.current_tool == "select_text":
@@ -255,6 +785,7 @@ class SketchApp:
 
     def on_mouse_release(self, event):
         """Handles all mouse release events based on the current tool."""
+        self.to_world(event)
         if self.current_tool == "draw":
             self.draw_release(event)
         elif self.current_tool in ["rectangle", "circle", "line"]:
@@ -264,29 +795,82 @@ class SketchApp:
 
     def start_drawing(self, event):
         if self.current_tool == "draw":
-            self.last_x, self.last_y = event.x, event.y
+            self.last_x, self.last_y = self.snap(event.x, event.y)
+            self.clear_snap_marker()
             self.current_stroke = Stroke(color=self.current_color, thickness=self.brush_thickness, brush=self.brush_style)
-            self.current_stroke.add_point(event.x, event.y)
+            self.current_stroke.add_point(self.last_x, self.last_y)
+            self.begin_symmetry()
+            self.current_copies = self.symmetry.link_strokes(self.current_stroke) if self.symmetry else []
 
     def start_shape(self, event):
         """Handles the start of a shape (rectangle, circle, line)."""
         print(f"Starting {self.current_tool} drawing at ({event.x}, {event.y})")
-        self.start_x, self.start_y = event.x, event.y
+        self.start_x, self.start_y = self.snap(event.x, event.y)
         self.current_shape = None  # Reset any previous shape
+        self.begin_symmetry()
 
     def shape_motion(self, event):
         if self.current_tool in ["rectangle", "circle", "line"]:
             if self.current_shape:
                 self.canvas.delete(self.current_shape)
+            self.clear_shape_previews()
+            x, y = self.snap(event.x, event.y)
             if self.current_tool == "rectangle":
-                self.current_shape = self.canvas.create_rectangle(self.start_x, self.start_y, event.x, event.y, outline=self.current_color, width=self.brush_thickness)
+                self.current_shape = self.canvas.create_rectangle(self.start_x, self.start_y, x, y, outline=self.current_color, width=self.brush_thickness)
             elif self.current_tool == "circle":
-                self.current_shape = self.canvas.create_oval(self.start_x, self.start_y, event.x, event.y, outline=self.current_color, width=self.brush_thickness)
+                self.current_shape = self.canvas.create_oval(self.start_x, self.start_y, x, y, outline=self.current_color, width=self.brush_thickness)
             elif self.current_tool == "line":
-                self.current_shape = self.canvas.create_line(self.start_x, self.start_y, event.x, event.y, fill=self.current_color, width=self.brush_thickness)
+                self.current_shape = self.canvas.create_line(self.start_x, self.start_y, x, y, fill=self.current_color, width=self.brush_thickness)
+            if self.symmetry:
+                preview = {"type": self.current_tool, "coords": [self.start_x, self.start_y, x, y],
+                           "color": self.current_color, "thickness": self.brush_thickness, "matrix": None}
+                for copy in self.symmetry.copy_shape(preview):
+                    self.draw_shape(copy)
+                    self.shape_previews.append(copy["id"])
         
             print(f"Drawing {self.current_tool} preview...")
+
+    def set_symmetry(self, choice):
+        """Takes a symmetry selector entry: "no symmetry", "mirror" or "radial <count>"."""
+        if choice.startswith("radial"):
+            self.symmetry_mode = "radial"
+            self.symmetry_count = int(choice.split()[1])
+        else:
+            self.symmetry_mode = "mirror" if choice == "mirror" else None
+        print(f"Symmetry: {choice}")
+
+    def begin_symmetry(self):
+        """Fixes the symmetry center for the stroke or shape that is starting."""
+        self.symmetry = Symmetry(self.symmetry_mode, self.symmetry_count, self.view_center()) if self.symmetry_mode else None
+
+    def clear_shape_previews(self):
+        for item in self.shape_previews:
+            self.canvas.delete(item)
+        self.shape_previews = []
     
+    def snap(self, x, y):
+        """
+        Snaps a document point to the nearest stroke endpoint or shape
+        corner/center within snap_radius, else to the grid if that is on.
+        Shows a marker where it snapped.
+        """
+        self.clear_snap_marker()
+        if not self.snap_enabled:
+            return x, y
+        hit = self.snaps.nearest(x, y, self.snap_radius)
+        if hit:
+            x, y = hit[:2]
+            r = 4
+            self.snap_marker = self.canvas.create_oval(x - r, y - r, x + r, y + r, outline="#1e90ff", width=2)
+        elif self.snap_grid:
+            x, y = snap_to_grid(x, y, self.grid_size)
+        return x, y
+
+    def clear_snap_marker(self):
+        if self.snap_marker is not None:
+            self.canvas.delete(self.snap_marker)
+            self.snap_marker = None
+
     def draw_motion(self, event):
         if self.current_tool == "draw" and self.last_x is not None and self.last_y is not None:
             brush_options = {
@@ -299,28 +883,35 @@ class SketchApp:
             
             options = brush_options.get(self.brush_style, brush_options["round"])
             
+            segments = []  # (x1, y1, x2, y2, line options) for this motion event
             if self.brush_style == "watercolor":
                 for _ in range(4):
                     offset_x, offset_y = random.randint(-3, 3), random.randint(-3, 3)
                     thickness = self.brush_thickness * random.uniform(0.3, 1.2)
                     color = self._adjust_opacity(self.current_color, random.uniform(0.5, 0.8))
-                    self.canvas.create_line(
-                        self.last_x + offset_x, self.last_y + offset_y, event.x + offset_x, event.y + offset_y,
-                        width=thickness,
-                        capstyle=options["cap"],
-                        fill=color
-                    )
-                    self.canvas.lower("all")
+                    segments.append((self.last_x + offset_x, self.last_y + offset_y, event.x + offset_x, event.y + offset_y,
+                                     {"width": thickness, "capstyle": options["cap"], "fill": color}))
             elif self.brush_style == "pencil":
                 for _ in range(2):
                     offset_x, offset_y = random.randint(-1, 1), random.randint(-1, 1)
-                    self.canvas.create_line(self.last_x + offset_x, self.last_y + offset_y, event.x + offset_x, event.y + offset_y, width=self.brush_thickness * 0.7, capstyle=options["cap"], fill=options["fill"])
+                    segments.append((self.last_x + offset_x, self.last_y + offset_y, event.x + offset_x, event.y + offset_y,
+                                     {"width": self.brush_thickness * 0.7, "capstyle": options["cap"], "fill": options["fill"]}))
             elif self.brush_style == "charcoal":
                 for _ in range(3):
                     offset_x, offset_y = random.randint(-2, 2), random.randint(-2, 2)
-                    self.canvas.create_line(self.last_x + offset_x, self.last_y + offset_y, event.x + offset_x, event.y + offset_y, width=self.brush_thickness, capstyle=options["cap"], fill=options["fill"])
+                    segments.append((self.last_x + offset_x, self.last_y + offset_y, event.x + offset_x, event.y + offset_y,
+                                     {"width": self.brush_thickness, "capstyle": options["cap"], "fill": options["fill"]}))
             else:
-                self.canvas.create_line(self.last_x, self.last_y, event.x, event.y, width=self.brush_thickness, capstyle=options["cap"], fill=options["fill"])
+                segments.append((self.last_x, self.last_y, event.x, event.y,
+                                 {"width": self.brush_thickness, "capstyle": options["cap"], "fill": options["fill"]}))
+
+            # Symmetric copies draw the same segments, every endpoint moved in one multiply
+            per_copy = self.symmetry.expand_segments(segments) if self.current_copies else [segments]
+            for stroke, copy_segments in zip([self.current_stroke] + self.current_copies, per_copy):
+                for x1, y1, x2, y2, line_options in copy_segments:
+                    stroke.canvas_ids.append(self.canvas.create_line(x1, y1, x2, y2, **line_options))
+            if self.brush_style == "watercolor":
+                self.canvas.lower("all")
             
             self.current_stroke.add_point(event.x, event.y)
             self.last_x, self.last_y = event.x, event.y
@@ -331,12 +922,76 @@ class SketchApp:
             overlapping_items = self.canvas.find_overlapping(
                 event.x - 10, event.y - 10, event.x + 10, event.y + 10
             )
+            erased = self.strokes_at(event.x, event.y, 10) if self.tile_strokes else []
             for item in overlapping_items:
+                if "tile" in self.canvas.gettags(item):
+                    continue
+                owner = self.find_owner(item)
+                if owner is None:
+                    self.canvas.delete(item)  # Not part of the scene (imported image, ...)
+                elif owner not in erased:
+                    erased.append(owner)
+
+            # Erasing removes the whole stroke or shape from the scene
+            for obj in erased:
+                self.remove_object(obj)
+            if erased:
+                self.undo_stack.append({"type": "erase", "objects": erased})
+                self.redo_stack.clear()
+
+    def find_owner(self, item):
+        """Returns the stroke or shape a canvas item belongs to, if any."""
+        for stroke in self.strokes:
+            if item in stroke.canvas_ids:
+                return stroke
+        for shape in self.shapes:
+            if shape["id"] == item:
+                return shape
+        return None
+
+    def add_object(self, obj, drawn=False):
+        """
+        Puts a stroke or shape (back) into the scene and journals it.
+        drawn says whether it already has canvas items.
+        """
+        if isinstance(obj, Stroke):
+            self.strokes.append(obj)
+            self.journal.record_stroke(obj)
+            self.dirty_tiles(obj)
+            if drawn and self.tile_strokes:
+                self.tile_live.append(obj)
+        else:
+            self.shapes.append(obj)
+            self.journal.record_shape(obj)
+            if obj["type"] == "text":
+                self.text_items[obj["uid"]] = obj
+        self.chunks.add(obj)
+        self.snaps.add(object_uid(obj), snap_points(obj))
+        if drawn:
+            self.materialized[object_uid(obj)] = obj
+
+    def remove_object(self, obj):
+        """Takes a stroke or shape out of the scene and off the canvas."""
+        self.chunks.remove(obj)
+        self.snaps.remove(object_uid(obj))
+        self.materialized.pop(object_uid(obj), None)
+        if isinstance(obj, Stroke):
+            if obj in self.strokes:
+                self.strokes.remove(obj)
+            if obj in self.tile_live:
+                self.tile_live.remove(obj)
+            self.cold.discard(obj)
+            self.dirty_tiles(obj)
+            for item in obj.canvas_ids:
                 self.canvas.delete(item)
-                # Remove the item from stored strokes
-                for stroke in self.strokes:
-                    if item in stroke.canvas_ids:
-                        stroke.canvas_ids.remove(item)
+            obj.canvas_ids = []
+            self.journal.record_remove(obj.uid)
+        else:
+            if obj in self.shapes:
+                self.shapes.remove(obj)
+            self.text_items.pop(obj["uid"], None)
+            self.canvas.delete(obj["id"])
+            self.journal.record_remove(obj["uid"])
 
     def zoom_shape(self, event):
         thickness = self.brush_thickness.get()
@@ -357,8 +1012,8 @@ class SketchApp:
     def use_eyedropper(self, event):
         if self.current_tool == "eyedrop":
             print("Using eyedropper tool...")
-            x = self.canvas.winfo_rootx() + event.x
-            y = self.canvas.winfo_rooty() + event.y
+            x = self.canvas.winfo_rootx() + event.view_x
+            y = self.canvas.winfo_rooty() + event.view_y
             try:
                 img = ImageGrab.grab(bbox=(x, y, x+1, y+1))
                 pixel = img.getpixel((0, 0))
@@ -370,10 +1025,27 @@ class SketchApp:
 
     def add_text(self, event):
         if self.current_tool == "text":
-            print(f"Text created at ({event.x}, {event.y}) with tag 'draggable_text'")
             text = self.ask_for_text()
             if text:
-                self.canvas.create_text(event.x, event.y, text=text, fill=self.current_color, font=("Arial", 12), tags=("draggable_text",))
+                self.place_text(event.x, event.y, text)
+                print(f"Text created at ({event.x}, {event.y}) with tag 'draggable_text'")
+
+    def place_text(self, x, y, text, font=DEFAULT_FONT, size=DEFAULT_SIZE):
+        """Adds a text object centered on (x, y) to the scene."""
+        shape = {"id": None, "uid": new_uid(), "type": "text", "coords": [x, y], "text": text,
+                 "font": font, "size": size, "angle": 0.0, "color": self.current_color, "thickness": 0, "matrix": None}
+        self.draw_shape(shape)
+        self.add_object(shape, drawn=True)
+        self.undo_stack.append(shape)
+        self.redo_stack.clear()
+        return shape
+
+    def text_at(self, x, y):
+        """The topmost text object whose box contains (x, y), from the cached extents."""
+        for obj in reversed(self.chunks.objects_in(self.chunks.keys_for_rect(x, y, x, y))):
+            if not isinstance(obj, Stroke) and obj["type"] == "text" and text_contains(obj, x, y):
+                return obj
+        return None
 
     def show_brush_options(self):
         self.brush_selector.pack(side=tk.LEFT, padx=3)
@@ -385,41 +1057,16 @@ class SketchApp:
     def zoom_in_strokes(self):
         """Scale all strokes and shapes up by a factor of 1.5."""
         self.scale_factor *= 1.5
-        self.apply_zoom()
+        self.apply_zoom(1.5)
 
     def zoom_out_strokes(self):
         """Scale all strokes and shapes down by a factor of 0.67."""
         self.scale_factor *= 0.67
-        self.apply_zoom()
+        self.apply_zoom(0.67)
     
-    def apply_zoom(self):
-        """Redraw all strokes and shapes based on the current zoom level."""
-        self.canvas.delete("all")  # Clear canvas before redrawing
-        bg = self.canvas.cget("bg")
-        self.canvas.config(bg=bg)
-
-        # Redraw strokes
-        new_strokes = []
-        for stroke in self.strokes:
-            new_points = [(x * self.scale_factor, y * self.scale_factor) for x, y in stroke.points]
-            new_stroke = Stroke(new_points, color=stroke.color, thickness=int(stroke.thickness * self.scale_factor), opacity=stroke.opacity, brush=stroke.brush)
-            new_strokes.append(new_stroke)
-            pts = new_stroke.points
-            if len(pts) > 1:
-                for i in range(1, len(pts)):
-                    self.canvas.create_line(pts[i-1][0], pts[i-1][1], pts[i][0], pts[i][1], 
-                                            fill=new_stroke.color, width=new_stroke.thickness, capstyle=new_stroke.brush)
-        self.strokes = new_strokes  # Update stored strokes
-
-        # Redraw shapes
-        new_shape_items = {}
-        for item, original_coords in self.shape_items.items():
-            new_coords = [c * self.scale_factor for c in original_coords]
-            new_item = self.canvas.create_rectangle(*new_coords, outline=self.current_color, width=self.brush_thickness) if "rectangle" in self.canvas.gettags(item) else \
-                    self.canvas.create_oval(*new_coords, outline=self.current_color, width=self.brush_thickness) if "circle" in self.canvas.gettags(item) else \
-                    self.canvas.create_line(*new_coords, fill=self.current_color, width=self.brush_thickness)
-            new_shape_items[new_item] = new_coords
-        self.shape_items = new_shape_items  # Update stored shapes
+    def apply_zoom(self, factor):
+        """Scale the whole scene, text included, by factor around the view center."""
+        self.redraw_strokes(transform=scale_matrix(factor, factor))
 
     def ask_for_text(self):
         """Ensure the text input dialog appears correctly."""
@@ -437,13 +1084,14 @@ class SketchApp:
         """Detect if a text item is clicked for dragging."""
         print("It's selecting text.")
         if self.current_tool == "select_text":
-            item = self.canvas.find_closest(event.x, event.y)
-            print(f"Item found: {item}, Tags: {self.canvas.gettags(item)}")  # Debug print
-            if item and "draggable_text" in self.canvas.gettags(item):
-                self.selected_text = item[0]
+            shape = self.text_at(event.x, event.y)
+            print(f"Text found: {shape['text'] if shape else None}")  # Debug print
+            if shape and shape["id"] is not None:
+                self.selected_text = shape
                 self.start_x = event.x
                 self.start_y = event.y
-                print(f"Text selected: {self.selected_text}")
+                self.text_grab = (event.x, event.y)
+                print(f"Text selected: {shape['uid']}")
 
     def select_text_drag(self, event):
         """Move the selected text when dragged."""
@@ -451,7 +1099,7 @@ class SketchApp:
         if self.current_tool == "select_text" and self.selected_text:
             dx = event.x - self.start_x
             dy = event.y - self.start_y
-            self.canvas.move(self.selected_text, dx, dy)
+            self.canvas.move(self.selected_text["id"], dx, dy)
             print(f"Text moved by ({dx}, {dy})")
             self.start_x = event.x
             self.start_y = event.y
@@ -459,7 +1107,16 @@ class SketchApp:
     def select_text_release(self, event):
         """Release the selected text after dragging."""
         print("It's releasing text.")
-        if self.current_tool == "select_text":
+        if self.current_tool == "select_text" and self.selected_text:
+            # Only the drop is recorded: the moved text replaces the old one in the journal
+            shape = self.selected_text
+            bake_shape(shape)
+            x, y = shape["coords"][:2]
+            shape["coords"] = [x + event.x - self.text_grab[0], y + event.y - self.text_grab[1]]
+            self.canvas.coords(shape["id"], *shape["coords"])
+            self.chunks.add(shape)
+            self.journal.record_remove(shape["uid"])
+            self.journal.record_shape(shape)
             self.selected_text = None
 
     # Choose color method
@@ -526,11 +1183,18 @@ class SketchApp:
             last_action = self.undo_stack.pop()  # Remove last action
             self.redo_stack.append(last_action)  # Save for redo
 
-            # If it's a stroke, remove it
-            if isinstance(last_action, Stroke):
-                self.strokes.remove(last_action)
-            else:  # If it's a shape, delete from canvas
-                self.canvas.delete(last_action["id"])
+            # If it's a stroke or shape, remove it
+            if isinstance(last_action, Stroke) or last_action["type"] in ["rectangle", "circle", "line", "fill", "text"]:
+                self.remove_object(last_action)
+            elif last_action["type"] == "erase":  # Bring erased objects back
+                for obj in last_action["objects"]:
+                    self.add_object(obj)
+            elif last_action["type"] == "add":  # A stroke or shape with its symmetric copies
+                for obj in last_action["objects"]:
+                    self.remove_object(obj)
+            elif last_action["type"] == "clear":
+                for obj in last_action["strokes"] + last_action["shapes"]:
+                    self.add_object(obj)
 
             self.redraw_canvas()  # Redraw everything
         else:
@@ -544,46 +1208,17 @@ class SketchApp:
 
             # If it's a stroke, restore it
             if isinstance(last_action, Stroke):
-                self.strokes.append(last_action)
-            else:  # If it's a shape, redraw it
-                shape = last_action
-                new_id = None
-                if shape["type"] == "rectangle":
-                    # Get the center of the canvas
-                    cx, cy = self.canvas.winfo_width() / 2, self.canvas.winfo_height() / 2
-
-                    # Convert rectangle into four corners before transformation
-                    x1, y1, x2, y2 = shape["coords"]
-                    
-                    # Define the four corners of the rectangle
-                    corners = [
-                        (x1, y1),  # Top-left
-                        (x2, y1),  # Top-right
-                        (x2, y2),  # Bottom-right
-                        (x1, y2)   # Bottom-left
-                    ]
-                    
-                    # Rotate each corner
-                    new_corners = []
-                    for x, y in corners:
-                        x_shifted, y_shifted = x - cx, y - cy
-                        if transform:
-                            new_x, new_y = multiply_matrix_vector(transform, [x_shifted, y_shifted])
-                            new_x += cx
-                            new_y += cy
-                        else:
-                            new_x, new_y = x, y
-                        new_corners.append((new_x, new_y))
-                    
-                    # Use create_polygon instead of create_rectangle to maintain rotation
-                    new_id = self.canvas.create_polygon(new_corners, outline=shape["color"], fill="", width=shape["thickness"])
-
-                elif shape["type"] == "circle":
-                    new_id = self.canvas.create_oval(*shape["coords"], outline=shape["color"], width=shape["thickness"])
-                elif shape["type"] == "line":
-                    new_id = self.canvas.create_line(*shape["coords"], fill=shape["color"], width=shape["thickness"])
-                shape["id"] = new_id  # Update ID with new shape
-                self.undo_stack.append(shape)  # Store back in undo
+                self.add_object(last_action)
+            elif last_action["type"] == "erase":
+                for obj in last_action["objects"]:
+                    self.remove_object(obj)
+            elif last_action["type"] == "add":
+                for obj in last_action["objects"]:
+                    self.add_object(obj)
+            elif last_action["type"] == "clear":
+                self.clear_scene()
+            else:  # If it's a shape, restore it
+                self.add_object(last_action)
 
             self.redraw_canvas()
         else:
@@ -592,7 +1227,7 @@ class SketchApp:
     def display_canvas_image(self, image):
         """Displays an image on the canvas."""
         self.canvas.delete("all")  # Clear current canvas
-        self.imported_image = ImageTk.PhotoImage(image)
+        self.imported_image = self.canvas.photo_image(image)
         self.canvas.create_image(0, 0, anchor=tk.NW, image=self.imported_image)
 
     def zoom_out_strokes(self):
@@ -601,36 +1236,238 @@ class SketchApp:
         sc_mat = scale_matrix(factor, factor)
         self.redraw_strokes(transform=sc_mat)
 
+    def draw_stroke(self, stroke, scale=1.0, dots=None):
+        """
+        Draws a stored stroke as a single canvas line item, with no more detail
+        than is visible at `scale` screen pixels per model unit.
+        Strokes smaller than a pixel become a dot, shared through `dots` with
+        any other tiny stroke of the same color on that pixel.
+        """
+        self.draw_plan(stroke, self.stroke_plan(stroke, scale), dots)
+
+    def stroke_plan(self, stroke, scale=1.0):
+        """
+        Works out the canvas item for a stroke without touching Tk, so it can
+        run on a worker thread (given a FrozenStroke there). Returns
+        (dot_key, kind, coords, options), or None if there is nothing to draw.
+        """
+        points = stroke.points
+        if len(points) < 2:
+            return None
+
+        # Off-screen strokes never get here, only chunks near the view are drawn
+        x1, y1, x2, y2 = stroke.world_bounds()
+        if (x2 - x1) * scale < 1 and (y2 - y1) * scale < 1:
+            key = (int(x1 * scale), int(y1 * scale), stroke.color)
+            size = max(stroke.thickness * scale, 1) / 2
+            return key, "dot", (x1 - size, y1 - size, x1 + size, y1 + size), {"fill": stroke.color, "outline": ""}
+
+        curve = stroke.curve
+        # Simplification levels are in the stroke's own (untransformed) units
+        level = stroke.lod_level(self.lod_tolerance / (scale * stroke.scale()))
+        if level is not None:
+            simplified = stroke.lod_points(level)
+            # Only worth it once the curve carries more detail than the screen can show
+            if len(simplified) < len(points):
+                points, curve = simplified, False
+
+        coords = [c for point in stroke.world_points(points) for c in point]
+        options = {"fill": stroke.color, "width": stroke.thickness,
+                   "capstyle": BRUSH_CAPS.get(stroke.brush, tk.ROUND), "joinstyle": tk.ROUND}
+        if curve:
+            # "raw" smoothing treats the points as cubic Bézier control points
+            options.update(smooth="raw", splinesteps=self.curve_splinesteps)
+        return None, "line", coords, options
+
+    def draw_plan(self, stroke, plan, dots=None):
+        """Creates the canvas item stroke_plan() worked out."""
+        stroke.canvas_ids = []
+        if plan is None:
+            return
+        key, kind, coords, options = plan
+        if key is not None and dots is not None and key in dots:
+            stroke.canvas_ids = [dots[key]]
+            return
+        if kind == "dot":
+            item = self.canvas.create_rectangle(*coords, **options)
+            if dots is not None:
+                dots[key] = item
+        else:
+            item = self.canvas.create_line(*coords, **options)
+        stroke.canvas_ids = [item]
+
     def redraw_canvas(self):
         """Redraw the entire canvas with current strokes and shapes"""
+        self.jobs.cancel("redraw")  # Whatever it was drawing is out of date now
         self.canvas.delete("all")  # Clear everything
 
         # Preserve background color
         bg = self.canvas.cget("bg")
         self.canvas.config(bg=bg)
 
-        # Redraw strokes
-        for stroke in self.strokes:
-            points = stroke.points
-            if len(points) > 1:
-                for i in range(1, len(points)):
-                    self.canvas.create_line(
-                        points[i-1][0], points[i-1][1], points[i][0], points[i][1],
-                        fill=stroke.color, width=stroke.thickness, capstyle=stroke.brush
-                    )
-
-        # Redraw shapes from `undo_stack`
-        for action in self.undo_stack:
-            if isinstance(action, dict):  # Only process shapes, not strokes
-                shape = action
-                new_id = None
-                if shape["type"] == "rectangle":
-                    new_id = self.canvas.create_rectangle(*shape["coords"], outline=shape["color"], width=shape["thickness"])
-                elif shape["type"] == "circle":
-                    new_id = self.canvas.create_oval(*shape["coords"], outline=shape["color"], width=shape["thickness"])
-                elif shape["type"] == "line":
-                    new_id = self.canvas.create_line(*shape["coords"], fill=shape["color"], width=shape["thickness"])
-                shape["id"] = new_id  # Store new shape ID
+        # Only chunks near the view are drawn
+        self.visible_chunks = self.chunks.keys_for_rect(*self.view_rect(), margin=self.chunk_margin)
+        near = self.chunks.objects_in(self.visible_chunks)
+        strokes = [obj for obj in near if isinstance(obj, Stroke)]
+        shapes = [obj for obj in near if not isinstance(obj, Stroke)]
+        self.materialized = {object_uid(obj): obj for obj in near}
+        for shape in self.shapes:
+            if object_uid(shape) not in self.materialized:
+                shape["id"] = None
+
+        # Paint bucket fills sit underneath strokes and outlines
+        self.fill_images = {}
+        for shape in shapes:
+            if shape["type"] == "fill":
+                self.draw_shape(shape)
+
+        # Redraw strokes, tiny ones share merged dots
+        self.tile_items = {}
+        for stroke in self.tile_live:
+            stroke.canvas_ids = []
+        self.tile_live = []
+        if self.tile_strokes:
+            for stroke in strokes:
+                stroke.canvas_ids = []  # Drawn by the tiles
+            self.show_tiles()
+        else:
+            dots = {}
+            for stroke in strokes:
+                self.draw_stroke(stroke, dots=dots)
+
+        # Redraw shapes
+        for shape in shapes:
+            if shape["type"] != "fill":
+                self.draw_shape(shape)
+
+        self.page_out_far()
+
+    def redraw_canvas_async(self):
+        """
+        Same as redraw_canvas, for big scenes: stroke geometry and fill patches
+        are worked out on a worker thread and the canvas items are created a
+        few milliseconds at a time. The old drawing stays up until then.
+        """
+        self.visible_chunks = self.chunks.keys_for_rect(*self.view_rect(), margin=self.chunk_margin)
+        near = self.chunks.objects_in(self.visible_chunks)
+        # Fills go underneath, then strokes, then shape outlines
+        fills = [obj for obj in near if not isinstance(obj, Stroke) and obj["type"] == "fill"]
+        outlines = [obj for obj in near if not isinstance(obj, Stroke) and obj["type"] != "fill"]
+        strokes = [obj for obj in near if isinstance(obj, Stroke)]
+        uids = {object_uid(obj) for obj in near}
+        dots = {}
+        tile_work = []
+        # The worker draws from frozen copies, live strokes may be paged out or compressed meanwhile
+        frozen = {}
+        if self.tile_strokes:
+            # Dirty tiles are baked by the worker too; self.tiles in the list marks where they go
+            tile_work = [(key, self.tiles.version(key), [FrozenStroke(stroke) for stroke in self.tile_strokes_for(key)])
+                         for key in sorted(self.tiles.keys_for_rect(*self.view_rect(), margin=1))
+                         if self.tiles.get(key) is None]
+            ordered = fills + [self.tiles] + outlines
+        else:
+            frozen = {stroke.uid: FrozenStroke(stroke) for stroke in strokes}
+            ordered = fills + strokes + outlines
+
+        def compute(job):
+            plans = []
+            for i, obj in enumerate(ordered):
+                if job.cancelled:
+                    return None
+                if obj is self.tiles:
+                    for key, version, tile_strokes in tile_work:
+                        if job.cancelled:
+                            return None
+                        plans.append((obj, (key, version, render_tile(self.tiles.rect(key), tile_strokes))))
+                    plans.append((obj, None))  # Then put them all up
+                elif isinstance(obj, Stroke):
+                    plans.append((obj, self.stroke_plan(frozen[obj.uid])))
+                elif "mask" in obj:
+                    plans.append((obj, fill_patch_image(obj)))
+                else:
+                    plans.append((obj, None))
+                job.report(i + 1, len(ordered))
+            return plans
+
+        def begin():
+            # Objects added while the worker was busy aren't in its plans
+            late = [obj for uid, obj in self.materialized.items()
+                    if uid not in uids and uid in self.chunks.objects]
+            self.canvas.delete("all")
+            self.materialized = {}
+            self.fill_images = {}
+            self.tile_items = {}
+            for stroke in self.tile_live:
+                stroke.canvas_ids = []
+            self.tile_live = []
+            if self.tile_strokes:
+                for stroke in strokes:
+                    stroke.canvas_ids = []  # Drawn by the tiles
+            for shape in self.shapes:
+                shape["id"] = None
+            for obj in late:
+                self.materialize(obj)
+            if self.current_stroke:
+                for stroke in [self.current_stroke] + self.current_copies:
+                    self.draw_stroke(stroke)  # Still being drawn
+
+        def apply(plan):
+            obj, result = plan
+            if obj is self.tiles:
+                if result is None:
+                    for stroke in strokes:
+                        if object_uid(stroke) in self.chunks.objects:
+                            self.materialized[stroke.uid] = stroke
+                    self.show_tiles()
+                else:
+                    self.tiles.store(*result)  # Unless it was edited meanwhile
+                return
+            if object_uid(obj) not in self.chunks.objects:
+                return  # Erased in the meantime
+            if isinstance(obj, Stroke):
+                self.draw_plan(obj, result, dots)
+            else:
+                self.draw_shape(obj, patch=result)
+            self.materialized[object_uid(obj)] = obj
+
+        def done():
+            self.page_out_far()
+            print(f"Redrew {len(near)} objects in the background")
+
+        self.jobs.submit("redraw", compute, apply, begin=begin, done=done)
+
+    def show_progress(self, fraction):
+        if self.progress is None:
+            return
+        self.progress["value"] = 0 if fraction is None else fraction * 100
+
+    def draw_shape(self, shape, patch=None):
+        """
+        Draws a stored shape with its pending transform applied.
+        patch is a fill_patch_image() result already rendered for raster fills.
+        """
+        new_id = None
+        if shape["type"] == "rectangle":
+            # Polygon instead of create_rectangle so rotations are kept
+            new_id = self.canvas.create_polygon(rectangle_corners(shape), outline=shape["color"], fill="", width=shape["thickness"])
+        elif shape["type"] == "circle":
+            new_id = self.canvas.create_oval(*shape_coords(shape), outline=shape["color"], width=shape["thickness"])
+        elif shape["type"] == "line":
+            new_id = self.canvas.create_line(*shape_coords(shape), fill=shape["color"], width=shape["thickness"])
+        elif shape["type"] == "text":
+            # Negative sizes are pixels to Tk
+            new_id = self.canvas.create_text(*shape_coords(shape)[:2], text=shape["text"], fill=shape["color"],
+                                             font=(shape["font"], -font_pixels(text_size(shape))),
+                                             angle=text_angle(shape), tags=("draggable_text",))
+        elif shape["type"] == "fill":
+            if "mask" in shape:
+                image, (x, y) = patch if patch is not None else fill_patch_image(shape)
+                photo = self.canvas.photo_image(image)
+                self.fill_images[shape["uid"]] = photo  # Keep reference
+                new_id = self.canvas.create_image(x, y, anchor=tk.NW, image=photo)
+            else:
+                new_id = self.canvas.create_polygon(*shape_coords(shape), fill=shape["color"], outline="")
+        shape["id"] = new_id  # Store new shape ID
 
     def open_reference_window(self):
         """Opens a separate window to display a reference image."""
@@ -638,24 +1475,17 @@ class SketchApp:
         if not file_path:
             return
 
-        ref_window = tk.Toplevel(self.root)
-        ref_window.title("Reference Window")
-        ref_window.geometry("400x400")
-
-        img = Image.open(file_path)
-        img = ImageTk.PhotoImage(img)
-
-        label = tk.Label(ref_window, image=img)
-        label.image = img  # Keep reference
-        label.pack(expand=True, fill=tk.BOTH)
-
-        ref_window.resizable(True, True)
+        # Decodes are cached across windows, so reopening a reference is instant
+        ReferenceWindow(self.root, self.reference_cache, file_path)
 
     def draw_shapes(self, event):
         print(f"Mouse released at ({event.x}, {event.y}), Finalizing {self.current_tool}")
 
         if self.current_tool in ["rectangle", "circle", "line"]:
             shape = None
+            event.x, event.y = self.snap(event.x, event.y)
+            self.clear_snap_marker()
+            self.clear_shape_previews()
             if self.current_tool == "rectangle":
                 shape = self.canvas.create_rectangle(self.start_x, self.start_y, event.x, event.y,
                                                     outline=self.current_color, width=self.brush_thickness)
@@ -669,22 +1499,64 @@ class SketchApp:
             if shape:
                 shape_info = {
                     "id": shape,
+                    "uid": new_uid(),
                     "coords": self.canvas.coords(shape),
                     "type": self.current_tool,
                     "color": self.current_color,
-                    "thickness": self.brush_thickness
+                    "thickness": self.brush_thickness,
+                    "matrix": None
                 }
-                self.undo_stack.append(shape_info)
+                self.add_object(shape_info, drawn=True)
+                copies = self.symmetry.copy_shape(shape_info) if self.symmetry else []
+                for copy in copies:
+                    copy["uid"] = new_uid()
+                    self.draw_shape(copy)
+                    self.add_object(copy, drawn=True)
+                self.undo_stack.append({"type": "add", "objects": [shape_info] + copies} if copies else shape_info)
                 self.redo_stack.clear()  # Clear redo stack on new action
                 print("Shape saved to undo stack:", shape_info)
 
+    def fill_at(self, event):
+        """Paint bucket: flood fills the region under the cursor on an offscreen render of the scene."""
+        start = time.perf_counter()
+        scale = self.fill_scale
+        # Render just the visible part of the document
+        x1, y1, x2, y2 = self.view_rect()
+        visible = self.chunks.objects_in(self.chunks.keys_for_rect(x1, y1, x2, y2))
+        strokes = [obj for obj in visible if isinstance(obj, Stroke)]
+        shapes = [obj for obj in visible if not isinstance(obj, Stroke)]
+        image = render_scene(strokes, shapes, size=(self.canvas_width, self.canvas_height), scale=scale, origin=(x1, y1))
+        seed = ((event.x - x1) * scale, (event.y - y1) * scale)
+        mask = flood_fill_mask(np.asarray(image), seed, self.fill_tolerance)
+        shape = make_fill(mask, self.current_color, new_uid(), pixel_size=1 / scale, origin=(x1, y1)) if mask is not None else None
+        if shape is None:
+            return
+
+        self.draw_shape(shape)
+        self.add_object(shape, drawn=True)
+        self.undo_stack.append(shape)
+        self.redo_stack.clear()
+        self.canvas.tag_lower(shape["id"])  # Keep it under the outlines it was bounded by
+        kind = "raster patch" if "mask" in shape else "polygon"
+        print(f"Filled {kind} in {(time.perf_counter() - start) * 1000:.1f} ms")
+
     def draw_release(self, event):
         print(f"Mouse released at ({event.x}, {event.y}), Finalizing {self.current_tool}")
         if self.current_tool == "draw" and self.current_stroke:
-            self.strokes.append(self.current_stroke)
-            self.undo_stack.append(self.current_stroke)  # Store stroke for undo
+            raw_count = len(self.current_stroke.points)
+            self.current_stroke.fit_curve(self.curve_tolerance)
+            print(f"Stroke fitted: {raw_count} points -> {len(self.current_stroke.points)} control points")
+            self.add_object(self.current_stroke, drawn=True)
+            if self.current_copies:
+                # The copies share the fitted points, undone and redone together
+                for copy in self.current_copies:
+                    self.add_object(copy, drawn=True)
+                self.undo_stack.append({"type": "add", "objects": [self.current_stroke] + self.current_copies})
+            else:
+                self.undo_stack.append(self.current_stroke)  # Store stroke for undo
             self.redo_stack.clear()  # Clear redo history after new action
             self.current_stroke = None
+            self.current_copies = []
 
     def rotate_strokes(self):
         """Rotate all strokes 90° around the canvas center."""
@@ -700,88 +1572,125 @@ class SketchApp:
 
     def redraw_strokes(self, transform=None):
         """Redraw strokes and shapes, applying optional transformation."""
-        self.canvas.delete("all")  # Clear everything before redrawing
-
-        # Preserve the current background colors
-        bg = self.canvas.cget("bg")
-        self.canvas.config(bg=bg)
-
-        # Transform and redraw strokes
-        new_strokes = []
-        for stroke in self.strokes:
-            new_points = []
-            for point in stroke.points:
-                cx, cy = self.canvas_width / 2, self.canvas_height / 2
-                x_shifted = point[0] - cx
-                y_shifted = point[1] - cy
-
-                if transform:
-                    new_point = multiply_matrix_vector(transform, [x_shifted, y_shifted])
-                    new_x = new_point[0] + cx
-                    new_y = new_point[1] + cy
-                else:
-                    new_x, new_y = point[0], point[1]
-
-                new_points.append((new_x, new_y))
-
-            new_stroke = Stroke(new_points, color=stroke.color, thickness=stroke.thickness,
-                                opacity=stroke.opacity, brush=stroke.brush)
-            new_strokes.append(new_stroke)
-
-            pts = new_stroke.points
-            if len(pts) > 1:
-                for i in range(1, len(pts)):
-                    self.canvas.create_line(pts[i-1][0], pts[i-1][1], pts[i][0], pts[i][1],
-                                            fill=new_stroke.color, width=new_stroke.thickness, capstyle=new_stroke.brush)
-        self.strokes = new_strokes  # Update stored strokes
-
-        # Transform and redraw shapes
-        new_shape_items = {}
-        for action in self.undo_stack:
-            if isinstance(action, dict):  # Process only shapes
-                shape = action
-                new_coords = []
-                cx, cy = self.canvas_width / 2, self.canvas_height / 2
-
-                for i in range(0, len(shape["coords"]), 2):
-                    x_shifted = shape["coords"][i] - cx
-                    y_shifted = shape["coords"][i+1] - cy
-
-                    if transform:
-                        new_point = multiply_matrix_vector(transform, [x_shifted, y_shifted])
-                        new_x = new_point[0] + cx
-                        new_y = new_point[1] + cy
-                    else:
-                        new_x, new_y = shape["coords"][i], shape["coords"][i+1]
-
-                    new_coords.append(new_x)
-                    new_coords.append(new_y)
-
-                new_id = None
-                if shape["type"] == "rectangle":
-                    new_id = self.canvas.create_rectangle(*new_coords, outline=shape["color"], width=shape["thickness"])
-                elif shape["type"] == "circle":
-                    new_id = self.canvas.create_oval(*new_coords, outline=shape["color"], width=shape["thickness"])
-                elif shape["type"] == "line":
-                    new_id = self.canvas.create_line(*new_coords, fill=shape["color"], width=shape["thickness"])
-
-                shape["id"] = new_id  # Update shape ID
-                shape["coords"] = new_coords  # Store new coordinates
-                new_shape_items[new_id] = new_coords
-
-        self.shape_items = new_shape_items  # Update stored shapes
+        if transform:
+            center = self.view_center()
+            # Only each object's matrix changes; points are baked once the user pauses
+            transform_objects(self.strokes + self.shapes, transform, center)
+            self.journal.record_transform(transform, center)
+            affine = affine_about(transform, center)
+            self.chunks.transform(affine)
+            if self.chunks.needs_rebase() and not self.jobs.running("chunks"):
+                self.rebase_chunks()
+            self.snaps.transform(affine)
+            if self.snaps.needs_rebase() and not self.jobs.running("snaps"):
+                self.rebase_snaps()
+            self.tiles.invalidate()
+            self.schedule_bake()
+            # A newer rotate or zoom supersedes this redraw if it hasn't finished
+            self.redraw_canvas_async()
+        else:
+            self.redraw_canvas()
+        self.shape_items = {shape["id"]: shape_coords(shape) for shape in self.shapes}  # Update stored shapes
+
+    def rebase_chunks(self):
+        """Re-keys the chunk index on a worker once zooming has stretched its chunks too far."""
+        boxes, affine = self.chunks.rebase_snapshot()
+        chunk_size = self.chunks.chunk_size
+
+        def compute(job):
+            rebased = rebase_boxes(boxes, affine, chunk_size, job)
+            return None if rebased is None else [rebased]
+
+        def apply(rebased):
+            self.chunks.swap(rebased, affine)
+            # Same view, but its keys changed with the index
+            self.visible_chunks = self.chunks.keys_for_rect(*self.view_rect(), margin=self.chunk_margin)
+            print(f"Chunk index rebased: {len(self.chunks.chunks)} chunks")
+
+        self.jobs.submit("chunks", compute, apply)
+
+    def rebase_snaps(self):
+        """Re-inserts the snap points on a worker once zooming has stretched the index's cells too far."""
+        owned, affine = self.snaps.rebase_snapshot()
+        cell_size = self.snaps.cell_size
+
+        def compute(job):
+            rebased = rebase_points(owned, affine, cell_size, job)
+            return None if rebased is None else [rebased]
+
+        def apply(rebased):
+            self.snaps.swap(rebased, affine)
+            print(f"Snap index rebased: {len(self.snaps)} points")
+
+        self.jobs.submit("snaps", compute, apply)
+
+    def schedule_bake(self):
+        """(Re)starts the idle timer that bakes pending transforms."""
+        if self.bake_job:
+            self.canvas.after_cancel(self.bake_job)
+        self.bake_job = self.canvas.after(self.bake_delay_ms, self.bake_transforms)
+
+    def bake_transforms(self, event=None):
+        """
+        Folds pending transforms into the points of objects that are in memory,
+        bake_budget_ms at a time. Paged-out and compressed strokes keep their
+        matrices (drawing applies them anyway) until they are read back in.
+        """
+        self.bake_job = None
+        deadline = time.perf_counter() + self.bake_budget_ms / 1000
+        baked = 0
+        for obj in self.strokes + self.shapes:
+            if isinstance(obj, Stroke):
+                # Linked copies keep their matrices
+                if obj.matrix is None or obj.shared or obj.paged_out or obj.compressed:
+                    continue
+                obj.bake()
+            elif obj.get("matrix") is not None:
+                bake_shape(obj)
+                if obj["matrix"] is not None:
+                    continue  # Tilted rectangles keep theirs
+            else:
+                continue
+            baked += 1
+            if time.perf_counter() > deadline:
+                self.bake_job = self.canvas.after(1, self.bake_transforms)
+                break
+        if baked:
+            print(f"Baked transforms into {baked} objects")
 
     def clear_canvas(self):
+        if self.strokes or self.shapes:
+            # Keep what was cleared so a misclick can be undone
+            self.undo_stack.append({"type": "clear", "strokes": list(self.strokes), "shapes": list(self.shapes)})
+            self.redo_stack.clear()
+        self.clear_scene()
+
+    def clear_scene(self):
         self.canvas.delete("all")
+        self.tiles.invalidate()
+        self.tile_items = {}
+        self.tile_live = []
         self.strokes = []
+        self.shapes = []
+        self.cold.clear()
+        self.chunks.clear()
+        self.snaps.clear()
+        self.text_items = {}
+        self.materialized = {}
+        self.journal.record_clear()
 
     def save_canvas(self):
         # Open a file dialog for saving the image
         file_path = filedialog.asksaveasfilename(
             defaultextension=".png",
-            filetypes=[("PNG files", "*.png"), ("JPEG files", "*.jpg"), ("All files", "*.*")]
+            filetypes=[("PNG files", "*.png"), ("JPEG files", "*.jpg"), ("Sketch documents", "*.sketch"), ("All files", "*.*")]
         )
-        if file_path:
+        if file_path.lower().endswith(".sketch"):
+            # Editable document, can be rendered later with batch_render.py
+            save_document(file_path, self.strokes, self.shapes)
+            self.page_out_far()
+            print(f"Document saved to {file_path}")
+        elif file_path:
             try:
                 # Dynamically calculate the canvas coordinates
                 x = self.canvas.winfo_rootx()
@@ -808,6 +1717,41 @@ class SketchApp:
             except Exception as e:
                 print(f"Error saving canvas: {e}")
 
+    def set_timelapse_recording(self, enabled):
+        """
+        While on, compacted journals are archived so a timelapse can replay the
+        whole session in order. The archive grows with the session; turning
+        recording off deletes it.
+        """
+        self.record_timelapse = enabled
+        self.journal.set_archiving(enabled)
+        if self.root is not None:
+            self.record_var.set(enabled)
+
+    def save_timelapse(self, path=None):
+        """Exports a process video of this session, replayed from the autosave journal."""
+        if path is None:
+            path = filedialog.asksaveasfilename(defaultextension=".mp4",
+                                                filetypes=[("MP4 video", "*.mp4"), ("AVI video", "*.avi")])
+        if not path:
+            return
+        self.journal.sync()
+        if not self.journal.has_archive() and os.path.exists(self.journal.snapshot_path):
+            print("Timelapse: recording was off, objects from before the last snapshot appear in storage order")
+        records = self.journal.full_history()
+        start = time.perf_counter()
+
+        def compute(job):
+            # Rendering and encoding both happen off the Tk thread
+            count = export_timelapse(records, path, on_frame=job.report)
+            return [count]
+
+        def apply(count):
+            print(f"Timelapse of {len(records)} operations saved to {path}: {count} frames "
+                  f"in {time.perf_counter() - start:.2f} s")
+
+        self.jobs.submit("timelapse", compute, apply)
+
     def import_image(self):
         file_path = filedialog.askopenfilename(filetypes=[("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.gif")])
         if not file_path:
@@ -818,16 +1762,18 @@ class SketchApp:
         img = img.resize((self.canvas_width, self.canvas_height), Image.Resampling.LANCZOS)
 
         # Convert image to Tkinter format
-        self.imported_image = ImageTk.PhotoImage(img)
+        self.imported_image = self.canvas.photo_image(img)
 
-        # Display image on canvas
-        self.canvas.create_image(0, 0, anchor=tk.NW, image=self.imported_image)
+        # Display image on canvas, filling the current view
+        x, y = self.canvas.canvasx(0), self.canvas.canvasy(0)
+        self.canvas.create_image(x, y, anchor=tk.NW, image=self.imported_image)
 
             
     def collect_points(self, event):
         """Collects four points from user clicks."""
         if len(self.perspective_points) < 4:
-            self.perspective_points.append((event.x, event.y))
+            # Corners are picked on the screen grab, so keep them in view coordinates
+            self.perspective_points.append((event.view_x, event.view_y))
             print(f"Point {len(self.perspective_points)}: {event.x}, {event.y}")
 
             # Draw a red circle at the clicked location (radius 5 for visibility)
@@ -860,31 +1806,35 @@ class SketchApp:
         # Define source and destination points
         pts1 = np.float32(self.perspective_points)
         pts2 = np.float32([[0, 0], [self.canvas_width, 0], [0, self.canvas_height], [self.canvas_width, self.canvas_height]])
-
-        # Compute the transformation matrix
-        M = cv2.getPerspectiveTransform(pts1, pts2)
-        
-        # Apply the transformation
-        transformed = cv2.warpPerspective(img_np, M, (self.canvas_width, self.canvas_height))
-
-        # Convert the transformed NumPy array back to an image
-        transformed_img = Image.fromarray(transformed)
-
-        # Convert the transformed image to a Tkinter-compatible image
-        transformed_tk = ImageTk.PhotoImage(transformed_img)
-
-        # Update the canvas with the transformed image
-        self.canvas.create_image(0, 0, anchor="nw", image=transformed_tk)
-
-        # Keep a reference to the image to prevent it from being garbage collected
-        self.canvas.image = transformed_tk
-
+        size = (self.canvas_width, self.canvas_height)
+        origin = (self.canvas.canvasx(0), self.canvas.canvasy(0))
+
+        def compute(job):
+            # cv2 releases the GIL while warping, so Tk stays responsive
+            M = cv2.getPerspectiveTransform(pts1, pts2)
+            transformed = cv2.warpPerspective(img_np, M, size)
+            return [Image.fromarray(transformed)]
+
+        def apply(transformed_img):
+            # PhotoImages can only be made on the Tk thread
+            transformed_tk = self.canvas.photo_image(transformed_img)
+            self.canvas.create_image(*origin, anchor="nw", image=transformed_tk)
+            # Keep a reference to the image to prevent it from being garbage collected
+            self.canvas.image = transformed_tk
+
+        self.jobs.submit("perspective", compute, apply)
         print("Applying perspective transform...")
 
         # Reset for next selection
         self.perspective_points = []
 
 if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1:
+        # Headless batch rendering, e.g. `python main.py drawings/ -o previews --thumb 256`
+        from batch_render import main
+        sys.exit(main(sys.argv[1:]))
+
     root = tk.Tk()
     app = SketchApp(root)
     root.mainloop()
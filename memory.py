@@ -0,0 +1,109 @@
+# memory.py
+import json
+import tracemalloc
+
+MB = 1024 * 1024
+
+# Per-subsystem budgets in bytes, None means unlimited. Going over one makes
+# SketchApp.enforce_memory_budgets() evict from that subsystem.
+DEFAULT_BUDGETS = {
+    "history": 64 * MB,  # Undo/redo bitmaps and objects only the history still holds
+    "stroke_points": 256 * MB,  # Uncompressed point lists of scene strokes
+    "lod_cache": 32 * MB,  # Simplified polylines kept per stroke
+    "reference_cache": 96 * MB,  # Decoded reference images
+    "images": None,  # Imported, warped and fill images on the canvas (all on screen)
+}
+
+CANVAS_ITEM_BYTES = 160  # Rough Tk cost of one canvas item before its coordinates
+
+
+def points_bytes(count):
+    """Rough resident size of `count` points as a Python list of float tuples."""
+    return 56 + count * (8 + 56 + 2 * 24)  # list slot + 2-tuple + two floats
+
+
+def image_bytes(image):
+    """Pixel memory of a PIL image or Tk PhotoImage (RGBA for the latter)."""
+    if image is None:
+        return 0
+    if callable(getattr(image, "width", None)):
+        return image.width() * image.height() * 4
+    return image.size[0] * image.size[1] * len(image.getbands())
+
+
+def shape_bytes(shape):
+    size = 232 + len(shape["coords"]) * 32  # dict + coordinate list
+    if "text" in shape:
+        size += 49 + len(shape["text"])
+    if "mask" in shape:
+        size += shape["mask"].nbytes
+    return size
+
+
+class MemoryMonitor:
+    """
+    Collects per-subsystem byte counts into a report and checks them against
+    budgets. Python heap totals come from tracemalloc, which is only started
+    on the first detailed report because tracing slows every allocation.
+    """
+    def __init__(self, budgets=None):
+        self.budgets = dict(DEFAULT_BUDGETS)
+        self.budgets.update(budgets or {})
+
+    def report(self, subsystems, trace=False):
+        """
+        subsystems maps a name to its byte count, or to a dict with a "bytes"
+        entry plus any details. Returns a JSON-ready report.
+        """
+        entries = {}
+        for name, value in subsystems.items():
+            entry = dict(value) if isinstance(value, dict) else {"bytes": value}
+            budget = self.budgets.get(name)
+            entry["budget"] = budget
+            entry["over_budget"] = budget is not None and entry["bytes"] > budget
+            entries[name] = entry
+        report = {"subsystems": entries, "total_bytes": sum(e["bytes"] for e in entries.values())}
+
+        if trace and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            report["tracemalloc"] = "started, Python heap totals appear from the next report on"
+        elif tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            top = tracemalloc.take_snapshot().statistics("filename")[:10]
+            report["tracemalloc"] = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top_files": [{"file": stat.traceback[0].filename, "bytes": stat.size, "blocks": stat.count}
+                              for stat in top],
+            }
+        return report
+
+    def over_budget(self, name, size):
+        budget = self.budgets.get(name)
+        return budget is not None and size > budget
+
+
+def format_report(report):
+    """Human readable table of a MemoryMonitor report."""
+    lines = [f"{'subsystem':<18}{'MB':>10}{'budget':>10}"]
+    for name, entry in sorted(report["subsystems"].items(), key=lambda item: -item[1]["bytes"]):
+        budget = "-" if entry["budget"] is None else f"{entry['budget'] / MB:.0f}"
+        flag = "  OVER" if entry["over_budget"] else ""
+        lines.append(f"{name:<18}{entry['bytes'] / MB:>10.2f}{budget:>10}{flag}")
+    lines.append(f"{'total':<18}{report['total_bytes'] / MB:>10.2f}")
+    history = report["subsystems"].get("history", {})
+    if history.get("dropped_steps"):
+        lines.append(f"History budget dropped the {history['dropped_steps']} oldest undo steps "
+                     f"({history['dropped_bytes'] / MB:.2f} MB)")
+    traced = report.get("tracemalloc")
+    if isinstance(traced, dict):
+        lines.append(f"Python heap (tracemalloc): {traced['current_bytes'] / MB:.2f} MB, "
+                     f"peak {traced['peak_bytes'] / MB:.2f} MB")
+    elif traced:
+        lines.append(f"tracemalloc {traced}")
+    return "\n".join(lines)
+
+
+def write_report(report, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,219 @@
+# reference_viewer.py
+import os
+from collections import OrderedDict
+import tkinter as tk
+from tkinter import filedialog, ttk
+
+from PIL import Image, ImageTk
+
+IMAGE_TYPES = [("Image Files", "*.png;*.jpg;*.jpeg;*.bmp;*.gif")]
+
+
+class ReferenceCache:
+    """
+    LRU cache of decoded reference images keyed by (path, mtime).
+    Each entry keeps the most detailed decode asked for so far, never the full file
+    unless someone zoomed in far enough to need it.
+    """
+    def __init__(self, max_bytes=96 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = OrderedDict()  # (path, mtime) -> {"full_size": (w, h), "image": Image}
+
+    def get(self, path, max_side):
+        """
+        Return (image, full_size) where image is the reference decoded with its
+        long side at least max_side pixels (or at full resolution if smaller).
+        """
+        key = (path, os.path.getmtime(path))
+        entry = self.entries.get(key)
+        if entry:
+            self.entries.move_to_end(key)
+            full_side = max(entry["full_size"])
+            if max(entry["image"].size) >= min(max_side, full_side):
+                return entry["image"], entry["full_size"]
+
+        image, full_size = decode_reference(path, max_side)
+        self._store(key, {"full_size": full_size, "image": image})
+        return image, full_size
+
+    def paths(self):
+        """Cached reference paths, most recently used first."""
+        return [path for path, _ in reversed(self.entries)]
+
+    def _store(self, key, entry):
+        # Drop older decodes of this key and of stale versions of the same file
+        for old_key in [k for k in self.entries if k[0] == key[0]]:
+            self.bytes -= _image_bytes(self.entries.pop(old_key)["image"])
+        self.entries[key] = entry
+        self.bytes += _image_bytes(entry["image"])
+        self.trim()
+
+    def trim(self):
+        """Evict least recently used decodes until the cache fits in max_bytes."""
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.bytes -= _image_bytes(evicted["image"])
+
+
+def decode_reference(path, max_side):
+    """
+    Decode an image file at roughly max_side pixels on its long side, as
+    RGB, or RGBA when the file has transparency.
+    JPEGs are scaled during decoding with draft(), everything else is
+    shrunk with a cheap integer reduce() right after loading.
+    """
+    img = Image.open(path)
+    full_size = img.size
+    mode = _display_mode(img)
+    scale = max_side / max(full_size)
+    if scale < 1:
+        target = (max(1, int(full_size[0] * scale)), max(1, int(full_size[1] * scale)))
+        img.draft("RGB", target)  # No-op for formats other than JPEG
+        factor = min(img.size[0] // target[0], img.size[1] // target[1])
+        if factor >= 2:
+            if img.mode not in _REDUCIBLE_MODES:
+                img = img.convert(mode)  # Palette, 1-bit and 16-bit images can't be averaged as they are
+            img = img.reduce(factor)
+    img.load()
+    if img.mode != mode:
+        img = img.convert(mode)
+    return img, full_size
+
+
+# Modes whose pixel values can be averaged by reduce()
+_REDUCIBLE_MODES = ("L", "LA", "RGB", "RGBA", "CMYK", "YCbCr")
+
+
+def _display_mode(img):
+    """RGBA for images with an alpha channel or a transparent color, RGB for everything else."""
+    if "A" in img.getbands() or "transparency" in img.info:
+        return "RGBA"
+    return "RGB"
+
+
+def _image_bytes(img):
+    return img.size[0] * img.size[1] * len(img.getbands())
+
+
+class ReferenceWindow:
+    """
+    Toplevel that shows a reference image fitted to the window.
+    Mouse wheel zooms (decoding more detail on demand), dragging pans.
+    """
+    def __init__(self, root, cache, path):
+        self.cache = cache
+        self.window = tk.Toplevel(root)
+        self.window.title("Reference Window")
+        self.window.geometry("400x400")
+        self.window.resizable(True, True)
+
+        toolbar = tk.Frame(self.window)
+        toolbar.pack(side=tk.TOP, fill=tk.X)
+        tk.Button(toolbar, text="Open...", command=self.open_file).pack(side=tk.LEFT, padx=3)
+        self.recent = ttk.Combobox(toolbar, state="readonly")
+        self.recent.bind("<<ComboboxSelected>>", lambda event: self.show(self.recent.get()))
+        self.recent.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=3)
+
+        self.canvas = tk.Canvas(self.window, bg="gray20", highlightthickness=0)
+        self.canvas.pack(expand=True, fill=tk.BOTH)
+        self.canvas.bind("<Configure>", lambda event: self.render())
+        self.canvas.bind("<MouseWheel>", lambda event: self.zoom(1.25 if event.delta > 0 else 0.8, event))
+        self.canvas.bind("<Button-4>", lambda event: self.zoom(1.25, event))
+        self.canvas.bind("<Button-5>", lambda event: self.zoom(0.8, event))
+        self.canvas.bind("<ButtonPress-1>", self.pan_start)
+        self.canvas.bind("<B1-Motion>", self.pan_drag)
+
+        self.path = None
+        self.image = None  # Decoded image currently used for display
+        self.full_size = (1, 1)
+        self.zoom_level = 1.0
+        self.center = (0.5, 0.5)  # View center in normalized image coordinates
+        self.photo = None
+        self.refine_job = None
+        self.show(path)
+
+    def open_file(self):
+        path = filedialog.askopenfilename(filetypes=IMAGE_TYPES, parent=self.window)
+        if path:
+            self.show(path)
+
+    def show(self, path):
+        """Switch the window to another reference."""
+        self.path = path
+        self.zoom_level = 1.0
+        self.center = (0.5, 0.5)
+        self.window.title(f"Reference - {os.path.basename(path)}")
+        self.image, self.full_size = self.cache.get(path, self.window_side())
+        self.recent.config(values=self.cache.paths())
+        self.recent.set(path)
+        self.render()
+
+    def window_side(self):
+        """Long side of the window, enough detail for any image fitted into it."""
+        self.window.update_idletasks()
+        return max(self.view_size())
+
+    def view_size(self):
+        width, height = self.canvas.winfo_width(), self.canvas.winfo_height()
+        if width <= 1 or height <= 1:
+            return 400, 400  # Not mapped yet
+        return width, height
+
+    def fit_scale(self):
+        """Scale that fits the whole image into the window."""
+        width, height = self.view_size()
+        return min(width / self.full_size[0], height / self.full_size[1])
+
+    def needed_side(self):
+        """Long side (in decoded pixels) needed to show the current zoom without upscaling."""
+        return int(max(self.full_size) * self.fit_scale() * self.zoom_level) + 1
+
+    def zoom(self, factor, event):
+        self.zoom_level = min(max(self.zoom_level * factor, 1.0), 64.0)
+        self.render()
+        # Decode more detail once the wheel stops, the current decode is upscaled meanwhile
+        if self.refine_job:
+            self.window.after_cancel(self.refine_job)
+        self.refine_job = self.window.after(150, self.refine)
+
+    def refine(self):
+        self.refine_job = None
+        if self.path and max(self.image.size) < min(self.needed_side(), max(self.full_size)):
+            self.image, self.full_size = self.cache.get(self.path, self.needed_side())
+            self.render()
+
+    def pan_start(self, event):
+        self.pan_origin = (event.x, event.y, self.center)
+
+    def pan_drag(self, event):
+        x0, y0, (cx, cy) = self.pan_origin
+        scale = self.fit_scale() * self.zoom_level
+        self.center = (cx - (event.x - x0) / (scale * self.full_size[0]),
+                       cy - (event.y - y0) / (scale * self.full_size[1]))
+        self.render()
+
+    def render(self):
+        """Crop the visible part of the decoded image and scale it to the window."""
+        if self.image is None:
+            return
+        width, height = self.view_size()
+        scale = self.fit_scale() * self.zoom_level  # screen pixels per full-resolution pixel
+
+        # Visible region in normalized image coordinates, kept inside the image
+        half_w = min(width / (scale * self.full_size[0]), 1.0) / 2
+        half_h = min(height / (scale * self.full_size[1]), 1.0) / 2
+        cx = min(max(self.center[0], half_w), 1 - half_w)
+        cy = min(max(self.center[1], half_h), 1 - half_h)
+        self.center = (cx, cy)
+
+        img_w, img_h = self.image.size
+        box = (int((cx - half_w) * img_w), int((cy - half_h) * img_h),
+               max(int((cx + half_w) * img_w), 1), max(int((cy + half_h) * img_h), 1))
+        out_size = (max(int(2 * half_w * scale * self.full_size[0]), 1),
+                    max(int(2 * half_h * scale * self.full_size[1]), 1))
+        view = self.image.resize(out_size, Image.Resampling.BILINEAR, box=box)
+
+        self.photo = ImageTk.PhotoImage(view)  # Keep reference
+        self.canvas.delete("all")
+        self.canvas.create_image(width / 2, height / 2, image=self.photo)
@@ -0,0 +1,180 @@
+# renderer.py
+import base64
+import io
+from xml.sax.saxutils import escape
+
+from PIL import Image, ImageDraw
+
+from chunks import object_bounds
+from flood_fill import fill_patch_image
+from shape import rectangle_corners, shape_coords
+from text_layout import font_pixels, pil_font, text_anchor, text_angle, text_size
+
+
+def render_scene(strokes, shapes, size=(800, 600), scale=1.0, origin=(0, 0), background="white"):
+    """
+    Rasterize strokes and shapes straight from the model, no Tk involved.
+    origin is the scene point that lands on the image's top-left corner.
+    """
+    width, height = size
+    img = Image.new("RGB", (max(int(width * scale), 1), max(int(height * scale), 1)), background)
+    draw_scene(img, strokes, shapes, scale, origin)
+    return img
+
+
+def draw_scene(img, strokes, shapes, scale=1.0, origin=(0, 0)):
+    """
+    Draw strokes and shapes on top of an existing image, the way render_scene does.
+    Used on its own to add objects to a frame without redrawing the rest.
+    """
+    draw = ImageDraw.Draw(img)
+    ox, oy = origin
+
+    def to_image(points):
+        return [((x - ox) * scale, (y - oy) * scale) for x, y in points]
+
+    # Paint bucket fills go underneath everything else
+    for shape in shapes:
+        if shape["type"] != "fill":
+            continue
+        if "mask" in shape:
+            patch, (x, y) = fill_patch_image(shape, scale)
+            img.paste(patch, (int(round((x - ox) * scale)), int(round((y - oy) * scale))), patch)
+        else:
+            coords = shape_coords(shape)
+            draw.polygon(to_image(list(zip(coords[0::2], coords[1::2]))), fill=shape["color"])
+
+    for stroke in strokes:
+        # Thumbnails and other downscaled renders only need a simplified stroke
+        level = stroke.lod_level(0.5 / (scale * stroke.scale()))
+        local = stroke.polyline() if level is None else stroke.lod_points(level)
+        points = to_image(stroke.world_points(local))
+        if not points:
+            continue
+        width_px = max(int(round(stroke.thickness * scale)), 1)
+        if len(points) > 1:
+            draw.line(points, fill=stroke.color, width=width_px, joint="curve")
+        if stroke.brush != "charcoal" and stroke.brush != "marker":
+            # Round caps, Tk's default for these brushes
+            r = width_px / 2
+            for x, y in (points[0], points[-1]):
+                draw.ellipse((x - r, y - r, x + r, y + r), fill=stroke.color)
+
+    for shape in shapes:
+        if shape["type"] == "fill":
+            continue
+        coords = shape_coords(shape)
+        points = to_image(list(zip(coords[0::2], coords[1::2])))
+        width_px = max(int(round(shape["thickness"] * scale)), 1)
+        if shape["type"] == "line":
+            draw.line(points, fill=shape["color"], width=width_px)
+        elif shape["type"] == "rectangle":
+            draw.polygon(to_image(rectangle_corners(shape)), outline=shape["color"], width=width_px)
+        elif shape["type"] == "circle":
+            (x1, y1), (x2, y2) = points[0], points[1]
+            box = (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+            draw.ellipse(box, outline=shape["color"], width=width_px)
+        elif shape["type"] == "text":
+            patch = text_patch(shape, scale)
+            (x, y), = to_image([text_anchor(shape)])
+            img.paste(patch, (int(round(x - patch.width / 2)), int(round(y - patch.height / 2))), patch)
+
+
+def text_patch(shape, scale=1.0):
+    """A text shape rendered on a transparent image, rotated, to be centered on its anchor."""
+    face = pil_font(shape["font"], font_pixels(text_size(shape) * scale))
+    x1, y1, x2, y2 = ImageDraw.Draw(Image.new("L", (1, 1))).multiline_textbbox(
+        (0, 0), shape["text"], font=face, anchor="mm", align="center")
+    patch = Image.new("RGBA", (int(x2 - x1) + 2, int(y2 - y1) + 2), (0, 0, 0, 0))
+    ImageDraw.Draw(patch).multiline_text((patch.width / 2, patch.height / 2), shape["text"], fill=shape["color"],
+                                         font=face, anchor="mm", align="center")
+    angle = text_angle(shape)
+    if angle:
+        patch = patch.rotate(angle, resample=Image.Resampling.BICUBIC, expand=True)
+    return patch
+
+
+def scene_to_svg(strokes, shapes, size=(800, 600), origin=(0, 0), background="white"):
+    """
+    Export strokes and shapes as an SVG document.
+    Fitted strokes are written as cubic Bézier paths using their control points.
+    """
+    width, height = size
+    ox, oy = origin
+    lines = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" '
+        f'viewBox="{ox} {oy} {width} {height}">',
+        f'<rect x="{ox}" y="{oy}" width="{width}" height="{height}" fill="{background}"/>',
+    ]
+
+    for shape in shapes:
+        if shape["type"] != "fill":
+            continue
+        if "mask" in shape:
+            patch, (x, y) = fill_patch_image(shape)
+            buffer = io.BytesIO()
+            patch.save(buffer, format="PNG")
+            data = base64.b64encode(buffer.getvalue()).decode("ascii")
+            lines.append(f'<image x="{x:.2f}" y="{y:.2f}" width="{patch.width}" height="{patch.height}" '
+                         f'href="data:image/png;base64,{data}"/>')
+        else:
+            coords = shape_coords(shape)
+            points = " ".join(f"{x:.2f},{y:.2f}" for x, y in zip(coords[0::2], coords[1::2]))
+            lines.append(f'<polygon points="{points}" fill="{shape["color"]}" stroke="none"/>')
+
+    for stroke in strokes:
+        points = stroke.world_points()  # Exact for Bézier control points too
+        if len(points) < 2:
+            continue
+        path = f"M{points[0][0]:.2f},{points[0][1]:.2f}"
+        if stroke.curve:
+            for i in range(1, len(points) - 2, 3):
+                (x1, y1), (x2, y2), (x3, y3) = points[i:i + 3]
+                path += f" C{x1:.2f},{y1:.2f} {x2:.2f},{y2:.2f} {x3:.2f},{y3:.2f}"
+        else:
+            path += "".join(f" L{x:.2f},{y:.2f}" for x, y in points[1:])
+        cap = {"charcoal": "butt", "marker": "square"}.get(stroke.brush, "round")
+        lines.append(f'<path d="{path}" fill="none" stroke="{stroke.color}" stroke-width="{stroke.thickness}" '
+                     f'stroke-linecap="{cap}" stroke-linejoin="round" stroke-opacity="{stroke.opacity}"/>')
+
+    for shape in shapes:
+        if shape["type"] == "text":
+            x, y = text_anchor(shape)
+            lines.append(f'<text x="{x:.2f}" y="{y:.2f}" font-family="{escape(shape["font"])}" '
+                         f'font-size="{text_size(shape):.2f}" fill="{shape["color"]}" text-anchor="middle" '
+                         f'dominant-baseline="central" transform="rotate({-text_angle(shape):.2f} {x:.2f} {y:.2f})">'
+                         f'{escape(shape["text"])}</text>')
+            continue
+        if shape["type"] == "fill":
+            continue
+        x1, y1, x2, y2 = shape_coords(shape)[:4]
+        style = f'fill="none" stroke="{shape["color"]}" stroke-width="{shape["thickness"]}"'
+        if shape["type"] == "line":
+            lines.append(f'<line x1="{x1:.2f}" y1="{y1:.2f}" x2="{x2:.2f}" y2="{y2:.2f}" {style}/>')
+        elif shape["type"] == "rectangle":
+            corners = " ".join(f"{x:.2f},{y:.2f}" for x, y in rectangle_corners(shape))
+            lines.append(f'<polygon points="{corners}" {style}/>')
+        elif shape["type"] == "circle":
+            lines.append(f'<ellipse cx="{(x1 + x2) / 2:.2f}" cy="{(y1 + y2) / 2:.2f}" rx="{abs(x2 - x1) / 2:.2f}" '
+                         f'ry="{abs(y2 - y1) / 2:.2f}" {style}/>')
+
+    lines.append("</svg>")
+    return "\n".join(lines)
+
+
+def scene_bounds(strokes, shapes, margin=10):
+    """Bounding box (x1, y1, x2, y2) of everything in the scene, or None if it is empty."""
+    xs, ys = [], []
+    for stroke in strokes:
+        if stroke.points:
+            x1, y1, x2, y2 = stroke.world_bounds()
+            xs.extend((x1, x2))
+            ys.extend((y1, y2))
+    for shape in shapes:
+        # Same extents the chunk index uses: whole fill patches, tilted rectangles and text boxes
+        x1, y1, x2, y2 = object_bounds(shape)
+        xs.extend((x1, x2))
+        ys.extend((y1, y2))
+    if not xs:
+        return None
+    return min(xs) - margin, min(ys) - margin, max(xs) + margin, max(ys) + margin
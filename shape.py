@@ -1,16 +1,399 @@
 # shape.py
+import math
+
+import cv2
+import numpy as np
+
+from curve_fitting import fit_curve, bezier_points
+from flood_fill import baked_patch
+from linear_algebra import apply_affine
+from memory import points_bytes
+from text_layout import bake_text
+
+LOD_TOLERANCE = 0.5  # Max error (model units) of the finest simplified level
+LOD_MAX_LEVEL = 16
+
+_last_uid = 0
+
+def new_uid():
+    """
+    Return a new id for a scene object (stroke or shape).
+    """
+    global _last_uid
+    _last_uid += 1
+    return _last_uid
+
+def reserve_uid(uid):
+    """
+    Make sure new_uid() never hands out an id that was restored from disk.
+    """
+    global _last_uid
+    _last_uid = max(_last_uid, uid)
 
 class Stroke:
     """
     Represents a freehand stroke with additional attributes.
     """
-    def __init__(self, points=None, color="black", thickness=2, opacity=1.0, brush="round"):
+    def __init__(self, points=None, color="black", thickness=2, opacity=1.0, brush="round", curve=False, uid=None):
+        if uid is None:
+            uid = new_uid()
+        else:
+            reserve_uid(uid)
+        self.uid = uid
+        self._lod = {}  # level -> simplified polyline, built on demand
+        self._bounds = None
+        self._page = None  # The stroke's slot in a PointPager, reused when its points change
+        self._pager = None
+        self._page_current = False  # Whether the slot holds the current points
+        self._packed = None  # Compressed copy of the points while they are unchanged
+        self._cold = None
+        self.touched = True  # Set on every read of the points, cleared by ColdStore sweeps
         self.points = points if points is not None else []
         self.color = color
         self.thickness = thickness
         self.opacity = opacity
         self.brush = brush
+        self.curve = curve  # True once points hold cubic Bézier control points
+        self.matrix = None  # Pending 3x3 affine transform, None means identity
+        self.shared = False  # Linked copies read the points, so bake() must leave them alone
         self.canvas_ids = []  # Track drawn elements for erasing
 
+    @property
+    def points(self):
+        self.touched = True
+        if self._points is None:
+            if self._packed is not None:
+                # Cold, decompress in memory
+                self._points = self._cold.unpack(self, self._packed)
+            else:
+                # Paged out, read back from the memory-mapped file
+                self._points = self._pager.read(self._page)
+        return self._points
+
+    @points.setter
+    def points(self, points):
+        self._points = points
+        # Cached geometry and the paged-out copy no longer match
+        self._lod = {}
+        self._bounds = None
+        self._page_current = False
+        self._packed = None
+
+    def add_point(self, x, y):
+        self._points.append((x, y))
+        self._lod = {}
+        self._bounds = None
+        self._page_current = False
+        self._packed = None
+
+    @property
+    def paged_out(self):
+        return self._points is None and self._packed is None
+
+    @property
+    def compressed(self):
+        return self._points is None and self._packed is not None
+
+    def compress(self, cold):
+        """
+        Swap the in-memory points for a compressed copy kept by a ColdStore.
+        Returns True if anything was compressed.
+        """
+        if self._points is None or len(self._points) < 2:
+            return False
+        self.bounds()
+        if self._packed is None or self._cold is not cold:
+            self._packed = cold.pack(self._points)
+            self._cold = cold
+        cold.compressed(self, len(self._points), len(self._packed))
+        self._points = None
+        self._lod = {}
+        return True
+
+    def memory(self):
+        """
+        Rough resident bytes of the stroke's (points, compressed copy, LOD caches).
+        """
+        points = points_bytes(len(self._points)) if self._points is not None else 0
+        packed = len(self._packed) if self._packed is not None else 0
+        lod = sum(points_bytes(len(level)) for level in self._lod.values())
+        return points, packed, lod
+
+    def drop_lod(self):
+        self._lod = {}
+
+    def page_out(self, pager):
+        """
+        Drop the in-memory points, keeping them in the pager's file until
+        they are needed again. Bounds stay cached so culling needs no page-in.
+        """
+        if self._points is None or not self._points:
+            return
+        self.bounds()
+        if self._pager is not pager:
+            self._page, self._pager = None, pager
+        if not self._page_current:
+            self._page = pager.write(self._points, self._page)
+            self._page_current = True
+        self._points = None
+        self._lod = {}
+
+    def points_reader(self):
+        """
+        A function returning the stored points as an (N, 2) array, safe to call
+        on a worker thread while the stroke keeps changing. Resident points
+        are shared (committed point lists are replaced, never modified),
+        paged-out ones are copied out of the pager now and compressed ones
+        are unpacked by the caller.
+        """
+        if self._points is not None:
+            points = self._points
+            return lambda: np.asarray(points, dtype=float).reshape(-1, 2)
+        if self._packed is not None:
+            packed, cold = self._packed, self._cold
+            return lambda: np.asarray(cold.decode(packed), dtype=float).reshape(-1, 2)
+        offset, count, _ = self._page
+        points = np.array(self._pager.array[offset:offset + count])
+        return lambda: points
+
+    def transform(self, affine):
+        """
+        Compose an affine transform onto the stroke without touching its points.
+        """
+        self.matrix = affine if self.matrix is None else affine @ self.matrix
+
+    def world_points(self, points=None):
+        """
+        Points (the stored ones by default) with the pending transform applied.
+        """
+        points = self.points if points is None else points
+        if self.matrix is None or not points:
+            return points
+        return [tuple(p) for p in apply_affine(self.matrix, points).tolist()]
+
+    def bake(self):
+        """
+        Fold the pending transform into the stored points.
+        """
+        if self.matrix is not None and not self.shared:
+            self.points = self.world_points()
+            self.matrix = None
+
+    def scale(self):
+        """
+        How much the pending transform scales lengths (1.0 without one).
+        """
+        if self.matrix is None:
+            return 1.0
+        return math.sqrt(abs(np.linalg.det(self.matrix[:2, :2])))
+
+    def world_bounds(self):
+        """
+        Bounding box of the stroke with the pending transform applied.
+        """
+        if self.matrix is None:
+            return self.bounds()
+        x1, y1, x2, y2 = self.bounds()
+        corners = apply_affine(self.matrix, [(x1, y1), (x2, y1), (x2, y2), (x1, y2)])
+        return (*corners.min(axis=0).tolist(), *corners.max(axis=0).tolist())
+
+    def bounds(self):
+        """
+        Bounding box (x1, y1, x2, y2) of the stored points. For a curve the
+        control points enclose the whole curve, so this is a safe bound.
+        """
+        if self._bounds is None:
+            if not self.points:
+                return (0, 0, 0, 0)
+            pts = np.asarray(self.points, dtype=float)
+            self._bounds = (*pts.min(axis=0).tolist(), *pts.max(axis=0).tolist())
+        return self._bounds
+
+    def lod_level(self, tolerance):
+        """
+        Coarsest simplification level whose error stays under `tolerance`
+        model units, or None if the full detail is needed.
+        """
+        if tolerance < LOD_TOLERANCE:
+            return None
+        return min(int(math.log2(tolerance / LOD_TOLERANCE)), LOD_MAX_LEVEL)
+
+    def lod_points(self, level):
+        """
+        The stroke as a polyline simplified to within LOD_TOLERANCE * 2**level
+        (Douglas-Peucker). Levels are built lazily and cached until the points change.
+        """
+        points = self._lod.get(level)
+        if points is None:
+            flat = np.asarray(self.polyline(), dtype=np.float32).reshape(-1, 1, 2)
+            simplified = cv2.approxPolyDP(flat, LOD_TOLERANCE * 2 ** level, False)
+            points = [tuple(p) for p in simplified.reshape(-1, 2).tolist()]
+            self._lod[level] = points
+        return points
+
+    def fit_curve(self, max_error=2.0):
+        """
+        Replace the raw input points with a piecewise cubic Bézier
+        that stays within max_error pixels of them.
+        """
+        if not self.curve and len(self.points) > 2:
+            self.points = fit_curve(self.points, max_error)
+            self.curve = True
+
+    def polyline(self, steps=8):
+        """
+        Return the stroke as a list of points to draw as straight segments.
+        """
+        if self.curve:
+            return bezier_points(self.points, steps)
+        return self.points
+
+
+class LinkedStroke(Stroke):
+    """
+    A symmetric copy of another stroke. It keeps no points of its own but
+    reads its source's (paged or compressed as the source is), drawn
+    through its own matrix, so a copy costs little more than its canvas items.
+    """
+    def __init__(self, source, matrix, uid=None):
+        self.source = source
+        source.shared = True
+        super().__init__(color=source.color, thickness=source.thickness, opacity=source.opacity,
+                         brush=source.brush, uid=uid)
+        self.matrix = matrix
+        self.shared = True
+
+    @property
+    def points(self):
+        self.touched = True
+        return self.source.points
+
+    @points.setter
+    def points(self, points):
+        pass  # Always the source's
+
+    @property
+    def curve(self):
+        return self.source.curve
+
+    @curve.setter
+    def curve(self, curve):
+        pass
+
+    @property
+    def paged_out(self):
+        return False
+
+    @property
+    def compressed(self):
+        return False
+
     def add_point(self, x, y):
-        self.points.append((x, y))
+        self.source.add_point(x, y)
+
+    def compress(self, cold):
+        return False
+
+    def page_out(self, pager):
+        pass
+
+    def memory(self):
+        return 0, 0, 0
+
+    def points_reader(self):
+        return self.source.points_reader()
+
+    def bounds(self):
+        return self.source.bounds()
+
+    def lod_points(self, level):
+        return self.source.lod_points(level)
+
+    def fit_curve(self, max_error=2.0):
+        pass
+
+
+class FrozenStroke(Stroke):
+    """
+    A stroke as it is now, for drawing on a worker thread. It reads like a
+    Stroke, but its points come from points_reader() and its caches are its
+    own, so the worker never pages in, decompresses (touching the ColdStore
+    LRU) or writes caches on the live stroke. Make it on the Tk thread.
+    """
+    def __init__(self, stroke):
+        owner = getattr(stroke, "source", stroke)  # Linked copies share their source's caches
+        self.uid = stroke.uid
+        self.color = stroke.color
+        self.thickness = stroke.thickness
+        self.opacity = stroke.opacity
+        self.brush = stroke.brush
+        self.curve = stroke.curve
+        self.matrix = stroke.matrix
+        self.shared = True
+        self.canvas_ids = []
+        self._read = stroke.points_reader()
+        self._points = None
+        self._bounds = owner.bounds()
+        self._lod = dict(owner._lod)  # Built levels are replaced, never modified
+
+    @property
+    def points(self):
+        if self._points is None:
+            self._points = [tuple(p) for p in self._read().tolist()]
+        return self._points
+
+    @points.setter
+    def points(self, points):
+        raise AttributeError("FrozenStroke is read-only")
+
+
+def shape_coords(shape):
+    """
+    Flat coordinates of a shape dict with its pending transform applied.
+    """
+    if shape.get("matrix") is None:
+        return shape["coords"]
+    return apply_affine(shape["matrix"], shape["coords"]).ravel().tolist()
+
+def rectangle_corners(shape):
+    """
+    The four corners of a rectangle shape, transformed, so rotations other
+    than quarter turns still come out right.
+    """
+    x1, y1, x2, y2 = shape["coords"][:4]
+    corners = [(x1, y1), (x2, y1), (x2, y2), (x1, y2)]
+    if shape.get("matrix") is None:
+        return corners
+    return [tuple(p) for p in apply_affine(shape["matrix"], corners).tolist()]
+
+def keeps_axes(affine):
+    """
+    True if an affine maps axis-aligned boxes to axis-aligned boxes
+    (scales, mirrors and quarter turns).
+    """
+    m = np.asarray(affine)[:2, :2]
+    return bool(np.allclose([m[0, 1], m[1, 0]], 0) or np.allclose([m[0, 0], m[1, 1]], 0))
+
+def transform_shape(shape, affine):
+    """
+    Compose an affine transform onto a shape dict without touching its coords.
+    """
+    shape["matrix"] = affine if shape.get("matrix") is None else affine @ shape["matrix"]
+
+def bake_shape(shape):
+    """
+    Fold a shape's pending transform into its coords.
+    """
+    if shape.get("matrix") is not None:
+        if shape["type"] == "rectangle" and not keeps_axes(shape["matrix"]):
+            return  # Two corners can't describe a tilted rectangle, keep the matrix
+        if shape["type"] == "text":
+            bake_text(shape)
+            return
+        if "mask" in shape:
+            # Raster fill patch, resample the mask instead
+            mask, origin = baked_patch(shape)
+            shape["mask"], shape["coords"] = mask, list(origin)
+        else:
+            shape["coords"] = shape_coords(shape)
+        shape["matrix"] = None
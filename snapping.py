@@ -0,0 +1,261 @@
+# snapping.py
+import math
+
+import numpy as np
+
+from linear_algebra import apply_affine
+from shape import Stroke, rectangle_corners, shape_coords
+
+
+def snap_points(obj):
+    """
+    The points other objects can snap to, as (x, y, kind) tuples:
+    stroke endpoints, rectangle corners and center, circle center and
+    quadrant points, line endpoints and midpoint.
+    """
+    if isinstance(obj, Stroke):
+        points = obj.points
+        if not points:
+            return []
+        ends = obj.world_points([points[0], points[-1]])
+        return [(x, y, "endpoint") for x, y in ends]
+    if obj["type"] == "rectangle":
+        corners = rectangle_corners(obj)
+        cx = sum(x for x, _ in corners) / 4
+        cy = sum(y for _, y in corners) / 4
+        return [(x, y, "corner") for x, y in corners] + [(cx, cy, "center")]
+    if obj["type"] == "circle":
+        x1, y1, x2, y2 = shape_coords(obj)[:4]
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        return [(cx, cy, "center"), (cx, y1, "quadrant"), (cx, y2, "quadrant"),
+                (x1, cy, "quadrant"), (x2, cy, "quadrant")]
+    if obj["type"] == "line":
+        x1, y1, x2, y2 = shape_coords(obj)[:4]
+        return [(x1, y1, "endpoint"), (x2, y2, "endpoint"), ((x1 + x2) / 2, (y1 + y2) / 2, "midpoint")]
+    return []  # Fills have nothing useful to snap to
+
+
+def snap_to_grid(x, y, spacing):
+    return round(x / spacing) * spacing, round(y / spacing) * spacing
+
+
+class SnapIndex:
+    """
+    Grid hash of snap points, updated one object at a time. With cells as
+    big as the snap radius a query only looks at the 3x3 cells around the
+    cursor, however many points there are. A cell holding more than
+    max_per_cell points is split into a finer grid of its own (a quarter of
+    the size, down to min_cell), so a dense cluster costs a query a few
+    small cells instead of every point in it.
+    Points are kept in index space: rotating or zooming the whole scene
+    only composes self.affine (index space to world), and queries go back
+    through its inverse. Once zooming has scaled cells to less than half or
+    more than twice their size, rebase_points() re-inserts the points on a
+    worker and swap() takes the result over.
+    """
+    def __init__(self, cell_size=16, max_per_cell=32, min_cell=0.25, span=None):
+        self.cell_size = cell_size
+        self.max_per_cell = max_per_cell
+        self.min_cell = min_cell
+        self.span = span  # (i1, j1, i2, j2) key range of a split cell's grid, None at the top
+        self.cells = {}  # (cx, cy) -> list of (x, y, kind, uid), or a SnapIndex once split
+        self.owned = {}  # uid -> that object's index-space (x, y, kind) points
+        self.affine = None  # Index space to world, None while they are the same
+        self.inverse = None
+        self.scales = (1.0, 1.0)  # Least and most the affine stretches a distance
+        self.touched = None  # uids added or removed since rebase_snapshot()
+
+    def __len__(self):
+        return sum(len(points) for points in self.owned.values())
+
+    def _key(self, x, y):
+        i, j = math.floor(x / self.cell_size), math.floor(y / self.cell_size)
+        if self.span is not None:
+            # Rounding can put a point on the edge of its parent cell
+            i1, j1, i2, j2 = self.span
+            i, j = min(max(i, i1), i2), min(max(j, j1), j2)
+        return i, j
+
+    def add(self, uid, points):
+        """Indexes an object's world-space (x, y, kind) snap points."""
+        if uid in self.owned:
+            self.remove(uid)
+        if self.inverse is not None and points:
+            moved = apply_affine(self.inverse, [(x, y) for x, y, _ in points]).tolist()
+            points = [(x, y, kind) for (x, y), (_, _, kind) in zip(moved, points)]
+        self.owned[uid] = points
+        if self.touched is not None:
+            self.touched.add(uid)
+        for x, y, kind in points:
+            self._insert((x, y, kind, uid))
+
+    def _insert(self, entry):
+        key = self._key(entry[0], entry[1])
+        bucket = self.cells.get(key)
+        if isinstance(bucket, SnapIndex):
+            bucket._insert(entry)
+            return
+        if bucket is None:
+            bucket = self.cells[key] = []
+        bucket.append(entry)
+        size = self.cell_size / 4
+        if len(bucket) > self.max_per_cell and size >= self.min_cell:
+            i, j = key
+            split = SnapIndex(size, self.max_per_cell, self.min_cell, span=(4 * i, 4 * j, 4 * i + 3, 4 * j + 3))
+            for moved in bucket:
+                split._insert(moved)
+            self.cells[key] = split
+
+    def remove(self, uid):
+        for x, y, _ in self.owned.pop(uid, ()):
+            self._discard(x, y, uid)
+        if self.touched is not None:
+            self.touched.add(uid)
+
+    def _discard(self, x, y, uid):
+        key = self._key(x, y)
+        bucket = self.cells.get(key)
+        if isinstance(bucket, SnapIndex):
+            bucket._discard(x, y, uid)
+            if not bucket.cells:
+                del self.cells[key]
+            return
+        bucket = [entry for entry in bucket or () if entry[3] != uid]
+        if bucket:
+            self.cells[key] = bucket
+        else:
+            self.cells.pop(key, None)
+
+    def clear(self):
+        self.cells = {}
+        self.owned = {}
+        self.affine = None
+        self.inverse = None
+        self.scales = (1.0, 1.0)
+        self.touched = None  # A rebase still running is out of date
+
+    def transform(self, affine):
+        """Moves every point by the same 3x3 affine, as when the whole scene is rotated or zoomed."""
+        self.affine = affine if self.affine is None else affine @ self.affine
+        self.inverse = np.linalg.inv(self.affine)
+        high, low = np.linalg.svd(self.affine[:2, :2], compute_uv=False).tolist()
+        self.scales = low, high
+
+    def needs_rebase(self):
+        """True once the affine has scaled cells to less than half or more than twice their size."""
+        low, high = self.scales
+        return high > 2 or low < 0.5 or self.skewed()
+
+    def skewed(self):
+        """True if the affine is more than a rotation and uniform scale, so index-space distances are off."""
+        low, high = self.scales
+        return high - low > 1e-9 * high
+
+    def rebase_snapshot(self):
+        """The (owned, affine) rebase_points() works from; later adds and removes are redone by swap()."""
+        self.touched = set()
+        return dict(self.owned), self.affine
+
+    def swap(self, rebased, affine):
+        """
+        Takes over the cells of a rebase_points() result made from the snapshot
+        with `affine`, then redoes whatever changed since the snapshot.
+        """
+        touched = self.touched
+        if touched is None:
+            return  # Cleared meanwhile
+        later = self.affine @ np.linalg.inv(affine)  # Rotates and zooms since the snapshot
+        readd = {uid: self.world_points(uid) for uid in touched if uid in self.owned}
+        self.cells, self.owned = rebased.cells, rebased.owned
+        self.affine = self.inverse = self.touched = None
+        self.scales = (1.0, 1.0)
+        for uid in touched:
+            self.remove(uid)
+        if not np.allclose(later, np.eye(3)):
+            self.transform(later)
+        for uid, points in readd.items():
+            self.add(uid, points)
+
+    def world_points(self, uid):
+        """An object's indexed points, in world space."""
+        points = self.owned.get(uid, [])
+        if self.affine is None or not points:
+            return list(points)
+        moved = apply_affine(self.affine, [(x, y) for x, y, _ in points]).tolist()
+        return [(x, y, kind) for (x, y), (_, _, kind) in zip(moved, points)]
+
+    def nearest(self, x, y, radius, exclude=None):
+        """Closest (x, y, kind) within radius of (x, y), or None."""
+        if self.affine is None:
+            return self._nearest(x, y, radius * radius, exclude)[0]
+        if self.skewed():
+            # Rotating and zooming never skew, but re-insert rather than answer wrongly
+            self.swap(rebase_points(*self.rebase_snapshot(), self.cell_size), self.affine)
+            return self._nearest(x, y, radius * radius, exclude)[0]
+        (ix, iy), = apply_affine(self.inverse, [(x, y)]).tolist()
+        radius /= self.scales[1]
+        found = self._nearest(ix, iy, radius * radius, exclude)[0]
+        if found is None:
+            return None
+        (px, py), = apply_affine(self.affine, [found[:2]]).tolist()
+        return px, py, found[2]
+
+    def _nearest(self, x, y, best_d, exclude):
+        """(closest point, squared distance) among points nearer than sqrt(best_d)."""
+        size = self.cell_size
+        reach = math.ceil(math.sqrt(best_d) / size)
+        cx, cy = self._key(x, y)
+        i1, j1, i2, j2 = cx - reach, cy - reach, cx + reach, cy + reach
+        if self.span is not None:
+            i1, j1 = max(i1, self.span[0]), max(j1, self.span[1])
+            i2, j2 = min(i2, self.span[2]), min(j2, self.span[3])
+        # Nearest cells first, so the rest can be skipped once something closer is found
+        cells = []
+        for i in range(i1, i2 + 1):
+            for j in range(j1, j2 + 1):
+                gap_x = max(i * size - x, 0, x - (i + 1) * size)
+                gap_y = max(j * size - y, 0, y - (j + 1) * size)
+                cells.append((gap_x * gap_x + gap_y * gap_y, i, j))
+        cells.sort()
+
+        best = None
+        for gap, i, j in cells:
+            if gap > best_d:
+                break
+            bucket = self.cells.get((i, j), ())
+            if isinstance(bucket, SnapIndex):
+                found, d = bucket._nearest(x, y, best_d, exclude)
+                if found is not None:
+                    best, best_d = found, d
+                continue
+            if len(bucket) > self.max_per_cell:
+                # Too crowded to split, all within min_cell of each other: any one will do
+                bucket = next(([entry] for entry in bucket if entry[3] != exclude), ())
+            for px, py, kind, uid in bucket:
+                d = (px - x) ** 2 + (py - y) ** 2
+                if d <= best_d and uid != exclude:
+                    best, best_d = (px, py, kind), d
+        return best, best_d
+
+
+def rebase_points(owned, affine, cell_size=16, job=None):
+    """
+    A SnapIndex in world space again, from index-space points and the affine
+    that maps them. Reads no stroke or shape, so it can run on a worker.
+    """
+    rebased = SnapIndex(cell_size)
+    uids = [uid for uid, points in owned.items() if points]
+    if affine is None:
+        affine = np.eye(3)
+    flat = [(x, y) for uid in uids for x, y, _ in owned[uid]]
+    moved = iter(apply_affine(affine, flat).tolist()) if flat else iter(())
+    for i, uid in enumerate(uids):
+        if job is not None and i % 1024 == 0:
+            if job.cancelled:
+                return None
+            job.report(i, len(uids))
+        points = [(*next(moved), kind) for _, _, kind in owned[uid]]
+        rebased.owned[uid] = points
+        for x, y, kind in points:
+            rebased._insert((x, y, kind, uid))
+    return rebased
@@ -0,0 +1,63 @@
+# symmetry.py
+from linear_algebra import apply_affines, symmetry_affines
+from shape import LinkedStroke, keeps_axes
+
+
+class Symmetry:
+    """
+    Mirror or N-way radial symmetry around a center point. Input points are
+    expanded into every copy with one batched multiply; copy 0 is always
+    the input itself.
+    """
+    def __init__(self, mode="mirror", count=6, center=(0, 0)):
+        self.mode = mode
+        self.count = count
+        self.center = tuple(center)
+        self.affines = symmetry_affines(mode, center, count)
+
+    def __len__(self):
+        return len(self.affines)
+
+    def expand(self, points):
+        """(N, M, 2) array of the points as each copy sees them."""
+        return apply_affines(self.affines, points)
+
+    def expand_segments(self, segments):
+        """
+        Line segments (x1, y1, x2, y2, options) -> one list of segments per
+        copy, every endpoint moved in the same multiply.
+        """
+        if not segments:
+            return [[] for _ in self.affines]
+        ends = self.expand([end for x1, y1, x2, y2, _ in segments for end in ((x1, y1), (x2, y2))]).tolist()
+        return [[(*copy[2 * i], *copy[2 * i + 1], segment[4]) for i, segment in enumerate(segments)]
+                for copy in ends]
+
+    def link_strokes(self, stroke):
+        """Copies of a stroke that share its points, one per symmetric position."""
+        return [LinkedStroke(stroke, affine) for affine in self.affines[1:]]
+
+    def copy_shape(self, shape):
+        """
+        Symmetric copies of a rectangle, circle or line shape dict, without
+        ids or uids yet. Circles keep their radii around the moved center;
+        rectangles tilted off the axes carry the affine instead of coords.
+        """
+        x1, y1, x2, y2 = shape["coords"][:4]
+        if shape["type"] == "circle":
+            rx, ry = abs(x2 - x1) / 2, abs(y2 - y1) / 2
+            moved = self.expand([((x1 + x2) / 2, (y1 + y2) / 2)]).tolist()
+        else:
+            moved = self.expand([(x1, y1), (x2, y2)]).tolist()
+        copies = []
+        for affine, points in zip(self.affines[1:], moved[1:]):
+            copy = dict(shape, id=None, uid=None, matrix=None)
+            if shape["type"] == "circle":
+                (cx, cy), = points
+                copy["coords"] = [cx - rx, cy - ry, cx + rx, cy + ry]
+            elif shape["type"] == "rectangle" and not keeps_axes(affine):
+                copy["coords"], copy["matrix"] = list(shape["coords"]), affine
+            else:
+                copy["coords"] = [c for point in points for c in point]
+            copies.append(copy)
+        return copies
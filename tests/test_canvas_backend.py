@@ -0,0 +1,95 @@
+# test_canvas_backend.py
+import time
+
+from canvas_backend import MemoryCanvas
+
+
+def test_find_overlapping_goes_bottom_to_top():
+    canvas = MemoryCanvas()
+    first = canvas.create_rectangle(10, 10, 50, 50)
+    second = canvas.create_line(0, 30, 100, 30, width=4)
+    far = canvas.create_oval(500, 500, 520, 520)
+    assert canvas.find_overlapping(20, 20, 40, 40) == (first, second)
+    canvas.tag_lower(second)
+    assert canvas.find_overlapping(20, 20, 40, 40) == (second, first)
+    assert canvas.find_overlapping(0, 0, 1000, 1000) == (second, first, far)
+    assert canvas.find_all() == (second, first, far)
+
+
+def test_line_width_counts_towards_overlap():
+    canvas = MemoryCanvas()
+    line = canvas.create_line(0, 30, 100, 30, width=10)
+    assert canvas.find_overlapping(50, 34, 50, 34) == (line,)
+    assert canvas.find_overlapping(50, 36, 50, 36) == ()
+
+
+def test_moved_and_deleted_items_leave_the_index():
+    canvas = MemoryCanvas()
+    item = canvas.create_rectangle(10, 10, 20, 20, tags=("stroke", "uid7"))
+    canvas.move("uid7", 300, 0)
+    assert canvas.find_overlapping(10, 10, 20, 20) == ()
+    assert canvas.find_overlapping(310, 10, 320, 20) == (item,)
+    assert canvas.coords(item) == [310.0, 10.0, 320.0, 20.0]
+    canvas.coords(item, 0, 0, 5, 5)
+    assert canvas.find_overlapping(310, 10, 320, 20) == ()
+    canvas.delete("stroke")
+    assert canvas.find_overlapping(0, 0, 1000, 1000) == ()
+    assert canvas.grid == {}
+
+
+def test_huge_items_are_still_found():
+    canvas = MemoryCanvas(cell_size=8)
+    big = canvas.create_rectangle(-10000, -10000, 10000, 10000)
+    assert big in canvas.huge
+    assert canvas.find_overlapping(5000, 5000, 5001, 5001) == (big,)
+    canvas.delete(big)
+    assert canvas.huge == set()
+
+
+def test_find_closest():
+    canvas = MemoryCanvas()
+    assert canvas.find_closest(0, 0) == ()
+    near = canvas.create_oval(100, 100, 110, 110)
+    far = canvas.create_oval(5000, 5000, 5010, 5010)
+    assert canvas.find_closest(95, 95) == (near,)
+    assert canvas.find_closest(4000, 4000) == (far,)  # Beyond both search radii
+    on_top = canvas.create_oval(100, 100, 110, 110)
+    assert canvas.find_closest(105, 105) == (on_top,)
+
+
+def test_tags_and_options():
+    canvas = MemoryCanvas()
+    item = canvas.create_line(0, 0, 10, 10, fill="red", tags="stroke uid3")
+    assert canvas.gettags(item) == ("stroke", "uid3")
+    assert canvas.itemcget("uid3", "fill") == "red"
+    assert canvas.gettags(999) == ()
+
+
+def test_after_runs_callbacks_when_due():
+    canvas = MemoryCanvas()
+    calls = []
+    canvas.after(0, calls.append, "now")
+    later = canvas.after(10000, calls.append, "later")
+    cancelled = canvas.after(0, calls.append, "cancelled")
+    canvas.after_cancel(cancelled)
+    canvas.update()
+    assert calls == ["now"]
+    canvas.after_cancel(later)
+
+    canvas.after(20, calls.append, "soon")
+    canvas.update()
+    assert calls == ["now"]
+    start = time.perf_counter()
+    canvas.run(0.05)
+    assert calls == ["now", "soon"]
+    assert time.perf_counter() - start >= 0.05
+
+
+def test_scrolling_moves_the_view():
+    canvas = MemoryCanvas()
+    canvas.xview_scroll(30, "units")
+    canvas.yview_scroll(-20, "units")
+    assert (canvas.canvasx(0), canvas.canvasy(0)) == (30, -20)
+    canvas.scan_mark(100, 100)
+    canvas.scan_dragto(90, 100, gain=1)
+    assert (canvas.canvasx(5), canvas.canvasy(5)) == (45, -15)
@@ -0,0 +1,112 @@
+# test_chunks.py
+import random
+
+from chunks import ChunkStore, PointPager, rebase_boxes
+from journal import transform_objects
+from linear_algebra import affine_about
+from shape import Stroke
+
+
+def test_page_out_and_back_in():
+    pager = PointPager(capacity=8)
+    points = [(float(i), -float(i)) for i in range(20)]
+    stroke = Stroke(list(points), "black", 2)
+    stroke.page_out(pager)
+    assert stroke.paged_out
+    assert stroke.points == points
+
+
+def test_changed_points_reuse_their_slot():
+    pager = PointPager(capacity=16)
+    stroke = Stroke([(float(i), 0.0) for i in range(10)], "black", 2)
+    other = Stroke([(0.0, float(i)) for i in range(5)], "black", 2)
+    for i in range(500):
+        stroke.page_out(pager)
+        other.page_out(pager)
+        grown = stroke.points + [(i, i)] if i % 7 else stroke.points[:5]
+        stroke.points = grown
+        other.points = other.points + [(i, -i)] if i % 5 else other.points[:3]
+        expected = list(other.points)
+        other.page_out(pager)
+        assert other.points == expected
+    assert pager.used < 64  # Bounded by what is stored, not by how often it changed
+    assert pager.stored <= pager.used
+
+
+def test_freed_slots_merge():
+    pager = PointPager(capacity=16)
+    first = pager.write([(0, 0)] * 4)
+    second = pager.write([(1, 1)] * 4)
+    pager.write([(2, 2)] * 4)
+    pager.free(first)
+    pager.free(second)
+    assert pager.free_slots == [(0, 8)]
+    assert pager.write([(3, 3)] * 8)[0] == 0
+
+
+def scene(count=200, seed=3):
+    rng = random.Random(seed)
+    strokes = []
+    for _ in range(count):
+        x, y = rng.uniform(-5000, 5000), rng.uniform(-5000, 5000)
+        strokes.append(Stroke([(x, y), (x + rng.uniform(0, 300), y + rng.uniform(0, 300))], "black", 2))
+    return strokes
+
+
+def visible(store, rect):
+    return {stroke.uid for stroke in store.objects_in(store.keys_for_rect(*rect))}
+
+
+def overlapping(strokes, rect):
+    x1, y1, x2, y2 = rect
+    return {stroke.uid for stroke in strokes
+            if stroke.world_bounds()[0] <= x2 and stroke.world_bounds()[2] >= x1
+            and stroke.world_bounds()[1] <= y2 and stroke.world_bounds()[3] >= y1}
+
+
+def test_transformed_store_finds_what_a_rebuilt_one_does():
+    strokes = scene()
+    store = ChunkStore()
+    store.rebuild(strokes)
+    for matrix in ([[0, -1], [1, 0]], [[1.5, 0], [0, 1.5]], [[1.5, 0], [0, 1.5]]):
+        affine = affine_about(matrix, (400, 300))
+        transform_objects(strokes, matrix, (400, 300))
+        store.transform(affine)
+    assert store.needs_rebase()
+    for rect in [(0, 0, 800, 600), (-3000, 2000, -1000, 4000), (6000, -9000, 9000, -6000)]:
+        assert overlapping(strokes, rect) <= visible(store, rect)
+
+
+def test_swap_keeps_changes_made_during_the_rebase():
+    strokes = scene()
+    store = ChunkStore()
+    store.rebuild(strokes)
+    store.transform(affine_about([[0.25, 0], [0, 0.25]], (0, 0)))
+    transform_objects(strokes, [[0.25, 0], [0, 0.25]], (0, 0))
+    boxes, affine = store.rebase_snapshot()
+    rebased = rebase_boxes(boxes, affine)
+
+    # Meanwhile on the Tk thread: an erase, a new stroke and another zoom
+    store.remove(strokes.pop(0))
+    late = Stroke([(100.0, 100.0), (120.0, 110.0)], "black", 2)
+    strokes.append(late)
+    store.add(late)
+    store.transform(affine_about([[2, 0], [0, 2]], (50, 50)))
+    transform_objects(strokes, [[2, 0], [0, 2]], (50, 50))
+
+    store.swap(rebased, affine)
+    assert not store.needs_rebase()
+    for rect in [(0, 0, 800, 600), (-3000, -3000, 3000, 3000), (150, 150, 250, 250)]:
+        assert overlapping(strokes, rect) <= visible(store, rect) <= {stroke.uid for stroke in strokes}
+    assert late.uid in visible(store, (150, 150, 250, 250))
+    assert set(store.boxes) == {stroke.uid for stroke in strokes}
+
+
+def test_swap_after_clear_is_ignored():
+    store = ChunkStore()
+    store.rebuild(scene(10))
+    snapshot = store.rebase_snapshot()
+    rebased = rebase_boxes(*snapshot)
+    store.clear()
+    store.swap(rebased, snapshot[1])
+    assert store.chunks == {} and store.boxes == {}
@@ -0,0 +1,100 @@
+# test_cold_storage.py
+import struct
+
+import pytest
+
+from canvas_backend import MemoryCanvas
+from chunks import PointPager
+from cold_storage import QUANTUM, ColdStore, pack_points, unpack_points
+from main import SketchApp
+from shape import FrozenStroke, Stroke
+
+
+def delta_width(data):
+    return struct.unpack_from("<IB", data)[1]
+
+
+@pytest.mark.parametrize("points, width", [
+    ([(0.5, 1.25), (0.75, 1.0), (1.0, 1.5)], 1),
+    ([(0, 0), (300, -200)], 2),
+    ([(0, 0), (4e6, 1)], 4),
+    ([(4e7, 1)], 8),
+    ([(0, 0), (4e7, -4e7), (-1e9, 3.5)], 8),
+])
+def test_pack_round_trip(points, width):
+    data = pack_points(points)
+    assert delta_width(data) == width
+    assert unpack_points(data) == pytest.approx([(float(x), float(y)) for x, y in points], abs=QUANTUM)
+
+
+def test_pack_quantizes_to_a_64th():
+    points = unpack_points(pack_points([(0.004, 10.01)]))
+    assert points == [(0.0, 10.015625)]
+
+
+def test_pack_empty():
+    assert unpack_points(pack_points([])) == []
+
+
+def test_stroke_compress_and_read_back():
+    cold = ColdStore(lru_size=1)
+    points = [(float(i), i * 0.5) for i in range(100)]
+    stroke = Stroke(list(points), "black", 2)
+    assert stroke.compress(cold)
+    assert stroke.compressed
+    assert stroke.points == points
+    assert not stroke.compressed
+    assert cold.decompressions == 1
+
+
+def test_frozen_stroke_reads_without_touching_the_live_one():
+    cold = ColdStore()
+    pager = PointPager()
+    points = [(float(i), (i % 7) * 0.25) for i in range(200)]
+    packed, paged = Stroke(list(points), "black", 2), Stroke(list(points), "red", 3)
+    packed.compress(cold)
+    paged.page_out(pager)
+    for stroke in (packed, paged):
+        frozen = FrozenStroke(stroke)
+        stroke.touched = False
+        assert frozen.points == pytest.approx(points, abs=QUANTUM)
+        assert frozen.lod_points(3)
+        assert frozen.world_bounds() == stroke.world_bounds()
+        assert not stroke.touched
+        assert stroke._points is None and stroke._lod == {}
+    assert cold.decompressions == 0 and not cold.lru
+    pager.close()
+
+
+def test_background_redraw_leaves_cold_strokes_compressed(tmp_path):
+    app = SketchApp(None, canvas=MemoryCanvas(), journal_dir=str(tmp_path))
+    for i in range(50):
+        app.add_object(Stroke([(100.0 + i, 100.0 + j) for j in range(30)], "black", 2))
+    for stroke in app.strokes:
+        assert stroke.compress(app.cold)
+    app.redraw_canvas_async()
+    app.canvas.run(0.3)
+    assert not app.jobs.running("redraw")
+    assert all(stroke.compressed and stroke.canvas_ids for stroke in app.strokes)
+    assert app.cold.decompressions == 0
+    app.on_close()
+
+
+def test_removed_and_cleared_strokes_leave_the_store(tmp_path):
+    app = SketchApp(None, canvas=MemoryCanvas(), journal_dir=str(tmp_path))
+    strokes = [Stroke([(100.0 + i, 100.0 + j) for j in range(30)], "black", 2) for i in range(4)]
+    for stroke in strokes:
+        app.add_object(stroke)
+        stroke.compress(app.cold)
+    strokes[0].points  # Decompressed, into the LRU
+
+    app.remove_object(strokes[0])
+    app.remove_object(strokes[1])
+    assert set(app.cold.cold) == {strokes[2].uid, strokes[3].uid} and not app.cold.lru
+    app.add_object(strokes[1])  # As undo does, reading it back for snapping
+    assert strokes[1].points == [(101.0, 100.0 + j) for j in range(30)]
+    assert list(app.cold.lru) == [strokes[1].uid]
+
+    app.clear_scene()
+    assert app.cold.stats()["compressed_strokes"] == 0 and not app.cold.lru
+    app.on_close()
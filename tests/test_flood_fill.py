@@ -0,0 +1,53 @@
+# test_flood_fill.py
+import cv2
+import numpy as np
+import pytest
+
+from flood_fill import flood_fill_mask, make_fill
+
+
+def polygon_area(coords):
+    xs, ys = np.asarray(coords[0::2]), np.asarray(coords[1::2])
+    return abs(np.sum(xs * np.roll(ys, -1) - np.roll(xs, -1) * ys)) / 2
+
+
+def test_polygon_follows_pixel_edges():
+    mask = np.zeros((40, 60), np.uint8)
+    mask[5:35, 5:55] = 255
+    shape = make_fill(mask, "#00ff00", 1, pixel_size=0.5, origin=(200, 100))
+    xs, ys = shape["coords"][0::2], shape["coords"][1::2]
+    assert (min(xs), min(ys), max(xs), max(ys)) == (202.5, 102.5, 227.5, 117.5)
+
+
+@pytest.mark.parametrize("region", [np.s_[10, 10], np.s_[10, 10:20], np.s_[3:9, 30]])
+def test_thin_regions_cover_their_pixels(region):
+    mask = np.zeros((40, 60), np.uint8)
+    mask[region] = 255
+    shape = make_fill(mask, "#00ff00", 1)
+    assert polygon_area(shape["coords"]) == np.count_nonzero(mask)
+
+
+def test_round_region_keeps_its_area():
+    mask = np.zeros((80, 80), np.uint8)
+    cv2.circle(mask, (40, 40), 25, 255, -1)
+    shape = make_fill(mask, "#00ff00", 1)
+    # Running through edge pixel centers instead would lose half a pixel all round, about 80 px
+    assert polygon_area(shape["coords"]) == pytest.approx(np.count_nonzero(mask), rel=0.01)
+
+
+def test_one_pixel_spike_is_squared_off():
+    mask = np.zeros((40, 60), np.uint8)
+    mask[5:35, 5:20] = 255
+    mask[20, 20:40] = 255
+    shape = make_fill(mask, "#00ff00", 1)
+    xs = shape["coords"][0::2]
+    assert max(xs) == 40
+    assert polygon_area(shape["coords"]) == pytest.approx(np.count_nonzero(mask), abs=1)
+
+
+def test_flood_fill_stops_at_lines():
+    pixels = np.full((50, 50, 3), 255, np.uint8)
+    pixels[:, 25] = 0
+    mask = flood_fill_mask(pixels, (10, 10))
+    assert np.count_nonzero(mask) == 50 * 25
+    assert flood_fill_mask(pixels, (-1, 10)) is None
@@ -0,0 +1,93 @@
+# test_headless_app.py
+from types import SimpleNamespace
+
+import pytest
+
+from canvas_backend import MemoryCanvas
+from linear_algebra import rotation_matrix
+from main import SketchApp
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = SketchApp(None, canvas=MemoryCanvas(), journal_dir=str(tmp_path))
+    yield app
+    app.on_close()
+
+
+def drag(app, points):
+    app.on_mouse_press(SimpleNamespace(x=points[0][0], y=points[0][1]))
+    for x, y in points[1:]:
+        app.on_mouse_drag(SimpleNamespace(x=x, y=y))
+    app.on_mouse_release(SimpleNamespace(x=points[-1][0], y=points[-1][1]))
+
+
+def test_draw_undo_redo(app):
+    app.set_tool("draw")
+    drag(app, [(100 + i * 5, 100 + (i % 3)) for i in range(20)])
+    assert len(app.strokes) == 1
+    stroke = app.strokes[0]
+    assert stroke.canvas_ids
+    assert app.canvas.find_overlapping(140, 95, 150, 105)
+
+    app.undo()
+    assert app.strokes == []
+    assert app.canvas.find_overlapping(140, 95, 150, 105) == ()
+    app.redo()
+    assert app.strokes == [stroke]
+    assert app.canvas.find_overlapping(140, 95, 150, 105)
+
+
+def test_draw_rectangle(app):
+    app.set_tool("rectangle")
+    drag(app, [(10, 20), (60, 50), (110, 70)])
+    assert [shape["type"] for shape in app.shapes] == ["rectangle"]
+    assert app.canvas.coords(app.shapes[0]["id"]) == [10.0, 20.0, 110.0, 70.0]
+    app.undo()
+    assert app.shapes == []
+
+
+def test_rotate_turns_the_scene_about_the_view_center(app):
+    app.set_tool("draw")
+    drag(app, [(500, 300), (550, 300), (600, 300)])
+    stroke = app.strokes[0]
+    before = stroke.world_points()
+    app.rotate_strokes()
+    app.canvas.run(0.3)  # Let the background redraw finish
+
+    cx, cy = app.view_center()
+    (a, b), (c, d) = rotation_matrix(90)
+    expected = [(cx + a * (x - cx) + b * (y - cy), cy + c * (x - cx) + d * (y - cy)) for x, y in before]
+    assert [p for point in stroke.world_points() for p in point] == \
+           pytest.approx([p for point in expected for p in point])
+    assert stroke.canvas_ids
+    assert app.canvas.coords(stroke.canvas_ids[0])
+
+
+def test_scale_grows_the_scene(app):
+    app.set_tool("draw")
+    drag(app, [(450, 300), (500, 300), (550, 300)])
+    xs = [x for x, _ in app.strokes[0].world_points()]
+    app.scale_strokes()
+    app.canvas.run(0.3)
+    scaled = [x for x, _ in app.strokes[0].world_points()]
+    assert max(scaled) - min(scaled) == pytest.approx(1.5 * (max(xs) - min(xs)))
+
+
+def test_history_budget_drops_the_oldest_undo_steps(app):
+    app.set_tool("draw")
+    for y in (100, 200, 300):
+        drag(app, [(100 + i * 5, y) for i in range(20)])
+        if y == 200:
+            app.clear_canvas()
+    app.undo()
+    first, second, clear = app.undo_stack
+    kept = app.history_bytes(first) + app.history_bytes(second) + app.history_bytes(app.redo_stack[0])
+    app.memory.budgets["history"] = kept
+
+    app.enforce_memory_budgets()
+    assert app.undo_stack == [clear]
+    assert len(app.redo_stack) == 1
+    history = app.memory_report()["subsystems"]["history"]
+    assert history["dropped_steps"] == 2
+    assert history["bytes"] <= kept
@@ -0,0 +1,173 @@
+# test_journal.py
+import numpy as np
+import pytest
+
+from flood_fill import make_fill
+from journal import (ADD_SHAPE, ADD_STROKE, Compaction, Journal, decode_shape, decode_stroke,
+                     encode_shape, encode_stroke, replay, transform_objects)
+from linear_algebra import affine_about
+from shape import Stroke, new_uid, shape_coords, transform_shape
+from text_layout import bake_text, text_bounds
+
+
+def shape(kind, coords, **extra):
+    return dict({"id": None, "uid": new_uid(), "type": kind, "coords": coords, "color": "#ff0000",
+                 "thickness": 3, "matrix": None}, **extra)
+
+
+def same_shape(a, b, keys=("uid", "type", "coords", "color", "thickness")):
+    return {key: a[key] for key in keys} == {key: b[key] for key in keys}
+
+
+def text(size=16):
+    return shape("text", [100.0, 80.0], text="Hello\nthere", font="Arial", size=size, angle=0.0,
+                 color="black", thickness=0)
+
+
+def test_stroke_round_trip():
+    stroke = Stroke([(0.5, 1.25), (4e7 + 0.125, -3.75), (12.0, 9.0)], "#123456", 4.5,
+                    opacity=0.5, brush="marker", curve=True)
+    copy = decode_stroke(encode_stroke(stroke))
+    assert copy.uid == stroke.uid
+    assert copy.points == stroke.points  # Doubles, exact even far from the origin
+    assert (copy.color, copy.thickness, copy.opacity, copy.brush, copy.curve) == ("#123456", 4.5, 0.5, "marker", True)
+
+
+def test_stroke_pending_transform_is_encoded():
+    stroke = Stroke([(10.0, 0.0), (20.0, 0.0)], "black", 2)
+    transform_objects([stroke], [[0, -1], [1, 0]], (0, 0))
+    copy = decode_stroke(encode_stroke(stroke))
+    assert copy.matrix is None
+    assert copy.points == pytest.approx(stroke.world_points())
+
+
+@pytest.mark.parametrize("kind, coords", [
+    ("rectangle", [10.0, 20.0, 110.0, 70.0]),
+    ("circle", [-5.5, 0.0, 5.5, 11.0]),
+    ("line", [0.0, 0.0, 1e8 + 0.5, 3.0]),
+])
+def test_shape_round_trip(kind, coords):
+    original = shape(kind, coords)
+    assert same_shape(decode_shape(encode_shape(original)), original)
+
+
+def test_fill_polygon_and_patch_round_trip():
+    mask = np.zeros((40, 60), np.uint8)
+    mask[5:35, 5:55] = 255
+    polygon = make_fill(mask, "#00ff00", new_uid(), origin=(200, 100))
+    assert "mask" not in polygon
+    assert decode_shape(encode_shape(polygon))["coords"] == pytest.approx(polygon["coords"])
+
+    mask[15:25, 20:30] = 0  # A hole makes it a raster patch
+    patch = make_fill(mask, "#00ff00", new_uid(), pixel_size=0.5, origin=(200, 100))
+    copy = decode_shape(encode_shape(patch))
+    assert np.array_equal(copy["mask"], patch["mask"])
+    assert copy["coords"] == patch["coords"]
+    assert copy["pixel_size"] == patch["pixel_size"]
+
+
+def test_text_round_trip():
+    original = text()
+    original["text"] = "Ünïcode ✓"
+    copy = decode_shape(encode_shape(original))
+    assert same_shape(copy, original, ("uid", "type", "text", "font", "size", "angle", "coords"))
+
+
+def test_text_size_survives_zooming_out_and_back():
+    item = text(size=16)
+    for factor in [0.67] * 5 + [1.5] * 5:
+        transform_shape(item, affine_about([[factor, 0], [0, factor]], (0, 0)))
+        bake_text(item)
+        item = decode_shape(encode_shape(item))
+    assert 16 < item["size"] < 16.5
+    x1, y1, x2, y2 = text_bounds(item)
+    assert x2 > x1 and y2 > y1
+
+
+def test_journal_replays_and_compacts(tmp_path):
+    journal = Journal(str(tmp_path), compact_after=4, archive=True)
+    journal.reset()
+    strokes = [Stroke([(i, 0.0), (i, 10.0)], "black", 2) for i in range(3)]
+    rectangle = shape("rectangle", [0.0, 0.0, 10.0, 10.0])
+    for stroke in strokes:
+        journal.record_stroke(stroke)
+    journal.record_shape(rectangle)
+    journal.record_remove(strokes[1].uid)
+    assert journal.needs_compaction()
+
+    journal.compact([strokes[0], strokes[2]], [rectangle])
+    late = Stroke([(5.0, 5.0), (6.0, 6.0)], "black", 2)
+    journal.record_stroke(late)
+    journal.close()
+
+    loaded_strokes, loaded_shapes = Journal(str(tmp_path)).load()
+    assert [s.uid for s in loaded_strokes] == [strokes[0].uid, strokes[2].uid, late.uid]
+    assert [s["uid"] for s in loaded_shapes] == [rectangle["uid"]]
+
+    # The archive keeps the order things were made in, removed stroke included
+    history = Journal(str(tmp_path)).full_history()
+    kinds = [kind for kind, _ in history if kind in (ADD_STROKE, ADD_SHAPE)]
+    assert kinds == [ADD_STROKE] * 3 + [ADD_SHAPE] + [ADD_STROKE]
+    assert [s.uid for s in replay(history)[0]] == [strokes[0].uid, strokes[2].uid, late.uid]
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.reset()
+    kept = Stroke([(0.0, 0.0), (1.0, 1.0)], "black", 2)
+    journal.record_stroke(kept)
+    journal.close()
+    with open(journal.journal_path, "ab") as f:
+        f.write(b"\x01\xff\x00\x00\x00partial")  # A record cut short by a crash
+    strokes, _ = Journal(str(tmp_path)).load()
+    assert [s.uid for s in strokes] == [kept.uid]
+
+
+def test_transform_record_replays_as_a_pending_matrix(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.reset()
+    rectangle = shape("rectangle", [0.0, 0.0, 10.0, 10.0])
+    journal.record_shape(rectangle)
+    journal.record_transform([[2, 0], [0, 2]], (0, 0))
+    journal.close()
+    _, shapes = Journal(str(tmp_path)).load()
+    assert shape_coords(shapes[0]) == [0.0, 0.0, 20.0, 20.0]
+
+
+def test_records_made_while_compacting_are_carried_over(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.reset()
+    first = Stroke([(0.0, 0.0), (1.0, 1.0)], "black", 2)
+    journal.record_stroke(first)
+    compaction = Compaction(journal, [first], [])
+    second = Stroke([(2.0, 2.0), (3.0, 3.0)], "black", 2)
+    journal.record_stroke(second)  # Journaled while the worker writes the snapshot
+    first.points = [(9.0, 9.0), (10.0, 10.0)]  # Not journaled, so the snapshot must not see it
+    compaction.write()
+    compaction.finish()
+    journal.close()
+
+    strokes, _ = Journal(str(tmp_path)).load()
+    assert [s.uid for s in strokes] == [first.uid, second.uid]
+    assert strokes[0].points == [(0.0, 0.0), (1.0, 1.0)]
+
+
+def test_archive_is_only_kept_while_recording(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.reset()
+    stroke = Stroke([(0.0, 0.0), (1.0, 1.0)], "black", 2)
+    journal.record_stroke(stroke)
+    journal.compact([stroke], [])
+    assert not journal.has_archive()
+
+    journal.set_archiving(True)
+    journal.compact([stroke], [])
+    assert journal.has_archive()
+
+    # A restored session that doesn't record drops the archive at its first snapshot
+    journal.close()
+    restored = Journal(str(tmp_path))
+    restored.load()
+    restored.compact([stroke], [])
+    assert not restored.has_archive()
+    restored.close()
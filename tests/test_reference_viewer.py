@@ -0,0 +1,47 @@
+# test_reference_viewer.py
+import pytest
+from PIL import Image
+
+from reference_viewer import decode_reference
+
+
+def gradient(mode, size=(400, 300)):
+    img = Image.linear_gradient("L").resize(size)
+    if mode == "I;16":
+        return img.point(lambda v: v * 256, "I").convert("I;16")
+    return img.convert(mode)
+
+
+@pytest.mark.parametrize("mode, extension, decoded", [
+    ("P", "png", "RGB"),
+    ("P", "gif", "RGB"),
+    ("1", "png", "RGB"),
+    ("I;16", "png", "RGB"),
+    ("L", "png", "RGB"),
+    ("LA", "png", "RGBA"),
+    ("RGBA", "png", "RGBA"),
+    ("L", "jpg", "RGB"),
+    ("CMYK", "jpg", "RGB"),
+])
+def test_decode_any_mode_at_reduced_size(tmp_path, mode, extension, decoded):
+    path = str(tmp_path / f"reference.{extension}")
+    gradient(mode).save(path)
+    img, full_size = decode_reference(path, 100)
+    assert full_size == (400, 300)
+    assert img.mode == decoded
+    assert 100 <= max(img.size) < 400
+
+
+def test_transparent_palette_keeps_its_alpha(tmp_path):
+    path = str(tmp_path / "reference.png")
+    img = gradient("P")
+    img.info["transparency"] = 0
+    img.save(path, transparency=0)
+    assert decode_reference(path, 100)[0].mode == "RGBA"
+
+
+def test_small_images_decode_at_full_size(tmp_path):
+    path = str(tmp_path / "reference.png")
+    gradient("RGB", (50, 40)).save(path)
+    img, full_size = decode_reference(path, 100)
+    assert img.size == full_size == (50, 40)
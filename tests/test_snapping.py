@@ -0,0 +1,111 @@
+# test_snapping.py
+import math
+import random
+
+import pytest
+
+from linear_algebra import affine_about, apply_affine
+from snapping import SnapIndex, rebase_points
+
+
+def brute_nearest(points, x, y, radius):
+    best = min(points, key=lambda p: math.hypot(p[0] - x, p[1] - y))
+    return best if math.hypot(best[0] - x, best[1] - y) <= radius else None
+
+
+def test_nearest_matches_brute_force_in_a_dense_cluster():
+    rng = random.Random(4)
+    points = [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(20000)]
+    index = SnapIndex()
+    for uid, (x, y) in enumerate(points):
+        index.add(uid, [(x, y, "endpoint")])
+    assert any(isinstance(bucket, SnapIndex) for bucket in index.cells.values())
+    for _ in range(200):
+        x, y = rng.uniform(-20, 120), rng.uniform(-20, 120)
+        found = index.nearest(x, y, 10)
+        expected = brute_nearest(points, x, y, 10)
+        if expected is None:
+            assert found is None
+        else:
+            assert math.hypot(found[0] - x, found[1] - y) == math.hypot(expected[0] - x, expected[1] - y)
+
+
+def test_remove_and_exclude():
+    index = SnapIndex()
+    for uid in range(100):
+        index.add(uid, [(50.0 + uid * 0.01, 50.0, "endpoint")])
+    assert index.nearest(50, 50, 5, exclude=0)[0] == 50.01
+    for uid in range(100):
+        index.remove(uid)
+    assert len(index) == 0
+    assert index.cells == {}
+    assert index.nearest(50, 50, 5) is None
+
+
+def moved(points, affine):
+    return [tuple(p) for p in apply_affine(affine, points).tolist()]
+
+
+def check_against_brute_force(index, points, rng, spread=(-200, 300)):
+    for _ in range(200):
+        x, y = rng.uniform(*spread), rng.uniform(*spread)
+        found = index.nearest(x, y, 10)
+        expected = brute_nearest(points, x, y, 10)
+        if expected is None:
+            assert found is None
+        else:
+            assert math.hypot(found[0] - x, found[1] - y) == pytest.approx(math.hypot(expected[0] - x, expected[1] - y))
+
+
+def test_transformed_index_answers_in_world_space():
+    rng = random.Random(5)
+    points = [(rng.uniform(0, 100), rng.uniform(0, 100)) for _ in range(2000)]
+    index = SnapIndex()
+    for uid, (x, y) in enumerate(points):
+        index.add(uid, [(x, y, "endpoint")])
+    for matrix in ([[0, -1], [1, 0]], [[1.5, 0], [0, 1.5]], [[1.5, 0], [0, 1.5]]):
+        affine = affine_about(matrix, (50, 50))
+        index.transform(affine)
+        points = moved(points, affine)
+    assert index.needs_rebase()
+    check_against_brute_force(index, points, rng)
+
+    # A stroke drawn now is added in world space too
+    index.add("new", [(1000.0, 1000.0, "endpoint")])
+    assert index.nearest(1002, 1001, 5) == pytest.approx((1000.0, 1000.0, "endpoint"))
+
+
+def test_swap_keeps_changes_made_during_the_rebase():
+    rng = random.Random(6)
+    points = {uid: (rng.uniform(0, 100), rng.uniform(0, 100)) for uid in range(2000)}
+    index = SnapIndex()
+    for uid, (x, y) in points.items():
+        index.add(uid, [(x, y, "endpoint")])
+    shrink = affine_about([[0.25, 0], [0, 0.25]], (0, 0))
+    index.transform(shrink)
+    owned, affine = index.rebase_snapshot()
+    rebased = rebase_points(owned, affine)
+
+    # Meanwhile on the Tk thread: an erase, a new stroke and a rotate
+    del points[0]
+    index.remove(0)
+    points["new"] = (30.0, 30.0)
+    index.add("new", [(30.0, 30.0, "endpoint")])
+    turn = affine_about([[0, -1], [1, 0]], (10, 10))
+    index.transform(turn)
+
+    index.swap(rebased, affine)
+    assert not index.needs_rebase()
+    world = {uid: moved([p], turn)[0] if uid == "new" else moved([p], turn @ shrink)[0] for uid, p in points.items()}
+    assert len(index) == len(world)
+    check_against_brute_force(index, list(world.values()), rng, spread=(-30, 50))
+
+
+def test_skewed_affine_is_rebased_before_answering():
+    index = SnapIndex()
+    index.add(1, [(10.0, 0.0, "endpoint")])
+    index.add(2, [(0.0, 12.0, "endpoint")])
+    index.transform(affine_about([[3, 0], [0, 1]], (0, 0)))  # (30, 0) and (0, 12)
+    assert index.skewed()
+    assert index.nearest(0, 0, 20) == pytest.approx((0.0, 12.0, "endpoint"))
+    assert index.affine is None
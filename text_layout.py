@@ -0,0 +1,176 @@
+# text_layout.py
+"""
+Text lives in the scene as a shape dict of type "text":
+
+    {"id", "uid", "type": "text", "coords": [x, y], "text", "font", "size",
+     "angle", "color", "thickness": 0, "matrix"}
+
+coords is the point the text is centered on (Tk's default anchor), size is
+in pixels and angle in degrees counterclockwise, all before the pending
+matrix is applied. size is a float so repeated zooms don't drift; it is only
+rounded when a font is built.
+"""
+import math
+from collections import OrderedDict
+from tkinter import font as tkfont
+
+import numpy as np
+from PIL import ImageFont
+
+from linear_algebra import apply_affine
+
+DEFAULT_FONT = "Arial"
+DEFAULT_SIZE = 16  # px, about Tk's 12 pt
+
+
+class FontMetricsCache:
+    """
+    Text extents keyed by (font, size, string). The measuring function (Tk
+    fonts once the app has a window, PIL otherwise) only runs the first time
+    a key is seen; zoom, hit-tests and exports reuse the result. Keys use the
+    text's own size, so zooming the scene never creates new ones.
+    """
+    def __init__(self, measure=None, max_entries=4096):
+        self.measure = measure or pil_measure
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (font, size, text) -> (width, height), least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def use(self, measure):
+        """Switches measuring functions, dropping what the old one measured."""
+        self.measure = measure
+        self.entries.clear()
+
+    def extents(self, font, size, text):
+        """(width, height) in pixels of text set in font at size."""
+        key = (font, size, text)
+        found = self.entries.get(key)
+        if found is not None:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return found
+        self.misses += 1
+        found = self.entries[key] = self.measure(font, size, text)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return found
+
+
+_pil_fonts = {}
+
+
+def pil_font(font, size):
+    """A PIL font for a family name at a pixel size, falling back to a bundled one."""
+    key = (font, size)
+    face = _pil_fonts.get(key)
+    if face is None:
+        for name in (font, font.lower() + ".ttf", "DejaVuSans.ttf"):
+            try:
+                face = ImageFont.truetype(name, size)
+                break
+            except OSError:
+                continue
+        else:
+            face = ImageFont.load_default(size)
+        face = _pil_fonts[key] = face
+    return face
+
+
+def pil_measure(font, size, text):
+    face = pil_font(font, size)
+    ascent, descent = face.getmetrics()
+    lines = text.split("\n")
+    return max(face.getlength(line) for line in lines), (ascent + descent) * len(lines)
+
+
+def tk_measure(root):
+    """A measuring function that asks Tk, for extents that match the canvas exactly."""
+    fonts = {}
+
+    def measure(font, size, text):
+        tk_font = fonts.get((font, size))
+        if tk_font is None:
+            tk_font = fonts[(font, size)] = tkfont.Font(root=root, family=font, size=-size)
+        lines = text.split("\n")
+        return max(tk_font.measure(line) for line in lines), tk_font.metrics("linespace") * len(lines)
+    return measure
+
+
+metrics = FontMetricsCache()  # Shared by the app, the renderer and the chunk index
+
+
+def font_pixels(size):
+    """The whole pixel size fonts are built (and measured) at."""
+    return max(1, round(size))
+
+
+def text_scale(shape):
+    if shape.get("matrix") is None:
+        return 1.0
+    return math.sqrt(abs(np.linalg.det(shape["matrix"][:2, :2])))
+
+
+def text_size(shape):
+    """Pixel size of a text shape with its pending transform applied."""
+    return shape["size"] * text_scale(shape)
+
+
+def text_angle(shape):
+    """Counterclockwise angle in degrees with the pending transform applied."""
+    if shape.get("matrix") is None:
+        return shape["angle"]
+    m = shape["matrix"]
+    # y points down, so the matrix's rotation looks clockwise on screen
+    return (shape["angle"] - math.degrees(math.atan2(m[1, 0], m[0, 0]))) % 360
+
+
+def text_anchor(shape):
+    x, y = shape["coords"][:2]
+    if shape.get("matrix") is None:
+        return x, y
+    return tuple(apply_affine(shape["matrix"], [(x, y)])[0].tolist())
+
+
+def text_corners(shape):
+    """The four corners of the text's box in the document, for bounds and hit-tests."""
+    pixels = font_pixels(shape["size"])
+    width, height = metrics.extents(shape["font"], pixels, shape["text"])
+    # Scale the whole-pixel measurement to the exact size
+    width, height = width * shape["size"] / pixels, height * shape["size"] / pixels
+    x, y = shape["coords"][:2]
+    c, s = math.cos(math.radians(shape["angle"])), math.sin(math.radians(shape["angle"]))
+    corners = [(x + dx * c + dy * s, y - dx * s + dy * c)
+               for dx, dy in ((-width / 2, -height / 2), (width / 2, -height / 2),
+                              (width / 2, height / 2), (-width / 2, height / 2))]
+    if shape.get("matrix") is None:
+        return corners
+    return [tuple(p) for p in apply_affine(shape["matrix"], corners).tolist()]
+
+
+def text_bounds(shape):
+    corners = text_corners(shape)
+    xs, ys = [x for x, _ in corners], [y for _, y in corners]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def text_contains(shape, x, y):
+    """True if (x, y) falls on the text's (possibly rotated) box."""
+    x1, y1, x2, y2 = text_bounds(shape)
+    if not (x1 <= x <= x2 and y1 <= y <= y2):
+        return False
+    # Inside a convex quad: on the same side of all four edges
+    corners = text_corners(shape)
+    sides = [(bx - ax) * (y - ay) - (by - ay) * (x - ax)
+             for (ax, ay), (bx, by) in zip(corners, corners[1:] + corners[:1])]
+    return all(side >= 0 for side in sides) or all(side <= 0 for side in sides)
+
+
+def bake_text(shape):
+    """Folds a text shape's pending transform into its anchor, size and angle."""
+    if shape.get("matrix") is None:
+        return
+    shape["coords"] = list(text_anchor(shape))
+    shape["size"] = text_size(shape)
+    shape["angle"] = text_angle(shape)
+    shape["matrix"] = None
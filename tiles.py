@@ -0,0 +1,76 @@
+# tiles.py
+import math
+from collections import OrderedDict
+
+from PIL import Image
+
+from renderer import draw_scene
+
+TILE_SIZE = 512  # Document units per tile side
+STROKE_PAD = 32  # How far the thickest brush paints beyond a stroke's points
+
+
+def render_tile(rect, strokes):
+    """Rasterize strokes into a transparent RGBA tile covering rect (x1, y1, x2, y2)."""
+    x1, y1, x2, y2 = rect
+    image = Image.new("RGBA", (int(x2 - x1), int(y2 - y1)), (0, 0, 0, 0))
+    draw_scene(image, strokes, [], 1.0, (x1, y1))
+    return image
+
+
+class TileCache:
+    """
+    Committed strokes baked into fixed-size backing images. Each tile has a
+    version that every edit touching its area bumps, so a tile is only
+    re-rendered when something in it changed, and an image rendered from
+    an older version (say on a worker thread) is never stored.
+    """
+    def __init__(self, tile_size=TILE_SIZE, max_tiles=96):
+        self.tile_size = tile_size
+        self.max_tiles = max_tiles  # Clean tiles kept, including ones scrolled out of view
+        self.images = OrderedDict()  # key -> RGBA image, least recently used first
+        self.versions = {}  # key -> edit counter
+        self.epoch = 0  # Bumped when everything is invalidated at once
+
+    def keys_for_rect(self, x1, y1, x2, y2, margin=0):
+        size = self.tile_size
+        return {(tx, ty)
+                for tx in range(math.floor(x1 / size) - margin, math.floor(x2 / size) + margin + 1)
+                for ty in range(math.floor(y1 / size) - margin, math.floor(y2 / size) + margin + 1)}
+
+    def rect(self, key):
+        size = self.tile_size
+        return key[0] * size, key[1] * size, (key[0] + 1) * size, (key[1] + 1) * size
+
+    def version(self, key):
+        return self.epoch, self.versions.get(key, 0)
+
+    def invalidate(self, bounds=None):
+        """Mark the tiles overlapping bounds (x1, y1, x2, y2) dirty, or all of them."""
+        if bounds is None:
+            self.images.clear()
+            self.versions.clear()
+            self.epoch += 1
+            return set()
+        keys = self.keys_for_rect(*bounds)
+        for key in keys:
+            self.images.pop(key, None)
+            self.versions[key] = self.versions.get(key, 0) + 1
+        return keys
+
+    def get(self, key):
+        """The clean image of a tile, or None if it has to be (re-)rendered."""
+        image = self.images.get(key)
+        if image is not None:
+            self.images.move_to_end(key)
+        return image
+
+    def store(self, key, image, version):
+        """Keep a rendered tile, unless it was edited since rendering started."""
+        if version != self.version(key):
+            return False
+        self.images[key] = image
+        self.images.move_to_end(key)
+        while len(self.images) > self.max_tiles:
+            self.images.popitem(last=False)
+        return True
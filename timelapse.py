@@ -0,0 +1,159 @@
+# timelapse.py
+"""
+Turn a recorded session (or a .sketch document) into a process video by
+replaying its history through the offscreen renderer.
+
+    python timelapse.py ~/.last_sketch -o process.mp4 --fps 30 --ops-per-frame 2
+
+A session recorded with timelapse recording on is replayed from its
+archive, so strokes appear in the order they were drawn. Otherwise, as with
+a lone snapshot or document, everything up to the last snapshot replays in
+storage order (all strokes, then all shapes).
+"""
+import argparse
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from journal import ADD_SHAPE, ADD_STROKE, document_records, replay, replay_steps
+from renderer import draw_scene, render_scene, scene_bounds
+from shape import Stroke
+
+FOURCC = {".mp4": "mp4v", ".avi": "MJPG", ".mov": "mp4v"}
+
+
+def timelapse_frames(records, size=(800, 600), origin=(0, 0), scale=1.0, ops_per_frame=1, background="white"):
+    """
+    Yield RGB frames (numpy arrays) of the drawing being built up, one every
+    ops_per_frame operations. A new stroke or outline is drawn on top of the
+    previous frame; only removals, transforms, clears and fills (which go
+    underneath everything) re-render the scene.
+    """
+    image = render_scene([], [], size, scale, origin, background)
+    pending = 0
+    for kind, added, objects in replay_steps(records):
+        if kind == ADD_STROKE:
+            draw_scene(image, [added], [], scale, origin)
+        elif kind == ADD_SHAPE and added["type"] != "fill":
+            draw_scene(image, [], [added], scale, origin)
+        else:
+            strokes = [obj for obj in objects.values() if isinstance(obj, Stroke)]
+            shapes = [obj for obj in objects.values() if not isinstance(obj, Stroke)]
+            image = render_scene(strokes, shapes, size, scale, origin, background)
+        pending += 1
+        if pending >= ops_per_frame:
+            pending = 0
+            yield np.array(image)  # A copy, the image keeps changing
+    if pending:
+        yield np.array(image)
+
+
+def write_video(frames, path, fps=30, hold_seconds=2.0, on_frame=None):
+    """
+    Encode RGB frames with cv2.VideoWriter on a worker thread while the caller's
+    thread renders the next ones. The last frame is held for hold_seconds.
+    on_frame is called with the count after every frame, held ones included.
+    Returns the number of frames written.
+    """
+    fourcc = cv2.VideoWriter_fourcc(*FOURCC.get(os.path.splitext(path)[1].lower(), "mp4v"))
+    frame_queue = queue.Queue(maxsize=16)
+    errors = []
+
+    def encode():
+        writer = None
+        try:
+            while True:
+                frame = frame_queue.get()
+                if frame is None:
+                    break
+                frame = frame[:frame.shape[0] // 2 * 2, :frame.shape[1] // 2 * 2]  # Most codecs want even sizes
+                if writer is None:
+                    height, width = frame.shape[:2]
+                    writer = cv2.VideoWriter(path, fourcc, fps, (width, height))
+                    if not writer.isOpened():
+                        raise IOError(f"Can't open a video writer for {path}")
+                writer.write(cv2.cvtColor(frame, cv2.COLOR_RGB2BGR))
+        except Exception as e:
+            errors.append(e)
+            while frame_queue.get() is not None:  # Unblock the producer
+                pass
+        finally:
+            if writer is not None:
+                writer.release()
+
+    encoder = threading.Thread(target=encode, name="timelapse-encoder", daemon=True)
+    encoder.start()
+    count = 0
+    last = None
+    for frame in frames:
+        frame_queue.put(frame)
+        last = frame
+        count += 1
+        if on_frame:
+            on_frame(count)
+    if last is not None:
+        for _ in range(int(hold_seconds * fps)):
+            frame_queue.put(last)
+            count += 1
+            if on_frame:
+                on_frame(count)
+    frame_queue.put(None)
+    encoder.join()
+    if errors:
+        raise errors[0]
+    return count
+
+
+def frame_count(records, fps=30, ops_per_frame=1, hold_seconds=2.0):
+    """How many frames export_timelapse writes for the records."""
+    if not records:
+        return 0
+    return -(-len(records) // ops_per_frame) + int(hold_seconds * fps)
+
+
+def export_timelapse(records, path, fps=30, ops_per_frame=1, scale=1.0, fit=False, on_frame=None):
+    """
+    Render and encode a timelapse of the given journal records. on_frame is
+    called with (frames written, frame_count()). Returns the frame count.
+    """
+    size, origin = (800, 600), (0, 0)
+    if fit:
+        bounds = scene_bounds(*replay(records))
+        if bounds:
+            origin = bounds[:2]
+            size = (bounds[2] - bounds[0], bounds[3] - bounds[1])
+    frames = timelapse_frames(records, size, origin, scale, ops_per_frame)
+    total = frame_count(records, fps, ops_per_frame)
+    report = None
+    if on_frame:
+        report = lambda count: on_frame(count, total)
+    return write_video(frames, path, fps, on_frame=report)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a process video of a sketch from its recorded history.")
+    parser.add_argument("input", help="session directory (with journal.bin), journal/snapshot file or .sketch document")
+    parser.add_argument("-o", "--out", default="timelapse.mp4", help="output video (.mp4 or .avi)")
+    parser.add_argument("--fps", type=int, default=30, help="frames per second")
+    parser.add_argument("--ops-per-frame", type=int, default=1, help="operations added per frame")
+    parser.add_argument("--scale", type=float, default=1.0, help="frame scale factor")
+    parser.add_argument("--fit", action="store_true", help="frame the finished drawing instead of the 800x600 canvas")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    records = document_records(args.input, full=True)
+    if not records:
+        print(f"No history found in {args.input}")
+        return 1
+    count = export_timelapse(records, args.out, args.fps, args.ops_per_frame, args.scale, args.fit)
+    print(f"Wrote {count} frames from {len(records)} operations to {args.out} "
+          f"in {time.perf_counter() - start:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())